@@ -0,0 +1,71 @@
+from zilean import MatchCache, SnapShots, process_timeframes
+
+import copy, json, os
+
+# Current file location:
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Load in example timeline for testing
+example_file = os.path.join(__location__, "example_timeline.json")
+with open(example_file , "r") as example:
+    example_timeline = json.load(example)
+
+
+def renamed(timeline, match_id):
+    """Copy of a `MatchTimelineDto` with another matchId."""
+    timeline = copy.deepcopy(timeline)
+    timeline["metadata"]["matchId"] = match_id
+    return timeline
+
+
+def test_snapshots_use_cache(tmp_path):
+    """A second SnapShots only processes the matches not in the cache,
+    with the same summary."""
+    file = str(tmp_path / "cache.db")
+    first = SnapShots(example_file, frames=[8, 12], cache=file)
+    assert first.cache.misses == 1 and len(first.cache) == 1
+    matches = [renamed(example_timeline[0], "KR_1"), example_timeline[0]]
+    second = SnapShots(matches, frames=[8, 12], cache=file)
+    assert second.cache.hits == 1 and second.cache.misses == 1
+    assert second.summary_[1] == first.summary_[0]
+    assert second.summary(per_frame=True)[2:] == first.summary(per_frame=True)
+    # Other options do not share the cached matches
+    third = SnapShots(example_file, frames=[8], cache=file)
+    assert third.cache.hits == 0
+
+
+def test_cache_eviction(tmp_path):
+    """The least recently used matches are evicted first."""
+    processed = process_timeframes(example_timeline, frames=[8])
+    size = processed["values"][0].nbytes
+    cache = MatchCache(str(tmp_path / "cache.db"), max_size=2 * size)
+    config = MatchCache.config([8])
+    for match_id in ["KR_1", "KR_2"]:
+        cache.put(config, dict(processed, matchId=[match_id]))
+    cache.get(config, ["KR_1"])
+    cache.put(config, dict(processed, matchId=["KR_3"]))
+    assert len(cache) == 2
+    assert set(cache.get(config, ["KR_1", "KR_2", "KR_3"])) == \
+           {"KR_1", "KR_3"}
+    assert cache.features(config)["features"] == \
+           list(processed["features"])
+    assert cache.features(MatchCache.config([8, 12])) is None
+
+
+def test_cache_threads(tmp_path):
+    """The cache may be used from threads other than the one which
+    opened it."""
+    from concurrent.futures import ThreadPoolExecutor
+    processed = process_timeframes(example_timeline, frames=[8])
+    cache = MatchCache(str(tmp_path / "cache.db"))
+    config = MatchCache.config([8])
+    match_ids = [f"KR_{i}" for i in range(8)]
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda match_id: cache.put(
+            config, dict(processed, matchId=[match_id])), match_ids))
+        found = list(executor.map(lambda match_id: cache.get(
+            config, [match_id]), match_ids))
+    assert len(cache) == 8
+    assert all(match_id in f for match_id, f in zip(match_ids, found))
+    assert cache.hits == 8
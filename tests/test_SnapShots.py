@@ -153,3 +153,227 @@ def test_subset_agg():
     assert "xp_frame8" in subset_agg_1
     assert "totalGold_frame8" not in subset_agg_1
     assert subset_agg_1["xp_frame8"] == -1553
+
+
+def test_per_frame_consistent_with_per_match():
+    """Per frame summary agrees with the per match summary."""
+    snaps = SnapShots(example_file, frames=[8, 12])
+    per_match = snaps.summary(per_frame=False)
+    per_frame = snaps.summary(per_frame=True)
+
+    assert len(per_frame) == 2 * len(per_match)
+    assert [row["frame"] for row in per_frame] == [8, 12]
+    for row in per_frame:
+        for key in ["totalGold_0", "xp_3", "goldPorportion_4"]:
+            name = key + "_frame" + str(row["frame"])
+            assert row[key] == per_match[0][name]
+
+
+def test_load_iterable_and_jsonl():
+    """Load from a generator and from a file with one match per line."""
+    from zilean import write_messy_json
+    snaps = SnapShots(example_timeline * 3, frames=[8, 12])
+    # Generator, processed in small chunks
+    generator = (match for match in example_timeline * 3)
+    streamed = SnapShots(generator, frames=[8, 12], chunk_size=2)
+    assert streamed.summary() == snaps.summary()
+    assert streamed.summary(per_frame=True) == snaps.summary(per_frame=True)
+    # One match per line
+    jsonl_file = os.path.join(__location__, "example_timeline.jsonl")
+    for match in example_timeline * 3:
+        write_messy_json(match, jsonl_file)
+    from_jsonl = SnapShots(jsonl_file, frames=[8, 12])
+    os.remove(jsonl_file)
+    assert from_jsonl.summary() == snaps.summary()
+
+
+def test_parallel():
+    """Worker processes give the same summaries as the serial path."""
+    from concurrent.futures import ThreadPoolExecutor
+    snaps = SnapShots(example_timeline * 5, frames=[8, 12])
+    parallel = SnapShots(example_timeline * 5, frames=[8, 12],
+                         chunk_size=2, n_jobs=2)
+    assert parallel.summary() == snaps.summary()
+    assert parallel.summary(per_frame=True) == snaps.summary(per_frame=True)
+    # Matches read from file are decoded by the workers
+    from_file = SnapShots(example_file, frames=[8, 12], n_jobs=2)
+    assert from_file.summary() == snaps.summary()[:1]
+    # User provided executor
+    with ThreadPoolExecutor(2) as executor:
+        threaded = SnapShots(example_timeline * 5, frames=[8, 12],
+                             chunk_size=1, executor=executor)
+    assert threaded.summary() == snaps.summary()
+
+
+def test_to_disk_and_load_binary():
+    """Save summaries in binary formats and load them again."""
+    import shutil
+    from zilean import read_summary
+    snaps = SnapShots(example_file, frames=[8, 12])
+    formats = ["npy", "parquet"]
+    try:
+        import pyarrow
+    except ImportError:
+        formats = ["npy"]
+    for format in formats:
+        snaps.to_disk(path=__location__, verbose=False, format=format)
+        extension = "" if format == "npy" else "." + format
+        match_file = os.path.join(__location__, "match_8_12" + extension)
+        frame_file = os.path.join(__location__, "frame_8_12" + extension)
+        loaded = SnapShots(frame_file)
+        assert loaded.frames == [8, 12]
+        assert loaded.summary() == snaps.summary()
+        assert loaded.summary(per_frame=True) == snaps.summary(per_frame=True)
+        # Only read some columns
+        table = read_summary(match_file, columns=["xp_0_frame8"])
+        assert table["values"].shape == (1, 1)
+        assert table["values"][0, 0] == snaps.summary()[0]["xp_0_frame8"]
+        assert list(table["matchId"]) == ["NA1_4307172207"]
+        # Delete files
+        for file in [match_file, frame_file]:
+            if format == "npy":
+                shutil.rmtree(file)
+            else:
+                os.remove(file)
+
+
+def test_array_storage():
+    """Summary statistics are stored in a single 2-D array."""
+    snaps = SnapShots(example_timeline * 4, frames=[8, 12])
+    assert snaps.data_.shape == (4, 100)
+    assert list(snaps.match_ids_) == ["NA1_4307172207"] * 4
+    assert not snaps.wins_.any()
+    # The column index agrees with the dictionary view
+    per_match = snaps.summary()[0]
+    for name, index in snaps.columns_.items():
+        assert snaps.data_[0, index] == per_match[name]
+    assert type(per_match["xp_2_frame8"]) == int
+    assert type(per_match["goldPorportion_2_frame8"]) == float
+
+
+def test_subset_view():
+    """Subsets share the storage and support the per frame summary."""
+    snaps = SnapShots(example_file, frames=[8, 12])
+    lanes = ["TOP", "MID"]
+    subset = snaps.subset(features=["xp", "totalGold"], lanes=lanes,
+                          frames=[12])
+    # The argument is not modified, and no data is copied
+    assert lanes == ["TOP", "MID"]
+    assert subset._data is snaps._data
+    # Per match
+    per_match = subset.summary()[0]
+    assert list(per_match.keys()) == ["totalGold_0_frame12", "xp_0_frame12",
+                                      "totalGold_2_frame12", "xp_2_frame12",
+                                      "matchId", "win"]
+    assert per_match["xp_2_frame12"] == snaps.summary()[0]["xp_2_frame12"]
+    # Per frame
+    per_frame = subset.summary(per_frame=True)
+    assert len(per_frame) == 1
+    assert per_frame[0]["frame"] == 12
+    assert per_frame[0]["xp_2"] == per_match["xp_2_frame12"]
+    # Subset of a subset
+    nested = subset.subset(lanes=["MID"])
+    assert nested._data is snaps._data
+    assert nested.summary()[0]["xp_2_frame12"] == per_match["xp_2_frame12"]
+    assert len(nested.summary()[0]) == 4
+
+
+def test_agg_vectorized():
+    """Built-in reductions agree with calling the function per cell."""
+    import numpy as np
+    snaps = SnapShots(example_timeline * 3, frames=[8, 12])
+    subset = snaps.subset(lanes=[0, 1, 3], features=["xp", "goldPorportion"])
+    for s in [snaps, subset]:
+        for type in ["team", "frame"]:
+            for func, slow in [(sum, lambda x: sum(x)), (max, lambda x: max(x)),
+                               (np.mean, lambda x: float(np.mean(x)))]:
+                assert s.agg(type, func) == s.agg(type, slow)
+    table = snaps.agg("team", "mean", as_table=True)
+    assert table["values"].shape == (3, 20)
+    assert table["columns"][0] == "level_frame8"
+
+
+def test_agg_per_frame():
+    """Aggregate the per frame summary by team."""
+    snaps = SnapShots(example_file, frames=[8, 12])
+    by_team = snaps.agg("team")
+    per_frame = snaps.agg("team", per_frame=True)
+    assert len(per_frame) == 2
+    assert per_frame[1]["totalDamageDone"] == by_team[0]["totalDamageDone_frame12"]
+    assert per_frame[0]["xp"] == by_team[0]["xp_frame8"]
+    try:
+        snaps.agg("frame", per_frame=True)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_feature_schema():
+    """SnapShots with the same frames and options share a schema, which
+    also parses feature names with underscores."""
+    from zilean import FeatureSchema
+    snaps = SnapShots(example_file, frames=[8, 12])
+    other = SnapShots(example_timeline, frames=[8, 12])
+    assert snaps.schema_ is other.schema_
+    assert snaps.subset(lanes=[0]).schema_ is other.subset(lanes=["TOP"]).schema_
+    schema = FeatureSchema.from_names(["gold_per_min_0_frame8", 
+                                       "cs_0_frame8",
+                                       "gold_per_min_1_frame8",
+                                       "cs_1_frame8"])
+    assert schema.features == ["gold_per_min", "cs"]
+    assert schema.lanes == [0, 1]
+    assert schema.feature_info_[2]["feature"] == "gold_per_min"
+    try:
+        FeatureSchema.from_names(["cs_0", "gold_1"])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_extend_and_merge():
+    """Add new matches to a SnapShots, skipping the ones already there."""
+    import copy
+    import numpy as np
+    other_match = copy.deepcopy(example_timeline[0])
+    other_match["metadata"]["matchId"] = "KR_0"
+    snaps = SnapShots(example_timeline, frames=[8, 12])
+    before = snaps.summary_
+    assert snaps.extend(example_file) == 0
+    assert snaps.extend([other_match, other_match]) == 1
+    assert list(snaps.match_ids_) == [example_timeline[0]["metadata"]["matchId"],
+                                      "KR_0"]
+    assert snaps.summary_[1]["matchId"] == "KR_0"
+    assert snaps.summary_[0] == before[0]
+    merged = SnapShots([other_match], frames=[8, 12])
+    assert merged.merge(snaps) == 1
+    assert np.array_equal(merged.data_, snaps.data_[::-1])
+    try:
+        merged.merge(SnapShots(example_timeline, frames=[8]))
+        assert False
+    except ValueError:
+        pass
+    try:
+        snaps.subset(lanes=[0]).extend(other_match)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_load_csv_and_extend():
+    """Load a summary of several frames from csv, and add matches."""
+    import copy
+    snaps = SnapShots(example_file, frames=[8, 12])
+    snaps.to_disk(path=__location__, verbose=False)
+    match_file = os.path.join(__location__, "match_8_12.csv")
+    frame_file = os.path.join(__location__, "frame_8_12.csv")
+    try:
+        loaded = SnapShots(match_file)
+        assert loaded.frames == [8, 12]
+        other_match = copy.deepcopy(example_timeline[0])
+        other_match["metadata"]["matchId"] = "KR_0"
+        assert loaded.extend([other_match]) == 1
+        snaps.extend([other_match])
+        assert loaded.summary_[1] == snaps.summary_[1]
+    finally:
+        os.remove(match_file)
+        os.remove(frame_file)
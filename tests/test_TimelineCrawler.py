@@ -1,6 +1,8 @@
-from zilean import TimelineCrawler, DummyWatcher
+from zilean import (TimelineCrawler, DummyWatcher, AsyncDummyWatcher, 
+                    TimelineIndex)
 
-import os
+import os, time
+import pytest
 
 # Current file location:
 __location__ = os.path.realpath(
@@ -86,6 +88,7 @@ def test_crawl_to_disk():
         pass
     # Clean up
     os.remove(crawl_result_file)
+    os.remove(crawl_result_file + ".idx")
 
 
 def test_crawl_no_to_disk():
@@ -139,4 +142,445 @@ def test_crawl_matchId():
                               tier="MASTER", queue="RANKED_SOLO_5x5",
                               dummy_watcher=DummyWatcher())
     result = crawler.crawl(1, cutoff=0)
-    assert result[0]['metadata']['matchId'] == "MASTER_1"
\ No newline at end of file
+    assert result[0]['metadata']['matchId'] == "MASTER_1"
+
+
+def test_crawl_index(tmp_path):
+    """The crawled matches are indexed, for random access, shards and
+    cutoff filtering without decoding the file."""
+    file = str(tmp_path / "crawl.json")
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=DummyWatcher())
+    crawler.crawl(4, cutoff=0, file=file)
+    index = TimelineIndex(file)
+    assert index.match_ids_ == ["GOLD_1_1", "GOLD_1_2", "GOLD_2_1", "GOLD_2_2"]
+    assert index["GOLD_2_1"]["metadata"]["matchId"] == "GOLD_2_1"
+    assert [m["metadata"]["matchId"] for m in index] == index.match_ids_
+    shards = [index.shard(i, 3).match_ids_ for i in range(3)]
+    assert sum(shards, []) == index.match_ids_
+    assert len(index.filter(cutoff=0)) == 4
+    assert len(index.filter(cutoff=3)) == 0
+    # Matches appended without the sidecar are indexed when loaded
+    os.remove(file + ".idx")
+    with open(file, "a") as f:
+        f.write("\n")
+    assert TimelineIndex(file).match_ids_ == index.match_ids_
+
+
+def test_index_rewritten(tmp_path):
+    """A sidecar which no longer describes its rewritten file is built
+    again, and closing the index unmaps the file."""
+    file = str(tmp_path / "crawl.json")
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=DummyWatcher())
+    crawler.crawl(4, cutoff=0, file=file)
+    with open(file, "rb") as f:
+        lines = f.readlines()
+    # Same size, other order, written after the sidecar
+    with open(file, "wb") as f:
+        f.writelines(lines[::-1])
+    stat = os.stat(file + ".idx")
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    with TimelineIndex(file) as index:
+        assert index.match_ids_ == ["GOLD_2_2", "GOLD_2_1", 
+                                    "GOLD_1_2", "GOLD_1_1"]
+        assert index["GOLD_1_1"]["metadata"]["matchId"] == "GOLD_1_1"
+        shard = index.shard(0, 1)
+        shard.close()
+        assert len(list(index)) == 4
+    with pytest.raises(ValueError):
+        index.raw(0)
+    assert TimelineIndex(file).match_ids_ == index.match_ids_
+
+
+def test_crawl_async():
+    """The asynchronous crawl keeps several requests in flight, and
+    crawls the same matches in the same order."""
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=DummyWatcher())
+    expected = crawler.crawl(3, match_per_id=2, cutoff=0)
+    watcher = AsyncDummyWatcher(latency=0.05)
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher)
+    start = time.time()
+    result = crawler.crawl(3, match_per_id=2, cutoff=0, concurrency=4)
+    assert result == expected
+    assert watcher.max_in_flight_ > 1
+    # 9 requests of 50ms each, some of them at the same time
+    assert time.time() - start < 0.05 * watcher.calls_
+    # The rate limits are never exceeded
+    crawler.rate_limits = [(2, 0.2)]
+    start = time.time()
+    crawler.crawl(1, match_per_id=1, cutoff=0, concurrency=4)
+    assert time.time() - start >= 0.2
+
+
+def test_crawl_resume(tmp_path):
+    """An interrupted crawl resumes where it stopped, without fetching
+    the crawled timelines again."""
+    file = str(tmp_path / "crawl.json")
+    watcher = DummyWatcher()
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher)
+    expected = crawler.crawl(4, cutoff=0)
+    fetched = []
+    timeline_by_match = watcher.match.timeline_by_match
+    def fetch(region, matchId):
+        if len(fetched) == 3:
+            raise ConnectionError("Network blip")
+        fetched.append(matchId)
+        return timeline_by_match(region, matchId)
+    watcher.match.timeline_by_match = fetch
+    try:
+        crawler.crawl(4, cutoff=0, file=file)
+        assert False
+    except ConnectionError:
+        pass
+    # Resuming needs `resume=True`
+    try:
+        crawler.crawl(4, cutoff=0, file=file)
+        assert False
+    except ValueError:
+        pass
+    fetched.clear()
+    result = crawler.crawl(4, cutoff=0, file=file, resume=True)
+    assert fetched == ["GOLD_2_2"]
+    assert result == expected
+    assert not os.path.exists(file + ".ckpt")
+
+
+def test_crawl_dedupe_store(tmp_path):
+    """Crawls sharing a dedupe store never download a match twice."""
+    from zilean import MatchIdStore
+    store = MatchIdStore(str(tmp_path / "seen.db"), capacity=2)
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=DummyWatcher(),
+                              dedupe_store=store)
+    first = crawler.crawl(2, cutoff=0, file=str(tmp_path / "first.json"))
+    second = crawler.crawl(8, cutoff=0)
+    assert [m["metadata"]["matchId"] for m in first] == ["GOLD_1_1", "GOLD_1_2"]
+    assert [m["metadata"]["matchId"] for m in second] == ["GOLD_2_1", "GOLD_2_2"]
+    assert len(store) == 4 and "GOLD_2_2" in store and "GOLD_3_1" not in store
+    # Seed another store from the crawled file
+    other = MatchIdStore(str(tmp_path / "other.db"), bloom=False)
+    assert other.seed(str(tmp_path / "first.json")) == 2
+    assert "GOLD_1_2" in other and "GOLD_2_1" not in other
+
+
+def test_crawl_cutoff(tmp_path):
+    """Matches shorter than the cutoff are dropped as they arrive, and
+    do not count toward the number of matches."""
+    from zilean import iter_timelines
+    watcher = DummyWatcher()
+    timeline_by_match = watcher.match.timeline_by_match
+    def fetch(region, matchId):
+        timeline = timeline_by_match(region, matchId)
+        # The first match of each account only lasts a minute
+        if matchId.endswith("_1"):
+            timeline["info"]["frames"] = timeline["info"]["frames"][:1]
+        return timeline
+    watcher.match.timeline_by_match = fetch
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher)
+    file = str(tmp_path / "crawl.json")
+    result = crawler.crawl(2, cutoff=2, file=file)
+    assert [m["metadata"]["matchId"] for m in result] == ["GOLD_1_2", 
+                                                          "GOLD_2_2"]
+    assert TimelineIndex(file).match_ids_ == ["GOLD_1_2", "GOLD_2_2"]
+    assert crawler.crawl(2, cutoff=2, concurrency=3) == result
+    # Compressed output, read back as is
+    file = str(tmp_path / "crawl.json.gz")
+    assert crawler.crawl(2, cutoff=2, file=file) == result
+    assert not os.path.exists(file + ".idx")
+    assert list(iter_timelines(file)) == result
+
+
+def test_crawl_cache(tmp_path):
+    """Repeated crawls look leagues and summoners up in the cache, but
+    never the match lists."""
+    from zilean import CachedWatcher
+    cache = str(tmp_path / "responses.db")
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=DummyWatcher(), cache=cache)
+    expected = crawler.crawl(4, cutoff=0)
+    assert crawler.watcher.hits == 0
+    misses = crawler.watcher.misses
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=AsyncDummyWatcher(), cache=cache)
+    assert crawler.crawl(4, cutoff=0, concurrency=2) == expected
+    assert crawler.watcher.hits == misses and crawler.watcher.misses == 0
+    assert "match.matchlist_by_puuid" not in crawler.watcher.stats()
+    assert crawler.watcher.stats()["summoner.by_id"] == {"hits": 2, 
+                                                         "misses": 0}
+    # Cached lookups are neither sent nor scheduled
+    assert set(crawler.telemetry.snapshot()["endpoints"]) == \
+           {"match.matchlist_by_puuid", "match.timeline_by_match"}
+    # Expired responses are requested again
+    watcher = CachedWatcher(DummyWatcher(), str(tmp_path / "short.db"),
+                            ttls={"league.by_id": 0.1, "summoner.by_id": None})
+    for _ in range(2):
+        watcher.league.by_id("na1", "GOLD_1")
+        watcher.summoner.by_id("na1", "GOLD_1")
+        time.sleep(0.2)
+    assert watcher.stats() == {"league.by_id": {"hits": 0, "misses": 2},
+                               "summoner.by_id": {"hits": 1, "misses": 1}}
+
+
+def test_crawl_snapshots(tmp_path):
+    """Crawled matches are processed into a SnapShots during the crawl,
+    with the same summaries as processing the crawl result."""
+    import copy, json
+    import numpy as np
+    from zilean import SnapShots, iter_timelines
+    with open(os.path.join(__location__, "example_timeline.json")) as f:
+        example = json.load(f)[0]
+    watcher = DummyWatcher()
+    def fetch(region, matchId):
+        timeline = copy.deepcopy(example)
+        timeline["metadata"]["matchId"] = matchId
+        return timeline
+    watcher.match.timeline_by_match = fetch
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher)
+    expected = SnapShots(crawler.crawl(3), frames=[8, 12])
+    file = str(tmp_path / "crawl.json")
+    snapshots = crawler.crawl_snapshots(3, file=file, frames=[8, 12], 
+                                        queue_size=2)
+    assert snapshots.match_ids_.tolist() == ["GOLD_1_1", "GOLD_1_2", 
+                                             "GOLD_2_1"]
+    assert np.array_equal(snapshots.data_, expected.data_)
+    # The raw matches are saved too
+    assert [m["metadata"]["matchId"] for m in iter_timelines(file)] == \
+           snapshots.match_ids_.tolist()
+    snapshots = crawler.crawl_snapshots(3, frames=[8, 12], concurrency=2)
+    assert np.array_equal(snapshots.data_, expected.data_)
+    assert not os.path.exists(".temp.json")
+    # Matches are processed in another thread, which shares the cache
+    cache = str(tmp_path / "cache.db")
+    for _ in range(2):
+        snapshots = crawler.crawl_snapshots(3, frames=[8, 12], cache=cache)
+        assert np.array_equal(snapshots.data_, expected.data_)
+    assert snapshots.cache.hits == 3
+
+
+def test_crawl_telemetry(tmp_path):
+    """The calls, duplicates and kept matches of crawls are recorded,
+    and exported as JSON or Prometheus text."""
+    import json
+    from zilean import CrawlTelemetry, MatchIdStore
+    dump_file = str(tmp_path / "telemetry.prom")
+    telemetry = CrawlTelemetry(dump_file=dump_file, dump_interval=0)
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=DummyWatcher(),
+                              dedupe_store=MatchIdStore(
+                                  str(tmp_path / "seen.db")),
+                              telemetry=telemetry)
+    crawler.crawl(3, cutoff=0)
+    snapshot = telemetry.snapshot()
+    calls = {e: s["calls"] for e, s in snapshot["endpoints"].items()}
+    assert calls == {"league.entries": 1, "league.by_id": 2, 
+                     "summoner.by_id": 2, "match.matchlist_by_puuid": 2,
+                     "match.timeline_by_match": 3}
+    timelines = snapshot["endpoints"]["match.timeline_by_match"]
+    assert timelines["histogram"]["+Inf"] == 3 and timelines["bytes"] > 0
+    assert snapshot["matches"] == {"kept": 3, "dropped": 0}
+    assert snapshot["matches_per_call"] == 3 / 10
+    crawler.crawl(4, cutoff=0)
+    assert telemetry.snapshot()["duplicates"] == {"store": 3}
+    assert json.loads(telemetry.to_json())["matches"]["kept"] == 4
+    text = telemetry.to_prometheus()
+    assert 'zilean_crawl_matches_total{status="kept"} 4' in text
+    assert 'zilean_crawl_request_seconds_bucket{endpoint=' + \
+           '"match.timeline_by_match",le="+Inf"} 4' in text
+    # Dumped during and after the crawls
+    with open(dump_file) as f:
+        assert f.read() == text
+
+
+def test_crawl_rate_limits():
+    """Crawls never exceed the rate limits, retry rejected requests
+    after their Retry-After, and send timelines first."""
+    import asyncio
+    from zilean import (FakeClock, RateLimitedDummyWatcher, 
+                        RequestScheduler, CrawlTelemetry)
+    expected = TimelineCrawler(api_key="key", region="na1", 
+                               tier="GOLD", queue="RANKED_SOLO_5x5",
+                               dummy_watcher=DummyWatcher()).crawl(4, cutoff=0)
+    for concurrency in [1, 4]:
+        clock = FakeClock()
+        watcher = RateLimitedDummyWatcher(limits=[(3, 10)], clock=clock)
+        crawler = TimelineCrawler(api_key="key", region="na1", 
+                                  tier="GOLD", queue="RANKED_SOLO_5x5",
+                                  dummy_watcher=watcher,
+                                  scheduler=RequestScheduler([(3, 10)], 
+                                                             clock=clock))
+        assert crawler.crawl(4, cutoff=0, concurrency=concurrency) == expected
+        # 11 requests, 3 every 10 seconds
+        assert watcher.rejected_ == 0 and clock.now == 30
+    # Without the limits, rejected requests are retried
+    clock, telemetry = FakeClock(), CrawlTelemetry()
+    watcher = RateLimitedDummyWatcher(limits=[(3, 10)], clock=clock)
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher, telemetry=telemetry,
+                              scheduler=RequestScheduler([], clock=clock,
+                                                         telemetry=telemetry))
+    assert crawler.crawl(4, cutoff=0) == expected
+    retries = sum(s["retries"] for s in 
+                  telemetry.snapshot()["endpoints"].values())
+    assert watcher.rejected_ == retries == 3 and clock.now == 30
+    # Timelines go ahead of the lookups waiting for the same limits
+    scheduler = RequestScheduler([(1, 1)], clock=FakeClock(), 
+                                 max_in_flight=10)
+    order = []
+    async def send(name):
+        order.append(name)
+    async def main():
+        await asyncio.gather(
+            scheduler.call_async("summoner.by_id", "na1", send, "first"),
+            scheduler.call_async("summoner.by_id", "na1", send, "lookup"),
+            scheduler.call_async("match.timeline_by_match", "na1", send, 
+                                 "timeline"))
+    asyncio.run(main())
+    assert order == ["first", "timeline", "lookup"]
+    assert scheduler.clock.now == 2
+
+
+def test_crawl_cache_rate_limits(tmp_path):
+    """Cached lookups do not wait on the rate limits."""
+    from zilean import FakeClock, RateLimitedDummyWatcher, RequestScheduler
+    cache = str(tmp_path / "cache.db")
+    for concurrency in [1, 4]:
+        elapsed = []
+        for _ in range(2):
+            clock = FakeClock()
+            watcher = RateLimitedDummyWatcher(limits=[(3, 10)], clock=clock)
+            crawler = TimelineCrawler(api_key="key", region="na1", 
+                                      tier="GOLD", queue="RANKED_SOLO_5x5",
+                                      dummy_watcher=watcher, cache=cache,
+                                      scheduler=RequestScheduler(
+                                          [(3, 10)], clock=clock))
+            crawler.crawl(4, cutoff=0, concurrency=concurrency)
+            elapsed.append(clock.now)
+            assert watcher.rejected_ == 0
+        # 5 lookups are cached, 6 requests are left
+        assert len(watcher.calls_) == 6
+        assert elapsed == [30, 10]
+        os.remove(cache)
+
+
+def test_crawl_coordinator(tmp_path):
+    """Worker processes share the crawl through the coordinator, 
+    without downloading a match twice."""
+    from zilean import CrawlCoordinator, iter_timelines
+    coordinator = CrawlCoordinator(str(tmp_path / "crawl.db"))
+    crawler = dict(api_key="key", region="na1", tier="GOLD", 
+                   queue="RANKED_SOLO_5x5", dummy_watcher=DummyWatcher())
+    shards = coordinator.run(8, {"a": crawler, "b": crawler}, 
+                             str(tmp_path / "shards"), cutoff=0, poll=0.1)
+    match_ids = [m["metadata"]["matchId"] 
+                 for shard in shards for m in iter_timelines(shard)]
+    assert sorted(match_ids) == ["GOLD_1_1", "GOLD_1_2", 
+                                 "GOLD_2_1", "GOLD_2_2"]
+    progress = coordinator.progress()
+    assert progress["kept"] == 4 and progress["downloaded"] == 4
+    # A tier, 2 leagues and 2 accounts
+    assert progress["items"] == {"pending": 0, "leased": 0, "done": 5}
+    assert sum(w["items"] for w in progress["workers"].values()) == 5
+
+
+def test_crawl_worker_reclaim(tmp_path):
+    """The items of a crashed worker are reclaimed once their lease 
+    expires, and matches shared by accounts are downloaded once."""
+    from zilean import CrawlCoordinator, iter_timelines
+    coordinator = CrawlCoordinator(str(tmp_path / "crawl.db"), 
+                                   lease_seconds=0.2)
+    coordinator.add("tier", "na1", "GOLD", "RANKED_SOLO_5x5")
+    assert coordinator.lease("crashed", "na1", "GOLD", 
+                             "RANKED_SOLO_5x5")["kind"] == "tier"
+    watcher = DummyWatcher()
+    watcher.match.matchlist_by_puuid = lambda region, puuid: ["SHARED", 
+                                                              puuid + "_1"]
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher)
+    file = str(tmp_path / "shard.jsonl")
+    assert crawler.crawl_worker(coordinator, "alive", file, 10, cutoff=0,
+                                poll=0.1) == 3
+    assert [m["metadata"]["matchId"] for m in iter_timelines(file)] == \
+           ["SHARED", "GOLD_1_1", "GOLD_2_1"]
+    assert crawler.telemetry.snapshot()["duplicates"] == {"coordinator": 1}
+    assert list(coordinator.progress()["workers"]) == ["alive", "crashed"]
+
+
+def test_crawl_worker_lost_lease(tmp_path):
+    """Matches written before a lease is lost stay claimed, and are
+    counted, so that the worker leasing the item again skips them. The
+    match downloaded while the lease expired is dropped."""
+    from zilean import CrawlCoordinator, iter_timelines
+    coordinator = CrawlCoordinator(str(tmp_path / "crawl.db"))
+    watcher = DummyWatcher()
+    fetch, fetched = watcher.match.timeline_by_match, []
+    def expire(region, matchId):
+        # The lease expires during the second download
+        fetched.append(matchId)
+        if len(fetched) == 2:
+            coordinator.release("worker")
+        return fetch(region, matchId)
+    watcher.match.timeline_by_match = expire
+    crawler = TimelineCrawler(api_key="key", region="na1", 
+                              tier="GOLD", queue="RANKED_SOLO_5x5",
+                              dummy_watcher=watcher)
+    file = str(tmp_path / "shard.jsonl")
+    assert crawler.crawl_worker(coordinator, "worker", file, 10, cutoff=0,
+                                poll=0.1) == 4
+    assert [m["metadata"]["matchId"] for m in iter_timelines(file)] == \
+           ["GOLD_1_1", "GOLD_1_2", "GOLD_2_1", "GOLD_2_2"]
+    assert crawler.telemetry.snapshot()["duplicates"] == {"coordinator": 1}
+    progress = coordinator.progress()
+    assert progress["kept"] == 4 and progress["downloaded"] == 4
+    assert progress["items"] == {"pending": 0, "leased": 0, "done": 5}
+    assert fetched == ["GOLD_1_1", "GOLD_1_2", "GOLD_1_2", "GOLD_2_1",
+                       "GOLD_2_2"]
+
+
+def test_coordinator_record_conflict(tmp_path):
+    """A match claimed again after a lease was lost is left to the new
+    claim, by the same item or by another one."""
+    from zilean import CrawlCoordinator
+    coordinator = CrawlCoordinator(str(tmp_path / "crawl.db"))
+    crawl = ("na1", "GOLD", "RANKED_SOLO_5x5")
+    coordinator.add("entry", *crawl, ["A", "B"])
+    for other_item in [False, True]:
+        item = coordinator.lease("lost", *crawl)
+        match_id = f"KR_{int(other_item)}"
+        assert coordinator.claim(item["id"], [match_id]) == [match_id]
+        coordinator.release("lost")
+        if other_item:
+            # Another worker holds the first item
+            coordinator.lease("busy", *crawl)
+        claim = coordinator.lease("other", *crawl)
+        assert (claim["id"] != item["id"]) == other_item
+        assert coordinator.claim(claim["id"], [match_id]) == [match_id]
+        assert not coordinator.record(item["id"], "lost", match_id, True)
+        assert coordinator._db.execute(
+            "SELECT item, written FROM matches WHERE matchId = ?",
+            (match_id,)).fetchone() == (claim["id"], 0)
+        assert coordinator.progress()["kept"] == 0
+        coordinator.release("other")
+        coordinator.release("busy")
+    # Matches of a held lease are recorded
+    item = coordinator.lease("worker", *crawl)
+    assert coordinator.record(item["id"], "worker", "KR_0", True)
+    assert coordinator.progress()["kept"] == 1
@@ -0,0 +1,166 @@
+from zilean import (process_timeframe, process_timeframes, feature_names,
+                    index_events, EVENT_FEATURES, load_timeline,
+                    set_json_backend, JSON_BACKENDS,
+                    clean_timeframe, add_creep_score, add_proportion,
+                    write_messy_json, filter_json, clean_json,
+                    timeline_match_id)
+
+import copy, json, os
+import pytest
+
+# Current file location:
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Load in example timeline for testing
+example_file = os.path.join(__location__, "example_timeline.json")
+with open(example_file , "r") as example:
+    example_timeline = json.load(example)
+
+
+def test_process_timeframes_shape():
+    """Test the shape of the batch processed array."""
+    processed = process_timeframes(example_timeline * 3, frames=[8, 12])
+    assert processed["values"].shape == (3, 2, 5, 10)
+    assert len(processed["features"]) == 10
+    assert processed["matchId"] == ["NA1_4307172207"] * 3
+    assert not processed["win"].any()
+
+
+def legacy_process_timeframe(timeline, frames):
+    """Per match processing of a timeline, cleaning its frames and
+    adding the creep score and proportions, then taking the difference
+    of each lane."""
+    cleaned = clean_timeframe(timeline, frames, inplace=False)
+    cleaned = add_proportion(add_creep_score(cleaned))
+    expected = {}
+    for frame in frames:
+        for i in range(5):
+            for key in cleaned[str(frame)][0]:
+                expected[f"{key}_{i}_frame{frame}"] = \
+                    cleaned[str(frame)][i][key] - cleaned[str(frame)][i+5][key]
+    return expected
+
+
+def test_process_timeframes_same_as_legacy():
+    """The batch engine and the single match processing agree with the
+    per match cleaning of the timeline."""
+    frames = [8, 12]
+    expected = legacy_process_timeframe(example_timeline[0], frames)
+    processed = process_timeframes(example_timeline, frames=frames)
+    names = feature_names(processed["features"], frames)
+    assert names == list(expected.keys())
+    assert processed["values"].reshape(-1).tolist() == \
+           pytest.approx([expected[k] for k in names])
+    single = process_timeframe(example_timeline[0], frames=frames)
+    assert list(single.keys()) == names + ["matchId", "win"]
+    assert [single[k] for k in names] == \
+           pytest.approx([expected[k] for k in names])
+    assert single["win"] is False
+
+
+def test_clean_timeframe_not_inplace():
+    """Cleaning without inplace leaves the timeline untouched."""
+    timeline = copy.deepcopy(example_timeline[0])
+    cleaned = clean_timeframe(timeline, frames=[8, 12], inplace=False)
+    assert timeline == example_timeline[0]
+    # Cleaning twice gives the same result as cleaning in place
+    assert cleaned == clean_timeframe(timeline, frames=[8, 12], inplace=False)
+    assert cleaned == clean_timeframe(timeline, frames=[8, 12])
+    assert "damageStats" not in cleaned["8"][0]
+    assert "totalDamageDone" in cleaned["8"][0]
+
+
+def test_process_timeframe_not_inplace():
+    """Processing a timeline does not modify it."""
+    timeline = copy.deepcopy(example_timeline[0])
+    first = process_timeframe(timeline, frames=[8])
+    assert timeline == example_timeline[0]
+    assert first == process_timeframe(timeline, frames=[8])
+
+
+def test_filter_json():
+    """Streaming filter agrees with clean_json."""
+    messy_file = os.path.join(__location__, "messy.json")
+    output_file = os.path.join(__location__, "filtered.json")
+    for cutoff in [16, 25]:
+        for match in example_timeline * 2:
+            write_messy_json(match, messy_file)
+        # JSON list
+        count = filter_json(messy_file, output_file, cutoff=cutoff)
+        with open(output_file) as f:
+            filtered = json.load(f)
+        assert count == len(filtered)
+        # One match per line
+        filter_json(messy_file, output_file, cutoff=cutoff, lines=True)
+        with open(output_file) as f:
+            assert [json.loads(line) for line in f] == filtered
+        # Same as clean_json
+        assert clean_json(messy_file, cutoff=cutoff) == filtered
+        os.remove(messy_file)
+    assert count == 0
+    os.remove(output_file)
+
+
+def test_index_events():
+    """Event counts agree with scanning the events up to each frame,
+    and are added to the processed features."""
+    timeline = example_timeline[0]
+    counts = index_events(timeline)
+    frames = timeline["info"]["frames"]
+    assert counts.shape == (len(frames), 10, len(EVENT_FEATURES))
+    for frame in [0, 8, len(frames) - 1]:
+        kills = [0] * 10
+        dragons = [0, 0]
+        for past in frames[:frame + 1]:
+            for event in past["events"]:
+                if event["type"] == "CHAMPION_KILL" and event["killerId"]:
+                    kills[event["killerId"] - 1] += 1
+                if event.get("monsterType") == "DRAGON":
+                    dragons[event["killerTeamId"] == 200] += 1
+        assert list(counts[frame, :, 0]) == kills
+        assert list(counts[frame, :, 8]) == [dragons[0]] * 5 + [dragons[1]] * 5
+    processed = process_timeframes(example_timeline, frames=[8, 12], 
+                                   events=True)
+    assert processed["features"][-len(EVENT_FEATURES):] == EVENT_FEATURES
+    assert (processed["values"][0, :, :, -len(EVENT_FEATURES):] == 
+            counts[[8, 12], :5] - counts[[8, 12], 5:]).all()
+
+
+def test_load_timeline_projection():
+    """Every JSON backend decodes the same match, and the projection
+    keeps what is needed to process the frames of interest."""
+    text = json.dumps(example_timeline[0])
+    frames = [8, 12]
+    expected = process_timeframes(example_timeline, frames=frames)
+    try:
+        for backend in JSON_BACKENDS:
+            set_json_backend(backend)
+            assert load_timeline(text) == example_timeline[0]
+            projected = load_timeline(text, frames)
+            assert len(projected["info"]["frames"]) == \
+                   len(example_timeline[0]["info"]["frames"])
+            assert projected["info"]["frames"][5] == {}
+            processed = process_timeframes([projected], frames=frames)
+            assert (processed["values"] == expected["values"]).all()
+            assert processed["matchId"] == expected["matchId"]
+    finally:
+        set_json_backend(JSON_BACKENDS[0])
+    try:
+        set_json_backend("yaml")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_timeline_match_id():
+    """The matchId is taken from the metadata, even when a nested
+    object has a "matchId" key too."""
+    timeline = {"info": {"frames": [], "extra": {"matchId": "NESTED"}},
+                "metadata": {"matchId": "NA1_1", "participants": []}}
+    assert timeline_match_id(timeline) == "NA1_1"
+    assert timeline_match_id(json.dumps(timeline)) == "NA1_1"
+    assert timeline_match_id(json.dumps(timeline).encode()) == "NA1_1"
+    assert timeline_match_id(json.dumps({"metadata": {"matchId": "NA1_2"}})) \
+           == "NA1_2"
+    assert timeline_match_id('{"info": {}}') is None
@@ -0,0 +1,27 @@
+from abc import ABC, abstractmethod
+
+
+class _ApiProxy(ABC):
+    """Base of the wrapped versions of an api of a watcher, like
+    ``watcher.match``. Methods are looked up at each call, in ``api``
+    or else in the api ``name`` of ``watcher.watcher``, and wrapped by
+    ``_wrap``. Other attributes are those of the api."""
+    def __init__(self, watcher, name:str, api=None) -> None:
+        self._watcher = watcher
+        self._name = name
+        self._api = api
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        api = self._api if self._api is not None \
+              else getattr(self._watcher.watcher, self._name)
+        method = getattr(api, name)
+        if not callable(method):
+            return method
+        return self._wrap(f"{self._name}.{name}", method)
+
+    @abstractmethod
+    def _wrap(self, endpoint:str, method):
+        """Return the wrapped version of ``method``, the method of
+        ``endpoint`` (like ``"summoner.by_id"``)."""
@@ -0,0 +1,40 @@
+import asyncio
+
+from .ApiProxy import _ApiProxy
+from .DummyWatcher import DummyWatcher
+
+
+class AsyncDummyWatcher:
+    """
+    An asynchronous DummyWatcher for testing purpose. Each method is a
+    coroutine returning the same result as DummyWatcher, after 
+    ``latency`` seconds. The maximum number of calls awaited at once is
+    recorded in ``max_in_flight_``.
+    """
+    def __init__(self, latency:float=0.0) -> None:
+        self.latency = latency
+        self.calls_ = 0
+        self.in_flight_ = 0
+        self.max_in_flight_ = 0
+        watcher = DummyWatcher()
+        self.league = _AsyncDummyApi(self, "league", watcher.league)
+        self.summoner = _AsyncDummyApi(self, "summoner", watcher.summoner)
+        self.match = _AsyncDummyApi(self, "match", watcher.match)
+
+    async def _call(self, method, *args):
+        self.calls_ += 1
+        self.in_flight_ += 1
+        self.max_in_flight_ = max(self.max_in_flight_, self.in_flight_)
+        try:
+            await asyncio.sleep(self.latency)
+            return method(*args)
+        finally:
+            self.in_flight_ -= 1
+
+
+class _AsyncDummyApi(_ApiProxy):
+    """Coroutine version of the methods of a dummy api."""
+    def _wrap(self, endpoint:str, method):
+        async def call(*args):
+            return await self._watcher._call(method, *args)
+        return call
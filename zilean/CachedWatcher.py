@@ -0,0 +1,143 @@
+import json
+import asyncio
+from time import time
+
+from .SQLiteDatabase import _SQLiteDatabase
+from .ApiProxy import _ApiProxy
+
+
+class CachedWatcher(_SQLiteDatabase):
+    """CachedWatcher wraps a ``riotwatcher.LolWatcher`` (or a
+    :class:`zilean.DummyWatcher`) with a persistent cache of its
+    responses, so that repeated crawls do not spend their rate limits
+    on the same league and summoner lookups.
+
+    Responses are cached per endpoint (like ``"summoner.by_id"``) and
+    arguments, for the time to live of the endpoint in ``ttls``. The
+    puuid of a summoner never changes, so summoners are cached for
+    good, while league lists are refreshed after a few hours. Other
+    endpoints, like the match lists of a player, are never cached.
+    The cache is a single SQLite database, and may be shared by the
+    threads of an asynchronous crawl. Methods of the wrapped watcher
+    which are coroutines stay coroutines. Rate limits belong to the
+    wrapped watcher, as in ``TimelineCrawler``, so that the responses
+    found in the cache never wait on them.
+
+    Attributes
+    ----------
+    watcher : riotwatcher.LolWatcher
+        The wrapped watcher.
+    path : str
+        File name of the SQLite database. It is created if it does not
+        exist.
+    ttls : dict, optional
+        Time to live (in seconds) of the responses of each endpoint,
+        None to never expire. Endpoints not listed are not cached.
+        Defaults to ``CachedWatcher.default_ttls_``.
+    hits : int
+        Number of responses found in the cache.
+    misses : int
+        Number of cacheable requests sent to the watcher.
+    """
+
+    default_ttls_ = {"summoner.by_id": None,
+                     "summoner.by_puuid": None,
+                     "league.challenger_by_queue": 6 * 3600,
+                     "league.grandmaster_by_queue": 6 * 3600,
+                     "league.masters_by_queue": 6 * 3600,
+                     "league.entries": 6 * 3600,
+                     "league.by_id": 6 * 3600}
+
+    def __init__(self, watcher, path:str, ttls:dict=None) -> None:
+        super().__init__(path)
+        self.watcher = watcher
+        self.ttls = dict(self.default_ttls_ if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self._stats = {}
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (" +
+                         "endpoint TEXT, args TEXT, response TEXT, " +
+                         "expires REAL, PRIMARY KEY (endpoint, args))")
+        self.league = _CachedApi(self, "league")
+        self.summoner = _CachedApi(self, "summoner")
+        self.match = _CachedApi(self, "match")
+
+
+    def __getattr__(self, name):
+        # Anything else is the wrapped watcher's
+        if name == "watcher":
+            raise AttributeError(name)
+        return getattr(self.watcher, name)
+
+
+    def _get(self, endpoint:str, args:str) -> tuple:
+        """Look a response up, and return whether it was found with
+        the response."""
+        with self._lock:
+            row = self._db.execute("SELECT response, expires FROM " +
+                                   "responses WHERE endpoint = ? AND " +
+                                   "args = ?", (endpoint, args)).fetchone()
+            found = row is not None and (row[1] is None or row[1] > time())
+            stats = self._stats.setdefault(endpoint, {"hits": 0,
+                                                      "misses": 0})
+            stats["hits" if found else "misses"] += 1
+            if found:
+                self.hits += 1
+                return True, json.loads(row[0])
+            self.misses += 1
+            return False, None
+
+
+    def _put(self, endpoint:str, args:str, response) -> None:
+        ttl = self.ttls[endpoint]
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses " +
+                             "VALUES (?, ?, ?, ?)",
+                             (endpoint, args, json.dumps(response),
+                              None if ttl is None else time() + ttl))
+
+
+    def stats(self) -> dict:
+        """Return the number of "hits" and "misses" of each cached
+        endpoint."""
+        with self._lock:
+            return {endpoint: dict(stats)
+                    for endpoint, stats in self._stats.items()}
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses")\
+                       .fetchone()[0]
+
+
+    def clear(self) -> None:
+        """Delete all the cached responses."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+
+
+class _CachedApi(_ApiProxy):
+    """Cached version of the methods of an api of the watcher."""
+    def _wrap(self, endpoint:str, method):
+        if endpoint not in self._watcher.ttls or \
+           self._watcher.ttls[endpoint] == 0:
+            return method
+        cache = self._watcher
+        if asyncio.iscoroutinefunction(method):
+            async def call(*args):
+                key = json.dumps(args)
+                found, response = cache._get(endpoint, key)
+                if not found:
+                    response = await method(*args)
+                    cache._put(endpoint, key, response)
+                return response
+        else:
+            def call(*args):
+                key = json.dumps(args)
+                found, response = cache._get(endpoint, key)
+                if not found:
+                    response = method(*args)
+                    cache._put(endpoint, key, response)
+                return response
+        return call
@@ -0,0 +1,406 @@
+import os
+import multiprocessing
+from contextlib import contextmanager
+from time import time
+from tqdm import tqdm
+
+from .SQLiteDatabase import _SQLiteDatabase
+
+
+class CrawlCoordinator(_SQLiteDatabase):
+    """CrawlCoordinator splits crawls into work items shared by several
+    crawlers, usually in separate processes with their own API key or
+    region (see ``run`` and ``TimelineCrawler.crawl_worker``).
+
+    The frontier of a crawl is a queue of work items, stored in a
+    SQLite database: the leagues of a tier, the accounts of a league,
+    and the matches of an account. Crawlers lease the items of their
+    region, tier and queue, and add the items they discover. A lease
+    expires after ``lease_seconds`` unless renewed, so the items of a
+    crawler which crashed are crawled by the others. The matchIds are
+    claimed in the same database before their download, and recorded
+    as soon as they are written, so that no match is downloaded twice
+    across crawlers, except for a match whose crawler crashed between
+    its download and its record. Each crawler writes the matches to
+    its own shard.
+
+    Attributes
+    ----------
+    path : str
+        File name of the SQLite database. It is created if it does not
+        exist, and an existing one continues its crawl.
+    lease_seconds : float
+        Seconds before an item leased by a crawler is given to another
+        one, unless the lease is renewed. Defaults to 300.
+    """
+
+    # Items leased first: accounts, then leagues, then tiers
+    _kinds = ["entry", "league", "tier"]
+
+    def __init__(self, path:str, lease_seconds:float=300) -> None:
+        super().__init__(path, timeout=60, isolation_level=None)
+        self.lease_seconds = lease_seconds
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY, kind TEXT, region TEXT, tier TEXT,
+                queue TEXT, key TEXT, state TEXT DEFAULT 'pending',
+                worker TEXT, lease_until REAL,
+                UNIQUE (kind, region, tier, queue, key));
+            CREATE INDEX IF NOT EXISTS items_state ON items (state);
+            CREATE TABLE IF NOT EXISTS matches (
+                matchId TEXT PRIMARY KEY, item INTEGER, written INTEGER)
+                WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS matches_item ON matches (item);
+            CREATE TABLE IF NOT EXISTS workers (
+                worker TEXT PRIMARY KEY, kept INTEGER DEFAULT 0,
+                downloaded INTEGER DEFAULT 0, items INTEGER DEFAULT 0,
+                last_seen REAL);
+        """)
+
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the write lock of the database."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+
+    def add(self, kind:str, region:str, tier:str, queue:str,
+            keys:list=[None]) -> None:
+        """Add work items, unless they were already added.
+
+        Parameters
+        ----------
+        kind : str
+            "tier" (list the leagues of the tier), "league" (list the
+            accounts of the league ``key``) or "entry" (crawl the
+            matches of the summoner ``key``).
+        region : str
+            The region of the items.
+        tier : str
+            The tier of the items.
+        queue : str
+            The queue of the items.
+        keys : list
+            The leagueIds or summonerIds of the items, ``[None]`` for a
+            tier.
+        """
+        if kind not in self._kinds:
+            raise ValueError(f"Invalid kind of item. Must be one of " +
+                             f"{self._kinds}.")
+        with self._transaction() as db:
+            # NULL keys are never equal, tiers are keyed by ""
+            db.executemany("INSERT OR IGNORE INTO items (kind, region, " +
+                           "tier, queue, key) VALUES (?, ?, ?, ?, ?)",
+                           [(kind, region, tier, queue, key or "")
+                            for key in keys])
+
+
+    def _reclaim(self, db, condition:str, args:tuple) -> None:
+        """Make leased items pending again, and release the matches
+        they claimed but did not write."""
+        items = [row[0] for row in db.execute(
+            "SELECT id FROM items WHERE state = 'leased' AND " + condition,
+            args)]
+        for start in range(0, len(items), self._batch_size):
+            batch = items[start:start + self._batch_size]
+            marks = ','.join('?' * len(batch))
+            db.execute("DELETE FROM matches WHERE written = 0 AND " +
+                       f"item IN ({marks})", batch)
+            db.execute("UPDATE items SET state = 'pending', worker = NULL, " +
+                       f"lease_until = NULL WHERE id IN ({marks})", batch)
+
+
+    def lease(self, worker:str, region:str, tier:str, queue:str) -> dict:
+        """Lease the next pending item of a region, tier and queue.
+        Expired leases are reclaimed first.
+
+        Parameters
+        ----------
+        worker : str
+            Name of the crawler leasing the item.
+        region : str
+            The region of the crawler.
+        tier : str
+            The tier of the crawler.
+        queue : str
+            The queue of the crawler.
+
+        Returns
+        -------
+        dict
+            The "id", "kind" and "key" of the item, or None if no item
+            is pending.
+        """
+        now = time()
+        with self._transaction() as db:
+            self._reclaim(db, "lease_until < ?", (now,))
+            row = db.execute(
+                "SELECT id, kind, key FROM items WHERE state = 'pending' " +
+                "AND region = ? AND tier = ? AND queue = ? ORDER BY " +
+                "CASE kind WHEN 'entry' THEN 0 WHEN 'league' THEN 1 " +
+                "ELSE 2 END, id LIMIT 1", (region, tier, queue)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE items SET state = 'leased', worker = ?, " +
+                       "lease_until = ? WHERE id = ?",
+                       (worker, now + self.lease_seconds, row[0]))
+            self._seen(db, worker, now)
+        return {"id": row[0], "kind": row[1], "key": row[2] or None}
+
+
+    def renew(self, item:int, worker:str) -> bool:
+        """Renew the lease of an item, and return whether the worker
+        still holds it."""
+        now = time()
+        with self._transaction() as db:
+            renewed = db.execute(
+                "UPDATE items SET lease_until = ? WHERE id = ? AND " +
+                "state = 'leased' AND worker = ?",
+                (now + self.lease_seconds, item, worker)).rowcount == 1
+            self._seen(db, worker, now)
+        return renewed
+
+
+    def record(self, item:int, worker:str, match_id:str,
+               kept:bool) -> bool:
+        """Record a match downloaded for a leased item, once it is
+        written to the shard of the worker, and renew the lease. The
+        match stays claimed even if the lease was lost meanwhile,
+        unless it was claimed again since (by another item, or by the
+        same item leased by another worker). That match is then left
+        to the new claim, and not counted as kept.
+
+        Parameters
+        ----------
+        item : int
+            The id of the item.
+        worker : str
+            Name of the crawler.
+        match_id : str
+            The matchId of the downloaded match.
+        kept : bool
+            Whether the match was written, or dropped by the cutoff.
+
+        Returns
+        -------
+        bool
+            Whether the match was recorded for the item, and the worker
+            still holds the item.
+        """
+        now = time()
+        with self._transaction() as db:
+            renewed = db.execute(
+                "UPDATE items SET lease_until = ? WHERE id = ? AND " +
+                "state = 'leased' AND worker = ?",
+                (now + self.lease_seconds, item, worker)).rowcount == 1
+            owner = db.execute("SELECT item FROM matches WHERE " +
+                               "matchId = ?", (match_id,)).fetchone()
+            # Claims of a lost item are released, claim the match again
+            if owner is None:
+                db.execute("INSERT INTO matches VALUES (?, ?, 1)",
+                           (match_id, item))
+            elif renewed and owner[0] == item:
+                db.execute("UPDATE matches SET written = 1 WHERE " +
+                           "matchId = ? AND item = ?", (match_id, item))
+            recorded = owner is None or (renewed and owner[0] == item)
+            self._seen(db, worker, now)
+            db.execute("UPDATE workers SET kept = kept + ?, downloaded = " +
+                       "downloaded + 1 WHERE worker = ?",
+                       (int(kept and recorded), worker))
+        return renewed and recorded
+
+
+    def release(self, worker:str) -> None:
+        """Give the items leased by a worker (for example one which
+        crashed) to the other workers at once."""
+        with self._transaction() as db:
+            self._reclaim(db, "worker = ?", (worker,))
+
+
+    def claim(self, item:int, match_ids:list) -> list:
+        """Claim matches for download, and return the matchIds which
+        were not claimed before, in order."""
+        match_ids = list(dict.fromkeys(match_ids))
+        claimed = []
+        with self._transaction() as db:
+            for match_id in match_ids:
+                if db.execute("INSERT OR IGNORE INTO matches VALUES " +
+                              "(?, ?, 0)", (match_id, item)).rowcount:
+                    claimed.append(match_id)
+        return claimed
+
+
+    def complete(self, item:int, worker:str, children:list=[],
+                 unused:list=[]) -> None:
+        """Complete a leased item, once its matches are recorded (see
+        ``record``).
+
+        Parameters
+        ----------
+        item : int
+            The id of the item.
+        worker : str
+            Name of the crawler.
+        children : list
+            Items discovered, as tuples of arguments of ``add``.
+        unused : list
+            Claimed matchIds which were not downloaded, released for
+            other items.
+        """
+        now = time()
+        with self._transaction() as db:
+            for kind, region, tier, queue, keys in children:
+                db.executemany("INSERT OR IGNORE INTO items (kind, region, " +
+                               "tier, queue, key) VALUES (?, ?, ?, ?, ?)",
+                               [(kind, region, tier, queue, key or "")
+                                for key in keys])
+            db.executemany("DELETE FROM matches WHERE matchId = ? AND " +
+                           "item = ?", [(x, item) for x in unused])
+            db.execute("UPDATE items SET state = 'done', lease_until = NULL " +
+                       "WHERE id = ?", (item,))
+            self._seen(db, worker, now)
+            db.execute("UPDATE workers SET items = items + 1 WHERE " +
+                       "worker = ?", (worker,))
+
+
+    @staticmethod
+    def _seen(db, worker:str, now:float) -> None:
+        db.execute("INSERT OR IGNORE INTO workers (worker) VALUES (?)",
+                   (worker,))
+        db.execute("UPDATE workers SET last_seen = ? WHERE worker = ?",
+                   (now, worker))
+
+
+    def kept(self) -> int:
+        """Number of matches written by all the workers."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(kept), 0) FROM " +
+                                    "workers").fetchone()[0]
+
+
+    def finished(self, region:str, tier:str, queue:str) -> bool:
+        """Whether all the items of a region, tier and queue are done."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM items WHERE state != 'done' AND " +
+                "region = ? AND tier = ? AND queue = ?",
+                (region, tier, queue)).fetchone()[0] == 0
+
+
+    def progress(self) -> dict:
+        """Return the progress of the crawl.
+
+        Returns
+        -------
+        dict
+            The number of "items" by state (pending, leased, done),
+            the total matches "kept" and "downloaded", and the "kept",
+            "downloaded", "items" done and "last_seen" time of each of
+            the "workers".
+        """
+        items = {"pending": 0, "leased": 0, "done": 0}
+        with self._lock:
+            items.update(self._db.execute("SELECT state, COUNT(*) FROM " +
+                                          "items GROUP BY state").fetchall())
+            workers = {row[0]: {"kept": row[1], "downloaded": row[2],
+                                "items": row[3], "last_seen": row[4]}
+                       for row in self._db.execute(
+                           "SELECT worker, kept, downloaded, items, " +
+                           "last_seen FROM workers ORDER BY worker")}
+        return {"items": items,
+                "kept": sum(w["kept"] for w in workers.values()),
+                "downloaded": sum(w["downloaded"] for w in workers.values()),
+                "workers": workers}
+
+
+    def run(self, n:int, crawlers:dict, directory:str, match_per_id:int=15,
+            cutoff:int=16, poll:float=1.0) -> list:
+        """Crawl with several crawlers, each in its own process, until
+        ``n`` matches are written in total or no item is left. A
+        crawler which crashes has its items given to the others.
+
+        Parameters
+        ----------
+        n : int
+            The number of unique matches to be crawled, in total. Each
+            crawler may write up to ``match_per_id`` more matches.
+        crawlers : dict
+            The keyword arguments of the :class:`zilean.TimelineCrawler`
+            of each worker, by worker name. For example, one per API
+            key or per region.
+        directory : str
+            The directory of the shards, one JSONL file per worker
+            (see ``TimelineCrawler.crawl_worker``).
+        match_per_id : int
+            The number of matches to be crawled for each account.
+            Defaults to 15.
+        cutoff : int
+            The mininum number of minutes required for a match to be
+            kept. Defaults to 16.
+        poll : float
+            Seconds between two progress updates. Defaults to 1.
+
+        Returns
+        -------
+        list
+            The file names of the shards.
+        """
+        if n <= 0:
+            raise ValueError("Invalid number of matched to be crawled.")
+        os.makedirs(directory, exist_ok=True)
+        for worker, kwargs in crawlers.items():
+            # Leftovers of an interrupted run
+            self.release(worker)
+            self.add("tier", kwargs["region"], kwargs["tier"],
+                     kwargs["queue"])
+        processes = {}
+        for worker, kwargs in crawlers.items():
+            processes[worker] = multiprocessing.Process(
+                target=_crawl_worker, args=(self.path, self.lease_seconds,
+                                            worker, kwargs, directory, n,
+                                            match_per_id, cutoff, poll))
+            processes[worker].start()
+
+        pbar = tqdm(total=n, initial=min(n, self.kept()))
+        pbar.set_description("Crawling matches")
+        try:
+            while processes:
+                for worker, process in list(processes.items()):
+                    process.join(timeout=poll / len(processes))
+                    if process.exitcode is None:
+                        continue
+                    del processes[worker]
+                    if process.exitcode != 0:
+                        print(f"Worker {worker} crashed, its items are " +
+                              "given to the other workers.")
+                        self.release(worker)
+                pbar.update(min(n, self.kept()) - pbar.n)
+        finally:
+            for process in processes.values():
+                process.terminate()
+            pbar.close()
+        return [os.path.join(directory, f"{worker}.jsonl")
+                for worker in crawlers
+                if os.path.exists(os.path.join(directory, f"{worker}.jsonl"))]
+
+
+def _crawl_worker(path:str, lease_seconds:float, worker:str, kwargs:dict,
+                  directory:str, n:int, match_per_id:int, cutoff:int,
+                  poll:float) -> None:
+    """Run a worker of ``CrawlCoordinator.run``."""
+    from .TimelineCrawler import TimelineCrawler
+    coordinator = CrawlCoordinator(path, lease_seconds)
+    try:
+        TimelineCrawler(**kwargs).crawl_worker(
+            coordinator, worker, os.path.join(directory, f"{worker}.jsonl"),
+            n, match_per_id, cutoff, poll)
+    finally:
+        coordinator.close()
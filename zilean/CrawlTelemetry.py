@@ -0,0 +1,318 @@
+import json
+import asyncio
+import threading
+from bisect import bisect_left
+from time import monotonic, perf_counter
+
+from .core import atomic_write
+from .ApiProxy import _ApiProxy
+
+
+class CrawlTelemetry:
+    """CrawlTelemetry records where the time of a crawl goes (see
+    ``TimelineCrawler.telemetry``). For each endpoint of the watcher
+    (like ``"match.timeline_by_match"``), it tracks the number of
+    calls, a histogram of their latencies, the bytes received, the
+    failed calls by HTTP status, and the retries. For the whole crawl,
+    it also tracks the time spent waiting on rate limits, the matches
+    skipped as duplicates, and the matches kept or dropped by the
+    cutoff.
+
+    The measures can be exported as a JSON snapshot (``snapshot``) or
+    in the Prometheus text format (``to_prometheus``), and dumped to a
+    file every ``dump_interval`` seconds during long crawls.
+
+    Attributes
+    ----------
+    buckets : list
+        Upper bounds (in seconds) of the latency histogram buckets.
+        Defaults to ``CrawlTelemetry.default_buckets_``.
+    dump_file : str, optional
+        File name to periodically write the measures to, in the
+        Prometheus text format if it ends with ".prom", as JSON
+        otherwise. Defaults to None (no dump).
+    dump_interval : float
+        Seconds between two dumps, defaults to 60.
+    """
+
+    default_buckets_ = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+    def __init__(self, buckets:list=None, dump_file:str=None,
+                 dump_interval:float=60) -> None:
+        self.buckets = sorted(self.default_buckets_ if buckets is None
+                              else buckets)
+        self.dump_file = dump_file
+        self.dump_interval = dump_interval
+        self._lock = threading.RLock()
+        self.reset()
+
+
+    def reset(self) -> None:
+        """Forget all the measures."""
+        with self._lock:
+            self._start = monotonic()
+            self._last_dump = self._start
+            self._endpoints = {}
+            self._duplicates = {}
+            self._matches = {"kept": 0, "dropped": 0}
+            self._rate_limit_wait = 0.0
+
+
+    def _endpoint(self, endpoint:str) -> dict:
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = {
+                "calls": 0, "errors": {}, "retries": 0, "bytes": 0,
+                "seconds": 0.0, "buckets": [0] * (len(self.buckets) + 1)}
+        return self._endpoints[endpoint]
+
+
+    def record(self, endpoint:str, seconds:float, n_bytes:int=0,
+               status:int=None) -> None:
+        """Record a call to the watcher.
+
+        Parameters
+        ----------
+        endpoint : str
+            The api and method called, like ``"summoner.by_id"``.
+        seconds : float
+            Latency of the call.
+        n_bytes : int
+            Size of the response body. Defaults to 0.
+        status : int, optional
+            HTTP status of a failed call, or 0 if the call failed
+            without one. Defaults to None (success).
+        """
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats["calls"] += 1
+            stats["bytes"] += n_bytes
+            stats["seconds"] += seconds
+            stats["buckets"][bisect_left(self.buckets, seconds)] += 1
+            if status is not None:
+                stats["errors"][status] = stats["errors"].get(status, 0) + 1
+        self._maybe_dump()
+
+
+    def retry(self, endpoint:str) -> None:
+        """Record that a call to ``endpoint`` is retried."""
+        with self._lock:
+            self._endpoint(endpoint)["retries"] += 1
+
+
+    def wait(self, seconds:float) -> None:
+        """Record time spent waiting on rate limits."""
+        with self._lock:
+            self._rate_limit_wait += seconds
+
+
+    def duplicate(self, source:str) -> None:
+        """Record a match skipped without downloading it, because it
+        was already crawled (``"visited"``) or is in the dedupe store
+        (``"store"``)."""
+        with self._lock:
+            self._duplicates[source] = self._duplicates.get(source, 0) + 1
+
+
+    def match(self, kept:bool) -> None:
+        """Record a downloaded match, kept or dropped by the cutoff."""
+        with self._lock:
+            self._matches["kept" if kept else "dropped"] += 1
+
+
+    def snapshot(self) -> dict:
+        """Return the measures as a JSON serializable dictionary.
+
+        Returns
+        -------
+        dict
+            With the "elapsed" seconds since the start (or ``reset``),
+            the "endpoints" (calls, errors by status, retries, bytes,
+            total "seconds" and cumulative latency "histogram" of
+            each endpoint), the "rate_limit_wait" seconds, the
+            "duplicates" by source, the "matches" kept and dropped,
+            the "matches_per_call" (kept matches per call to the API)
+            and the "matches_per_second".
+        """
+        with self._lock:
+            elapsed = monotonic() - self._start
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                cumulative, histogram = 0, {}
+                for bound, count in zip(self.buckets + ["+Inf"],
+                                        stats["buckets"]):
+                    cumulative += count
+                    histogram[str(bound)] = cumulative
+                endpoints[endpoint] = {
+                    "calls": stats["calls"],
+                    "errors": {str(k): v for k, v in stats["errors"].items()},
+                    "retries": stats["retries"], "bytes": stats["bytes"],
+                    "seconds": stats["seconds"], "histogram": histogram}
+            calls = sum(stats["calls"] for stats in self._endpoints.values())
+            kept = self._matches["kept"]
+            return {"elapsed": elapsed, "endpoints": endpoints,
+                    "rate_limit_wait": self._rate_limit_wait,
+                    "duplicates": dict(self._duplicates),
+                    "matches": dict(self._matches),
+                    "matches_per_call": kept / calls if calls else 0.0,
+                    "matches_per_second": kept / elapsed if elapsed else 0.0}
+
+
+    def to_json(self) -> str:
+        """Return ``snapshot`` as JSON text."""
+        return json.dumps(self.snapshot())
+
+
+    def to_prometheus(self) -> str:
+        """Return the measures in the Prometheus text exposition
+        format, with metric names prefixed by ``zilean_crawl_``."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP zilean_crawl_{name} {help}")
+            lines.append(f"# TYPE zilean_crawl_{name} {kind}")
+            for suffix, labels, value in samples:
+                labels = ",".join(f'{key}="{value}"'
+                                  for key, value in labels.items())
+                labels = "{" + labels + "}" if labels else ""
+                lines.append(f"zilean_crawl_{name}{suffix}{labels} {value}")
+
+        endpoints = snapshot["endpoints"]
+        metric("requests_total", "counter", "Calls to the Riot API.",
+               [("", {"endpoint": e}, s["calls"])
+                for e, s in endpoints.items()])
+        metric("request_errors_total", "counter",
+               "Failed calls to the Riot API, by HTTP status.",
+               [("", {"endpoint": e, "status": status}, count)
+                for e, s in endpoints.items()
+                for status, count in s["errors"].items()])
+        metric("request_retries_total", "counter",
+               "Retried calls to the Riot API.",
+               [("", {"endpoint": e}, s["retries"])
+                for e, s in endpoints.items()])
+        metric("response_bytes_total", "counter",
+               "Bytes received from the Riot API.",
+               [("", {"endpoint": e}, s["bytes"])
+                for e, s in endpoints.items()])
+        samples = []
+        for e, s in endpoints.items():
+            samples += [("_bucket", {"endpoint": e, "le": bound}, count)
+                        for bound, count in s["histogram"].items()]
+            samples += [("_sum", {"endpoint": e}, s["seconds"]),
+                        ("_count", {"endpoint": e}, s["calls"])]
+        metric("request_seconds", "histogram",
+               "Latency of the calls to the Riot API.", samples)
+        metric("rate_limit_wait_seconds_total", "counter",
+               "Time spent waiting on rate limits.",
+               [("", {}, snapshot["rate_limit_wait"])])
+        metric("duplicates_total", "counter",
+               "Matches skipped without downloading them.",
+               [("", {"source": source}, count)
+                for source, count in snapshot["duplicates"].items()])
+        metric("matches_total", "counter",
+               "Downloaded matches, kept or dropped by the cutoff.",
+               [("", {"status": status}, count)
+                for status, count in snapshot["matches"].items()])
+        metric("matches_per_request", "gauge",
+               "Kept matches per call to the Riot API.",
+               [("", {}, snapshot["matches_per_call"])])
+        return "\n".join(lines) + "\n"
+
+
+    def dump(self) -> None:
+        """Write the measures to ``dump_file``, replacing it."""
+        if self.dump_file is None:
+            return
+        with self._lock:
+            self._last_dump = monotonic()
+            text = self.to_prometheus() if self.dump_file.endswith(".prom") \
+                   else self.to_json()
+        with atomic_write(self.dump_file) as f:
+            f.write(text)
+
+
+    def _maybe_dump(self) -> None:
+        if self.dump_file is not None and \
+           monotonic() - self._last_dump >= self.dump_interval:
+            self.dump()
+
+
+    def wrap(self, watcher):
+        """Return a watcher recording the calls to ``watcher``. Other
+        attributes are those of ``watcher``."""
+        return _InstrumentedWatcher(self, watcher)
+
+
+class _InstrumentedWatcher:
+    """A watcher recording its calls in a CrawlTelemetry."""
+    def __init__(self, telemetry:CrawlTelemetry, watcher) -> None:
+        self.telemetry = telemetry
+        self.watcher = watcher
+        # Size of the last response received by each thread, when the
+        # watcher sends its requests through a `requests.Session`
+        self._local = threading.local()
+        session = getattr(getattr(watcher, "_base_api", None),
+                          "_session", None)
+        self._sized = session is not None
+        if self._sized:
+            session.hooks["response"].append(self._on_response)
+        self.league = _InstrumentedApi(self, "league")
+        self.summoner = _InstrumentedApi(self, "summoner")
+        self.match = _InstrumentedApi(self, "match")
+
+    def __getattr__(self, name):
+        if name == "watcher":
+            raise AttributeError(name)
+        return getattr(self.watcher, name)
+
+    def _on_response(self, response, *args, **kwargs):
+        self._local.n_bytes = len(response.content)
+
+    def _size(self, response) -> int:
+        """Size of ``response``, estimated from its JSON text unless
+        the HTTP response was seen."""
+        if self._sized:
+            n_bytes, self._local.n_bytes = getattr(self._local, "n_bytes",
+                                                   0), 0
+            return n_bytes
+        try:
+            return len(json.dumps(response))
+        except (TypeError, ValueError):
+            return 0
+
+
+def _status(error:Exception) -> int:
+    """HTTP status of a failed call, 0 if there is none."""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or 0
+
+
+class _InstrumentedApi(_ApiProxy):
+    """Recorded version of the methods of an api of the watcher."""
+    def _wrap(self, endpoint:str, method):
+        watcher, telemetry = self._watcher, self._watcher.telemetry
+        if asyncio.iscoroutinefunction(method):
+            async def call(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    response = await method(*args, **kwargs)
+                except Exception as error:
+                    telemetry.record(endpoint, perf_counter() - start,
+                                     status=_status(error))
+                    raise
+                telemetry.record(endpoint, perf_counter() - start,
+                                 watcher._size(response))
+                return response
+        else:
+            def call(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    response = method(*args, **kwargs)
+                except Exception as error:
+                    telemetry.record(endpoint, perf_counter() - start,
+                                     status=_status(error))
+                    raise
+                telemetry.record(endpoint, perf_counter() - start,
+                                 watcher._size(response))
+                return response
+        return call
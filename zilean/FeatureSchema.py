@@ -0,0 +1,251 @@
+import re
+import numpy as np
+
+
+class FeatureSchema:
+    """FeatureSchema describes the columns of a summary produced by
+    :class:`zilean.SnapShots`: which feature, lane and frame each
+    column holds, in which order, and under which name.
+
+    Columns are always laid out by frame, then lane, then feature.
+    Column names follow the format "FEATURE_LANE_frame#", or
+    "FEATURE_LANE" when the summary has a single frame.
+
+    Schemas are immutable and memoized: use ``FeatureSchema.get`` or
+    ``FeatureSchema.from_names`` rather than the constructor, so that
+    all the matches and SnapShots with the same configuration share a
+    single schema. The player features already reflect the
+    ``creep_score`` and ``porportion`` options of SnapShots, so a
+    schema is effectively keyed by ``(frames, creep_score, porportion)``.
+
+    Attributes
+    ----------
+    frames : list
+        Frames (in minutes) of the columns.
+    lanes : list
+        Lanes of the columns, as integers from 0 (TOP) to 4 (SUP).
+    features : list
+        Player features of the columns.
+    feature_integer : list
+        Whether each of ``features`` holds integer values.
+    frame_suffix : bool
+        Whether column names end with "_frame#".
+    shape : tuple
+        Number of frames, lanes and features.
+    names_ : list
+        Name of each column.
+    index_ : dict
+        Index of each column, by name.
+    integer_ : numpy.ndarray
+        Whether each column holds integer values.
+    feature_info_ : list
+        For each column, a dictionary with its "name", "feature",
+        "lane" and "frame", followed by the special "matchId" and
+        "win" columns (with None as feature, lane and frame).
+    frame_names_ : list
+        Names of the columns of the per frame summary, where each
+        row only holds a single frame.
+    frame_integer_ : numpy.ndarray
+        Whether each column of the per frame summary holds integer
+        values.
+    """
+
+    # All the schemas created, see `FeatureSchema.get`
+    _schemas = {}
+
+    def __init__(self, frames:tuple, features:tuple, feature_integer:tuple,
+                 lanes:tuple, frame_suffix:bool) -> None:
+        self.frames = list(frames)
+        self.lanes = list(lanes)
+        self.features = list(features)
+        self.feature_integer = list(feature_integer)
+        self.frame_suffix = frame_suffix
+        self.shape = (len(self.frames), len(self.lanes), len(self.features))
+
+        self.names_ = []
+        self.feature_info_ = []
+        for frame in self.frames:
+            for lane in self.lanes:
+                for feature in self.features:
+                    name = feature+'_'+str(lane)
+                    if frame_suffix:
+                        name += '_frame'+str(frame)
+                    self.names_.append(name)
+                    self.feature_info_.append({"name": name,
+                                               "feature": feature,
+                                               "lane": lane,
+                                               "frame": frame})
+        for name in ["matchId", "win"]:
+            self.feature_info_.append({"name": name, "feature": None,
+                                       "lane": None, "frame": None})
+        self.index_ = {name: i for i, name in enumerate(self.names_)}
+        self.integer_ = np.tile(np.asarray(self.feature_integer, dtype=bool),
+                                len(self.frames) * len(self.lanes))
+        self.frame_names_ = [feature+'_'+str(lane) for lane in self.lanes
+                             for feature in self.features]
+        self.frame_integer_ = self.integer_[:len(self.frame_names_)]
+        self._subsets = {}
+        self._groups = {}
+
+
+    @classmethod
+    def get(cls, frames:list, features:list, integer:list=None,
+            lanes:list=[0, 1, 2, 3, 4], frame_suffix:bool=None):
+        """Return the schema of a summary, creating it only the first
+        time it is asked for.
+
+        Parameters
+        ----------
+        frames : list
+            Frames (in minutes) of interest.
+        features : list
+            Player features, for example from
+            ``zilean.process_timeframes``.
+        integer : :obj:`list`, optional
+            Whether each of ``features`` holds integer values. Defaults
+            to None (no integer feature).
+        lanes : list
+            Lanes, defaults to all five lanes.
+        frame_suffix : :obj:`bool`, optional
+            Whether column names end with "_frame#". Defaults to None,
+            in which case only summaries of several frames have the
+            suffix.
+
+        Returns
+        -------
+        zilean.FeatureSchema
+            The schema.
+        """
+        if integer is None:
+            integer = [False] * len(features)
+        if frame_suffix is None:
+            frame_suffix = len(frames) > 1
+        key = (tuple(frames), tuple(features),
+               tuple(bool(x) for x in integer), tuple(lanes),
+               bool(frame_suffix))
+        if key not in cls._schemas:
+            cls._schemas[key] = cls(*key)
+        return cls._schemas[key]
+
+
+    @classmethod
+    def from_names(cls, names:list, integer:list=None, frames:list=[8]):
+        """Return the schema of a summary from the names of its columns,
+        for example the columns of a summary saved to disk. Feature
+        names may contain underscores.
+
+        Parameters
+        ----------
+        names : list
+            Names of the columns, excluding "matchId", "win" and
+            "frame".
+        integer : :obj:`list`, optional
+            Whether each column holds integer values. Defaults to None
+            (no integer column).
+        frames : list
+            The frame of columns whose names have no "_frame#" suffix.
+            Only the first frame is used. Defaults to [8].
+
+        Returns
+        -------
+        zilean.FeatureSchema
+            The schema.
+        """
+        layout, frame_suffix = [], False
+        for name in names:
+            match = (re.fullmatch(r"(.+)_(\d+)_frame(\d+)", name) or
+                     re.fullmatch(r"(.+)_(\d+)", name))
+            if not match:
+                raise ValueError(f"Invalid summary column {name}.")
+            frame_suffix = match.lastindex == 3
+            frame = int(match.group(3)) if frame_suffix else frames[0]
+            layout.append((frame, int(match.group(2)), match.group(1)))
+        schema_frames = list(dict.fromkeys(col[0] for col in layout))
+        lanes = list(dict.fromkeys(col[1] for col in layout))
+        features = list(dict.fromkeys(col[2] for col in layout))
+        schema = cls.get(schema_frames if names else frames, features,
+                         None if integer is None else
+                         list(integer)[:len(features)],
+                         lanes, frame_suffix)
+        if schema.names_ != list(names):
+            raise ValueError("Summary columns are not laid out by frame, " +
+                             "lane and feature.")
+        return schema
+
+
+    def subset(self, features:list=[], lanes:list=[], frames:list=[]) -> tuple:
+        """Return the schema of a subset of the columns, and the index
+        of the selected columns. An empty argument selects everything.
+
+        Parameters
+        ----------
+        features : list
+            Features of interest.
+        lanes : list
+            Lanes of interest, as integers.
+        frames : list
+            Frames of interest.
+
+        Returns
+        -------
+        tuple
+            The schema of the subset (column names keep the format of
+            this schema), and the index of its columns in this schema
+            as an integer array.
+        """
+        key = (tuple(features), tuple(lanes), tuple(frames))
+        if key not in self._subsets:
+            selected = [[x for x in values if not wanted or x in wanted]
+                        for values, wanted in [(self.frames, frames),
+                                               (self.lanes, lanes),
+                                               (self.features, features)]]
+            feature_integer = [self.feature_integer[self.features.index(f)]
+                               for f in selected[2]]
+            schema = FeatureSchema.get(selected[0], selected[2],
+                                       feature_integer, selected[1],
+                                       self.frame_suffix)
+            index = np.array([self.index_[name] for name in schema.names_],
+                             dtype=np.int64)
+            self._subsets[key] = (schema, index)
+        return self._subsets[key]
+
+
+    def groups(self, type:str, per_frame:bool=False) -> tuple:
+        """Return how columns are aggregated by ``SnapShots.agg``.
+
+        Parameters
+        ----------
+        type : str
+            Either "team" (aggregate the lanes) or "frame" (aggregate
+            the frames).
+        per_frame : bool
+            Aggregate the columns of the per frame summary instead,
+            defaults to False.
+
+        Returns
+        -------
+        tuple
+            The names of the aggregated features, and the index of the
+            columns aggregated into each of them as a 2-D integer array
+            (one row per aggregated feature).
+        """
+        key = (type, per_frame)
+        if key not in self._groups:
+            n_frames, n_lanes, n_features = self.shape
+            if per_frame:
+                n_frames = 1
+            index = np.arange(n_frames * n_lanes * n_features)\
+                      .reshape(n_frames, n_lanes, n_features)
+            if type == "team" and per_frame:
+                names = list(self.features)
+                index = index[0].T
+            elif type == "team":
+                names = [feature + "_frame" + str(frame)
+                         for frame in self.frames for feature in self.features]
+                index = index.transpose(0, 2, 1).reshape(-1, n_lanes)
+            else:
+                names = [feature + "_" + str(lane)
+                         for lane in self.lanes for feature in self.features]
+                index = index.transpose(1, 2, 0).reshape(-1, n_frames)
+            self._groups[key] = (names, index)
+        return self._groups[key]
@@ -0,0 +1,217 @@
+import json
+import hashlib
+import numpy as np
+
+from . import __version__
+from .SQLiteDatabase import _SQLiteDatabase
+
+
+class MatchCache(_SQLiteDatabase):
+    """MatchCache is an on-disk cache of processed matches, so that
+    matches seen by an earlier SnapShots are not processed again.
+
+    Each match is stored with the output of ``process_timeframes``
+    for that match, keyed by its matchId and a hash of the options
+    used to process it (frames, creep_score, porportion, events and
+    the version of zilean). The cache is a single SQLite database, and
+    may be shared by threads.
+    Once it grows above ``max_size`` bytes, the least recently used
+    matches are evicted.
+
+    Attributes
+    ----------
+    path : str
+        File name of the SQLite database. It is created if it does not
+        exist.
+    max_size : int
+        Maximum size (in bytes) of the stored summaries, defaults to
+        1 GiB. None for no limit.
+    hits : int
+        Number of matches found in the cache.
+    misses : int
+        Number of matches not found in the cache.
+    """
+
+    def __init__(self, path:str, max_size:int=1<<30) -> None:
+        super().__init__(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS configs (
+                config TEXT PRIMARY KEY, features TEXT, integer TEXT);
+            CREATE TABLE IF NOT EXISTS matches (
+                config TEXT, matchId TEXT, win INTEGER, "values" BLOB,
+                size INTEGER, used INTEGER,
+                PRIMARY KEY (config, matchId));
+            CREATE INDEX IF NOT EXISTS matches_used ON matches (used);
+        """)
+        self._size, self._clock = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(MAX(used), 0) " +
+            "FROM matches").fetchone()
+        self._configs = {}
+
+
+    @staticmethod
+    def config(frames:list=[8], creep_score:bool=True,
+               porportion:bool=True, events:bool=False) -> str:
+        """Return the hash of the options used to process matches.
+        Matches are only shared between identical options, and
+        different versions of zilean never share matches."""
+        options = json.dumps([list(frames), bool(creep_score),
+                              bool(porportion), bool(events), __version__])
+        return hashlib.sha1(options.encode()).hexdigest()
+
+
+    def _features(self, config:str) -> tuple:
+        """Return the player features stored for ``config``, or None."""
+        if config not in self._configs:
+            row = self._db.execute("SELECT features, integer FROM configs " +
+                                   "WHERE config = ?", (config,)).fetchone()
+            if row is None:
+                return None
+            self._configs[config] = (json.loads(row[0]), json.loads(row[1]))
+        return self._configs[config]
+
+
+    def features(self, config:str) -> dict:
+        """Return the player "features" of the matches stored for
+        ``config``, and whether each is an "integer", or None if no
+        match was stored for it."""
+        with self._lock:
+            features = self._features(config)
+        if features is None:
+            return None
+        return {"features": features[0], "integer": features[1]}
+
+
+    def get(self, config:str, match_ids:list) -> dict:
+        """Look up processed matches.
+
+        Parameters
+        ----------
+        config : str
+            Hash of the options, see ``MatchCache.config``.
+        match_ids : list
+            The matchId of the matches to look up.
+
+        Returns
+        -------
+        dict
+            The found matches, by matchId. Each value is a dictionary
+            with the match "values" (frames x 5 x features) and "win",
+            as in the output of ``process_timeframes``. The features
+            of the values are given by ``MatchCache.features``.
+        """
+        with self._lock:
+            features = self._features(config)
+            found = {}
+            if features is not None:
+                unique = list(dict.fromkeys(match_ids))
+                for start in range(0, len(unique), self._batch_size):
+                    batch = unique[start:start + self._batch_size]
+                    rows = self._db.execute(
+                        'SELECT matchId, win, "values" FROM matches ' +
+                        'WHERE config = ? AND matchId IN (' +
+                        ','.join('?' * len(batch)) + ')',
+                        [config] + batch).fetchall()
+                    for match_id, win, values in rows:
+                        found[match_id] = {
+                            "values": np.frombuffer(values, dtype=np.float64)\
+                                        .reshape(-1, 5, len(features[0])),
+                            "win": bool(win)}
+            if found:
+                # Found matches become the most recently used
+                self._clock += 1
+                with self._db:
+                    self._db.executemany(
+                        "UPDATE matches SET used = ? " +
+                        "WHERE config = ? AND matchId = ?",
+                        [(self._clock, config, key) for key in found])
+            n_hits = sum(match_id in found for match_id in match_ids)
+            self.hits += n_hits
+            self.misses += len(match_ids) - n_hits
+            return found
+
+
+    def put(self, config:str, processed:dict) -> None:
+        """Store processed matches, evicting the least recently used
+        matches if the cache grows above ``max_size``.
+
+        Parameters
+        ----------
+        config : str
+            Hash of the options, see ``MatchCache.config``.
+        processed : dict
+            Output of ``process_timeframes``.
+        """
+        with self._lock:
+            if not len(processed["matchId"]):
+                return
+            features = (list(processed["features"]),
+                        [bool(x) for x in processed["integer"]])
+            stored = self._features(config)
+            if stored is None:
+                with self._db:
+                    self._db.execute("INSERT INTO configs VALUES (?, ?, ?)",
+                                     (config, json.dumps(features[0]),
+                                      json.dumps(features[1])))
+                self._configs[config] = features
+            elif stored != features:
+                # Matches with other player features are not cached
+                return
+
+            self._clock += 1
+            values = np.ascontiguousarray(processed["values"], dtype=np.float64)
+            rows = [(config, match_id, bool(win), values[i].tobytes(),
+                     values[i].nbytes, self._clock)
+                    for i, (match_id, win) in enumerate(
+                        zip(processed["matchId"], processed["win"]))]
+            with self._db:
+                for row in rows:
+                    replaced = self._db.execute(
+                        "SELECT size FROM matches " +
+                        "WHERE config = ? AND matchId = ?",
+                        row[:2]).fetchone()
+                    self._size -= replaced[0] if replaced else 0
+                    self._db.execute("INSERT OR REPLACE INTO matches " +
+                                     "VALUES (?, ?, ?, ?, ?, ?)", row)
+                    self._size += row[4]
+            self._evict()
+
+
+    def _evict(self) -> None:
+        """Delete the least recently used matches until the cache fits
+        in ``max_size``."""
+        if self.max_size is None:
+            return
+        with self._db:
+            while self._size > self.max_size:
+                rows = self._db.execute(
+                    "SELECT rowid, size FROM matches ORDER BY used " +
+                    "LIMIT ?", (self._batch_size,)).fetchall()
+                if not rows:
+                    break
+                delete = []
+                for rowid, size in rows:
+                    if self._size <= self.max_size:
+                        break
+                    delete.append((rowid,))
+                    self._size -= size
+                self._db.executemany("DELETE FROM matches WHERE rowid = ?",
+                                     delete)
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM matches")\
+                       .fetchone()[0]
+
+
+    def clear(self) -> None:
+        """Delete all the stored matches."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM matches")
+            self._db.execute("DELETE FROM configs")
+            self._configs = {}
+            self._size = 0
@@ -0,0 +1,159 @@
+import os
+import math
+import hashlib
+
+from .core import *
+from .SQLiteDatabase import _SQLiteDatabase
+from .TimelineIndex import TimelineIndex
+
+
+class MatchIdStore(_SQLiteDatabase):
+    """MatchIdStore is a persistent set of matchIds, shared by all the
+    crawls using it, so that a match is only downloaded once across
+    crawls (see ``TimelineCrawler``).
+
+    The matchIds are stored in a SQLite database, which is the exact
+    answer to whether a match was seen. Optionally, a Bloom filter
+    kept in memory answers most lookups of unseen matches without
+    reading the database, and takes about 10 bits per matchId (for a
+    1% false positive rate) instead of holding the set in memory. The
+    store may be shared by threads.
+
+    Attributes
+    ----------
+    path : str
+        File name of the SQLite database. It is created if it does not
+        exist.
+    bloom : bool
+        Whether to look matchIds up in a Bloom filter first. Defaults
+        to True.
+    capacity : int
+        Expected number of matchIds, used to size the Bloom filter.
+        The filter is rebuilt twice as large when it fills up. Defaults
+        to 1,000,000.
+    error_rate : float
+        False positive rate of the Bloom filter at ``capacity``,
+        defaults to 0.01.
+    """
+
+    def __init__(self, path:str, bloom:bool=True, capacity:int=1000000,
+                 error_rate:float=0.01) -> None:
+        super().__init__(path)
+        self.bloom = bloom
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._db.execute("CREATE TABLE IF NOT EXISTS matches " +
+                         "(matchId TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._size = self._db.execute("SELECT COUNT(*) FROM matches")\
+                         .fetchone()[0]
+        if bloom:
+            self._build_filter(max(capacity, 2 * self._size))
+
+
+    def _build_filter(self, capacity:int) -> None:
+        """Create a Bloom filter for ``capacity`` matchIds, holding the
+        stored matchIds."""
+        self.capacity = capacity
+        self._n_bits = max(8, int(-capacity * math.log(self.error_rate) /
+                                  math.log(2) ** 2))
+        self._n_hashes = max(1, round(self._n_bits / capacity * math.log(2)))
+        self._bits = bytearray((self._n_bits + 7) // 8)
+        for (match_id,) in self._db.execute("SELECT matchId FROM matches"):
+            self._add_to_filter(match_id)
+
+
+    def _positions(self, match_id:str) -> list:
+        """Bits of ``match_id`` in the Bloom filter (double hashing)."""
+        digest = hashlib.blake2b(match_id.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self._n_bits
+                for i in range(self._n_hashes)]
+
+
+    def _add_to_filter(self, match_id:str) -> None:
+        bits = self._bits
+        for position in self._positions(match_id):
+            bits[position >> 3] |= 1 << (position & 7)
+
+
+    def _in_filter(self, match_id:str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(match_id))
+
+
+    def __contains__(self, match_id:str) -> bool:
+        with self._lock:
+            if self.bloom and not self._in_filter(match_id):
+                return False
+            return self._db.execute("SELECT 1 FROM matches WHERE " +
+                                    "matchId = ?",
+                                    (match_id,)).fetchone() is not None
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def update(self, match_ids) -> int:
+        """Add matchIds to the store.
+
+        Parameters
+        ----------
+        match_ids : iterable
+            The matchIds.
+
+        Returns
+        -------
+        int
+            The number of matchIds which were not already stored.
+        """
+        match_ids = list(dict.fromkeys(match_ids))
+        added = 0
+        with self._lock:
+            with self._db:
+                for start in range(0, len(match_ids), self._batch_size):
+                    batch = match_ids[start:start + self._batch_size]
+                    before = self._db.total_changes
+                    self._db.executemany("INSERT OR IGNORE INTO matches " +
+                                         "VALUES (?)", [(x,) for x in batch])
+                    added += self._db.total_changes - before
+            self._size += added
+            if self.bloom:
+                if self._size > self.capacity:
+                    self._build_filter(2 * self._size)
+                else:
+                    for match_id in match_ids:
+                        self._add_to_filter(match_id)
+        return added
+
+
+    def add(self, match_id:str) -> bool:
+        """Add a matchId to the store, and return whether it was not
+        already stored."""
+        return self.update([match_id]) == 1
+
+
+    def seed(self, file:str) -> int:
+        """Add the matchIds of the ``MatchTimelineDto`` s stored in a
+        file, either JSONL (using its index sidecar if any) or a JSON
+        list. Lines of JSONL files are searched rather than decoded.
+
+        Parameters
+        ----------
+        file : str
+            Name of the file.
+
+        Returns
+        -------
+        int
+            The number of matchIds which were not already stored.
+        """
+        if os.path.exists(index_path(file)):
+            with TimelineIndex(file) as index:
+                match_ids = index.match_ids_
+        else:
+            match_ids = (timeline_match_id(timeline) for timeline in
+                         iter_timelines(file, raw=True))
+        return self.update(match_id for match_id in match_ids if match_id)
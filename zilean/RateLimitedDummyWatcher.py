@@ -0,0 +1,54 @@
+import requests
+
+from .ApiProxy import _ApiProxy
+from .DummyWatcher import DummyWatcher
+from .RequestScheduler import FakeClock
+
+
+class RateLimitedDummyWatcher(DummyWatcher):
+    """
+    A DummyWatcher enforcing rate limits, for testing purpose. Like
+    the Riot API, a call beyond ``limits`` (pairs of (number of
+    requests, seconds), on the time of ``clock``) is rejected with a
+    429 ``requests.HTTPError`` and a ``Retry-After`` header. The time
+    of each accepted call is recorded in ``calls_``, and the number of
+    rejected calls in ``rejected_``.
+    """
+    def __init__(self, limits:list=[(20, 1), (100, 120)],
+                 clock=None) -> None:
+        super().__init__()
+        self.limits = limits
+        self.clock = FakeClock() if clock is None else clock
+        self.calls_ = []
+        self.rejected_ = 0
+        self.league = _RateLimitedDummyApi(self, "league", self.league)
+        self.summoner = _RateLimitedDummyApi(self, "summoner",
+                                             self.summoner)
+        self.match = _RateLimitedDummyApi(self, "match", self.match)
+
+    def _check(self, endpoint:str) -> None:
+        now = self.clock.time()
+        retry_after = 0
+        for count, period in self.limits:
+            recent = [t for t, _ in self.calls_ if t > now - period]
+            if len(recent) >= count:
+                retry_after = max(retry_after,
+                                  recent[-count] + period - now)
+        if retry_after > 0:
+            self.rejected_ += 1
+            response = requests.Response()
+            response.status_code = 429
+            response.headers["Retry-After"] = str(retry_after)
+            response.headers["X-Rate-Limit-Type"] = "application"
+            raise requests.HTTPError("429 Client Error: Too Many Requests",
+                                     response=response)
+        self.calls_.append((now, endpoint))
+
+
+class _RateLimitedDummyApi(_ApiProxy):
+    """Rate limited version of the methods of a dummy api."""
+    def _wrap(self, endpoint:str, method):
+        def call(*args):
+            self._watcher._check(endpoint)
+            return method(*args)
+        return call
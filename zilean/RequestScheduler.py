@@ -0,0 +1,374 @@
+import asyncio
+from time import monotonic, sleep
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from itertools import count
+
+from .ApiProxy import _ApiProxy
+
+
+class FakeClock:
+    """A clock for testing purpose, whose time only moves when slept
+    on. Sleeping returns at once, but not before the work held ``busy``
+    (like requests sent from threads) is done."""
+    def __init__(self, now:float=0.0) -> None:
+        self.now = now
+        self._busy = 0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds:float) -> None:
+        self.now += max(0.0, seconds)
+
+    async def sleep_async(self, seconds:float) -> None:
+        target = self.now + max(0.0, seconds)
+        # Let the other tasks, and the work they wait on, run first
+        await asyncio.sleep(0)
+        while self._busy:
+            await asyncio.sleep(0)
+        self.now = max(self.now, target)
+
+    @contextmanager
+    def busy(self):
+        """Hold the time while the event loop waits on other work."""
+        self._busy += 1
+        try:
+            yield
+        finally:
+            self._busy -= 1
+
+
+class _Clock:
+    """The monotonic clock."""
+    def time(self) -> float:
+        return monotonic()
+
+    def sleep(self, seconds:float) -> None:
+        sleep(seconds)
+
+    async def sleep_async(self, seconds:float) -> None:
+        await asyncio.sleep(seconds)
+
+    def busy(self):
+        return nullcontext()
+
+
+class _Bucket:
+    """A token bucket of ``count`` tokens, where each spent token
+    comes back ``period`` seconds after it was spent. At most
+    ``count`` requests are thus sent in any ``period`` seconds."""
+    def __init__(self, count:int, period:float) -> None:
+        self.count = count
+        self.period = period
+        self._spent = deque()
+
+    def delay(self, now:float) -> float:
+        """Seconds until a token is available."""
+        while self._spent and self._spent[0] + self.period <= now:
+            self._spent.popleft()
+        if len(self._spent) < self.count:
+            return 0.0
+        return self._spent[-self.count] + self.period - now
+
+    def take(self, now:float) -> None:
+        self._spent.append(now)
+
+
+class RequestScheduler:
+    """RequestScheduler sends the requests of a crawl (see
+    ``TimelineCrawler.scheduler``) within the rate limits of the Riot
+    API, which apply per routing value (like ``"na1"``): limits of the
+    application, shared by all methods, and limits of each method.
+    Each limit is a token bucket, and a request is sent once all of
+    its buckets have a token.
+
+    A request rejected with a 429 status is retried once its
+    ``Retry-After`` header allows, blocking the application or the
+    method (according to the ``X-Rate-Limit-Type`` header) meanwhile.
+
+    Concurrent requests (see ``call_async``) are sent by priority,
+    then in order: by default, timelines of discovered matches go
+    ahead of the league, summoner and match list lookups discovering
+    more matches. A request which cannot be sent yet does not hold
+    back requests of other methods, so that the allowed budget is
+    fully used.
+
+    Attributes
+    ----------
+    app_limits : list
+        Pairs of (number of requests, seconds) of the application.
+        Defaults to the limits of a development API key,
+        ``[(20, 1), (100, 120)]``.
+    method_limits : dict, optional
+        Pairs of (number of requests, seconds) of each method, like
+        ``{"match.timeline_by_match": [(2000, 10)]}``. Defaults to
+        None (no method limits).
+    priorities : dict, optional
+        Priority of each method, lower values are sent first. Methods
+        not listed have priority 1. Defaults to
+        ``RequestScheduler.default_priorities_``.
+    max_retries : int
+        Number of times a rejected request is retried before raising
+        the error. Defaults to 3.
+    max_in_flight : int
+        Maximum number of concurrent requests sent at once, see
+        ``call_async``. Defaults to 1.
+    clock : optional
+        The clock, with ``time``, ``sleep``, ``sleep_async`` and
+        ``busy`` methods (see :class:`zilean.FakeClock`). Defaults to
+        the monotonic clock.
+    telemetry : :class:`zilean.CrawlTelemetry`, optional
+        Records the retries and the time waiting on rate limits.
+        Defaults to None.
+    """
+
+    default_priorities_ = {"match.timeline_by_match": 0}
+
+    def __init__(self, app_limits:list=[(20, 1), (100, 120)],
+                 method_limits:dict=None, priorities:dict=None,
+                 max_retries:int=3, max_in_flight:int=1, clock=None,
+                 telemetry=None) -> None:
+        self.app_limits = list(app_limits)
+        self.method_limits = dict(method_limits or {})
+        self.priorities = dict(self.default_priorities_ if priorities is None
+                               else priorities)
+        self.max_retries = max_retries
+        self.max_in_flight = max_in_flight
+        self.clock = _Clock() if clock is None else clock
+        self.telemetry = telemetry
+        self._buckets = {}
+        self._blocked = {}
+        self._order = count()
+        self._reset_async()
+
+
+    def _reset_async(self, loop=None) -> None:
+        """Forget the concurrent requests, which belong to an event
+        loop."""
+        self._loop = loop
+        self._waiting = []
+        self._in_flight = 0
+        self._timer = None
+        self._timer_at = None
+
+
+    def _keys(self, endpoint:str, routing:str) -> list:
+        """The buckets of a request, application then method."""
+        return [("application", routing), ("method", routing, endpoint)]
+
+
+    def _key_buckets(self, key:tuple) -> list:
+        if key not in self._buckets:
+            limits = self.app_limits if key[0] == "application" \
+                     else self.method_limits.get(key[2], [])
+            self._buckets[key] = [_Bucket(*limit) for limit in limits]
+        return self._buckets[key]
+
+
+    def delay(self, endpoint:str, routing:str, now:float=None) -> float:
+        """Return the seconds until a request can be sent.
+
+        Parameters
+        ----------
+        endpoint : str
+            The api and method, like ``"summoner.by_id"``.
+        routing : str
+            The routing value of the request, like ``"na1"``.
+        now : float, optional
+            The time of the clock, defaults to now.
+
+        Returns
+        -------
+        float
+            The seconds to wait, 0 if the request can be sent now.
+        """
+        now = self.clock.time() if now is None else now
+        wait = 0.0
+        for key in self._keys(endpoint, routing):
+            wait = max([wait, self._blocked.get(key, now) - now] +
+                       [bucket.delay(now) for bucket in
+                        self._key_buckets(key)])
+        return wait
+
+
+    def _take(self, endpoint:str, routing:str, now:float) -> None:
+        for key in self._keys(endpoint, routing):
+            for bucket in self._key_buckets(key):
+                bucket.take(now)
+
+
+    def _rejected(self, endpoint:str, routing:str, error:Exception) -> bool:
+        """If ``error`` is a 429 rejection, block the application or
+        the method until ``Retry-After``, and return True."""
+        response = getattr(error, "response", None)
+        if getattr(response, "status_code", None) != 429:
+            return False
+        headers = getattr(response, "headers", None) or {}
+        try:
+            retry_after = float(headers.get("Retry-After", 1))
+        except ValueError:
+            retry_after = 1.0
+        key = self._keys(endpoint, routing)[
+            0 if headers.get("X-Rate-Limit-Type") == "application" else 1]
+        self._blocked[key] = max(self._blocked.get(key, 0.0),
+                                 self.clock.time() + retry_after)
+        if self.telemetry is not None:
+            self.telemetry.retry(endpoint)
+        return True
+
+
+    def _wait(self, seconds:float) -> None:
+        if self.telemetry is not None:
+            self.telemetry.wait(seconds)
+
+
+    def call(self, endpoint:str, routing:str, func, *args):
+        """Send a request, once the rate limits allow it.
+
+        Parameters
+        ----------
+        endpoint : str
+            The api and method, like ``"summoner.by_id"``.
+        routing : str
+            The routing value of the request, like ``"na1"``.
+        func : callable
+            Sends the request.
+        *args
+            Arguments of ``func``.
+
+        Returns
+        -------
+        The result of ``func``.
+        """
+        for attempt in range(self.max_retries + 1):
+            while True:
+                wait = self.delay(endpoint, routing)
+                if wait <= 0:
+                    break
+                self._wait(wait)
+                self.clock.sleep(wait)
+            self._take(endpoint, routing, self.clock.time())
+            try:
+                return func(*args)
+            except Exception as error:
+                if attempt == self.max_retries or \
+                   not self._rejected(endpoint, routing, error):
+                    raise
+
+
+    async def call_async(self, endpoint:str, routing:str, func, *args):
+        """Asynchronous version of ``call``, where ``func`` returns an
+        awaitable. At most ``max_in_flight`` requests are awaited at
+        once, and waiting requests are sent by priority.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(endpoint, routing)
+            try:
+                return await func(*args)
+            except Exception as error:
+                if attempt == self.max_retries or \
+                   not self._rejected(endpoint, routing, error):
+                    raise
+            finally:
+                self._in_flight -= 1
+                self._dispatch()
+
+
+    async def _acquire(self, endpoint:str, routing:str) -> None:
+        """Wait until the request is sent by ``_dispatch``."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._reset_async(loop)
+        future = loop.create_future()
+        self._waiting.append((self.priorities.get(endpoint, 1),
+                              next(self._order), endpoint, routing, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Sent, but cancelled before being awaited
+            if future.done() and not future.cancelled():
+                self._in_flight -= 1
+                self._dispatch()
+            raise
+
+
+    def _dispatch(self) -> None:
+        """Send the waiting requests which can be sent, by priority,
+        and wake up when the next one can."""
+        now = self.clock.time()
+        waiting, wake = [], None
+        for request in sorted(self._waiting, key=lambda x: x[:2]):
+            endpoint, routing, future = request[2:]
+            if future.done():
+                continue
+            wait = self.delay(endpoint, routing, now)
+            if wait <= 0 and self._in_flight < self.max_in_flight:
+                self._take(endpoint, routing, now)
+                self._in_flight += 1
+                future.set_result(None)
+                continue
+            waiting.append(request)
+            if wait > 0:
+                wake = wait if wake is None else min(wake, wait)
+        self._waiting = waiting
+        if wake is not None and (self._timer_at is None or
+                                 now + wake < self._timer_at):
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer_at = now + wake
+            self._timer = asyncio.ensure_future(self._wake_up(wake))
+
+
+    async def _wake_up(self, seconds:float) -> None:
+        start = self.clock.time()
+        await self.clock.sleep_async(seconds)
+        self._wait(self.clock.time() - start)
+        self._timer, self._timer_at = None, None
+        self._dispatch()
+
+
+class _ScheduledWatcher:
+    """A watcher sending its requests through the RequestScheduler
+    returned by ``scheduler()``. Wrapped below a cache, only the
+    requests which reach the watcher wait on the rate limits. While
+    ``executor`` is set, the methods are coroutines (see
+    ``RequestScheduler.call_async``), and methods of the watcher which
+    are not coroutines run in ``executor``."""
+    def __init__(self, watcher, scheduler) -> None:
+        self.watcher = watcher
+        self.scheduler = scheduler
+        self.executor = None
+        self.league = _ScheduledApi(self, "league")
+        self.summoner = _ScheduledApi(self, "summoner")
+        self.match = _ScheduledApi(self, "match")
+
+    def __getattr__(self, name):
+        if name == "watcher":
+            raise AttributeError(name)
+        return getattr(self.watcher, name)
+
+
+class _ScheduledApi(_ApiProxy):
+    """Scheduled version of the methods of an api of the watcher. The
+    first argument of a method is the routing value."""
+    def _wrap(self, endpoint:str, method):
+        scheduler = self._watcher.scheduler()
+        executor = self._watcher.executor
+        if executor is None:
+            def call(*args):
+                return scheduler.call(endpoint, args[0], method, *args)
+            return call
+
+        async def send(*args):
+            if asyncio.iscoroutinefunction(method):
+                return await method(*args)
+            with scheduler.clock.busy():
+                return await asyncio.get_running_loop().run_in_executor(
+                    executor, partial(method, *args))
+
+        async def call(*args):
+            return await scheduler.call_async(endpoint, args[0], send, *args)
+        return call
@@ -0,0 +1,27 @@
+import os
+import sqlite3
+import threading
+
+
+class _SQLiteDatabase:
+    """Base of the classes stored in a SQLite database, created at
+    ``path`` if it does not exist. The connection may be shared by
+    threads, as long as they hold ``_lock`` while using it. Keyword
+    arguments are those of ``sqlite3.connect``."""
+
+    # Maximum number of parameters of a single SQLite query
+    _batch_size = 500
+
+    def __init__(self, path:str, **kwargs) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False, **kwargs)
+
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
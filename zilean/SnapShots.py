@@ -1,9 +1,158 @@
-from collections import defaultdict
-from copy import deepcopy
+import copy as _copy
 from typing import Callable
+import numpy as np
 import pandas as pd
 
 from .core import *
+from .FeatureSchema import FeatureSchema
+from .MatchCache import MatchCache
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def _dataframe_table(df:pd.DataFrame) -> dict:
+    """Convert a summary DataFrame into a columnar table."""
+    ids = [key for key in ("matchId", "win", "frame") if key in df.columns]
+    columns = [key for key in df.columns if key not in ids]
+    table = {
+        "columns": columns,
+        "integer": [bool(pd.api.types.is_integer_dtype(df[key])) 
+                    for key in columns],
+        "values": df[columns].to_numpy(dtype=np.float64),
+    }
+    for key in ids:
+        table[key] = df[key].to_numpy()
+    return table
+
+
+def _table_dataframe(table:dict) -> pd.DataFrame:
+    """Convert a columnar table into a summary DataFrame."""
+    values = np.asarray(table["values"])
+    columns = {}
+    for i, (key, integer) in enumerate(zip(table["columns"], table["integer"])):
+        columns[key] = values[:, i].astype(np.int64) if integer else values[:, i]
+    for key in ("matchId", "win", "frame"):
+        if key in table:
+            columns[key] = np.asarray(table[key])
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(values)))
+
+
+def _table_records(table:dict) -> list:
+    """Convert a columnar table into summary dictionaries."""
+    records = array_records(table["values"], table["columns"], 
+                            table["integer"])
+    ids = [key for key in ("matchId", "win", "frame") if key in table]
+    for key in ids:
+        values = np.asarray(table[key]).tolist()
+        for record, value in zip(records, values):
+            record[key] = value
+    return records
+
+
+def _write_npy(directory:str, table:dict, meta:dict) -> None:
+    """Save a columnar table as ``.npy`` files in ``directory``, with
+    a ``schema.json`` sidecar. Feature values are stored column by 
+    column (Fortran order), so reading a column only touches that 
+    column on disk."""
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "values.npy"), 
+            np.asfortranarray(table["values"]))
+    np.save(os.path.join(directory, "matchId.npy"), 
+            np.asarray(table["matchId"]).astype(str))
+    np.save(os.path.join(directory, "win.npy"), 
+            np.asarray(table["win"], dtype=bool))
+    if "frame" in table:
+        np.save(os.path.join(directory, "frame.npy"), 
+                np.asarray(table["frame"], dtype=np.int64))
+    schema = dict(meta, columns=list(table["columns"]), 
+                  integer=[bool(x) for x in table["integer"]])
+    with atomic_write(os.path.join(directory, "schema.json")) as f:
+        json.dump(schema, f)
+
+
+def _write_parquet(file:str, table:dict, meta:dict) -> None:
+    """Save a columnar table as a Parquet file, with the schema 
+    stored in the file metadata."""
+    if pyarrow is None:
+        raise ImportError("Saving to parquet requires pyarrow.")
+    arrow_table = pyarrow.Table.from_pandas(_table_dataframe(table), 
+                                            preserve_index=False)
+    schema = dict(meta, columns=list(table["columns"]), 
+                  integer=[bool(x) for x in table["integer"]])
+    metadata = dict(arrow_table.schema.metadata or {})
+    metadata[b"zilean"] = json.dumps(schema).encode()
+    pyarrow.parquet.write_table(arrow_table.replace_schema_metadata(metadata),
+                                file)
+
+
+def read_summary(path:str, columns:list=None, mmap:bool=True) -> dict:
+    """Read a summary saved by ``SnapShots.to_disk`` in a binary
+    format ("npy" or "parquet"), without building any dictionary.
+
+    Parameters
+    ----------
+    path : str
+        A directory saved with the "npy" format, or a file saved
+        with the "parquet" format.
+    columns : :obj:`list`, optional
+        Feature columns to read. If None (default), all columns are
+        read.
+    mmap : bool
+        Memory-map the data instead of reading it, defaults to True.
+        Only the pages of the columns actually used are then read
+        from disk.
+
+    Returns
+    -------
+    dict
+        A dictionary with keys ``"columns"`` (names of the feature
+        columns), ``"integer"`` (whether each column holds integers),
+        ``"values"`` (2-D array, one column per feature), ``"matchId"``,
+        ``"win"``, ``"frame"`` (per frame summaries only) and 
+        ``"meta"`` (frames and options the summary was computed with).
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, "schema.json")) as f:
+            schema = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        load = lambda name: np.load(os.path.join(path, name+".npy"), 
+                                    mmap_mode=mmap_mode)
+        table = {"values": load("values"), "matchId": load("matchId"),
+                 "win": load("win")}
+        if os.path.exists(os.path.join(path, "frame.npy")):
+            table["frame"] = load("frame")
+    else:
+        if pyarrow is None:
+            raise ImportError("Reading parquet requires pyarrow.")
+        schema = json.loads(pyarrow.parquet.read_schema(path)
+                            .metadata[b"zilean"])
+        names = schema["columns"] if columns is None else columns
+        ids = [key for key in ("matchId", "win", "frame") 
+               if key in pyarrow.parquet.read_schema(path).names]
+        arrow_table = pyarrow.parquet.read_table(path, columns=names + ids,
+                                                 memory_map=mmap)
+        table = {key: arrow_table.column(key).to_numpy() for key in ids}
+        table["values"] = np.column_stack(
+            [arrow_table.column(key).to_numpy().astype(np.float64) 
+             for key in names]) if names else \
+            np.empty((arrow_table.num_rows, 0))
+        schema["integer"] = [schema["integer"][schema["columns"].index(key)]
+                             for key in names]
+        schema["columns"] = names
+        columns = None
+    table["columns"], table["integer"] = schema.pop("columns"), \
+                                         schema.pop("integer")
+    if columns is not None:
+        index = [table["columns"].index(key) for key in columns]
+        table["values"] = table["values"][:, index]
+        table["integer"] = [table["integer"][i] for i in index]
+        table["columns"] = list(columns)
+    table["meta"] = schema
+    return table
 
 
 class SnapShots:
@@ -18,14 +167,20 @@ class SnapShots:
 
     Attributes
     ----------
-    timelines : str | list | dict
+    timelines : str | list | dict | iterable
         The source data. It can be either a: 
             - String, a file name where either a list of ``MatchTimelineDto`` s 
-              (in JSON format) or the computed summary statistics (csv) is 
-              stored.  The computed summary statistics (csv) should be an
-              earlier saved DataFrame using the SnapShots.to_disk() method.
+              (in JSON format), one ``MatchTimelineDto`` per line (jsonl,
+              like the crawler output) or the computed summary statistics
+              (csv, parquet or npy directory) is stored.  The computed 
+              summary statistics should be earlier saved using the 
+              SnapShots.to_disk() method. JSON files are read one match
+              at a time.
             - List. A list of ``MatchTimelineDto`` s.
             - Dict. A single ``MatchTimelineDto``.
+            - Any other iterable (for example a generator) of
+              ``MatchTimelineDto`` s. Matches are consumed one at a time
+              and dropped as soon as they are summarised.
     frames : list
         Integers indicating the frames (in minutes) of
         interest. Default [8]. This argument does nothing if the 
@@ -38,129 +193,334 @@ class SnapShots:
     porportion: bool 
         Add ``goldPorportion`` and ``xpPorportion`` as features to 
         the players. Defaults to True.
+    events: bool
+        Add the number of kills, deaths, assists, wards, items and
+        objectives up to each frame as features to the players (see
+        ``zilean.index_events``). Defaults to False.
     verbose: bool 
         Print out the progress of loading the source data, defaults
         to False.
+    chunk_size: int
+        Number of matches processed together. When ``timelines`` is a
+        JSON file or an iterable, only a few chunks of raw matches are
+        held in memory at a time. Defaults to 1000.
+    n_jobs: int
+        Number of worker processes used to process the matches, -1
+        to use all CPUs. Defaults to 1 (no worker process). The
+        summaries are identical whatever the number of workers.
+    executor: :obj:`concurrent.futures.Executor`, optional
+        An executor to process the matches with, instead of starting
+        ``n_jobs`` worker processes. Defaults to None.
+    cache: :obj:`zilean.MatchCache` | str, optional
+        A cache of processed matches (or the file name of one). Matches
+        already in the cache are not processed again, and the others
+        are added to it. Defaults to None.
+    data_: numpy.ndarray
+        The per match summary statistics, one row per match and one
+        column per feature (see ``feature_info_`` and ``columns_``).
+        The per frame summary is a reshaped view of the same array.
+    match_ids_: numpy.ndarray
+        The matchId of each row of ``data_``.
+    wins_: numpy.ndarray
+        Whether the blue team won, for each row of ``data_``.
+    columns_: dict
+        Index of each feature name in the columns of ``data_``.
+    schema_: :class:`zilean.FeatureSchema`
+        Describes the columns of ``data_``. It is shared by all the
+        SnapShots with the same frames and options.
     """
 
     def __init__(self, timelines, frames=[8], creep_score=True, porportion=True,
-                 verbose=False) -> None:
+                 verbose=False, chunk_size=1000, n_jobs=1, executor=None,
+                 cache=None, events=False) -> None:
         self.timelines = timelines
         self.frames = frames
         self.creep_score = creep_score
         self.porportion = porportion
-        self.summary_ = []
-        self.per_frame_summary_ = []
+        self.events = events
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.cache = MatchCache(cache) if type(cache) == str else cache
         self.feature_info_ = []
 
         # Dict, a single `MatchTimelineDto`
         if type(timelines) == dict:
-            # Verify if its a MatchTimelineDto
-            matchid = validate_timeline(timelines)
-            self.summary_ = [process_timeframe(timelines, frames=self.frames,
-                                               matchid=matchid,
-                                               creep_score=self.creep_score,
-                                               porportion=self.porportion)]
-            self.per_frame_summary_ = []
-            for frame in self.frames:
-                frame_dic = process_timeframe(timelines, frames=[frame],
-                                              matchid=matchid,
-                                              creep_score=self.creep_score,
-                                              porportion=self.porportion)
-                frame_dic['frame'] = frame
-                self.per_frame_summary_ += [frame_dic]
+            self._consume([timelines], executor)
         # List, multiple `MatchTimelineDto`s
         elif type(timelines) == list:
-            for match in timelines:
-                matchid = validate_timeline(match)
-                # Per match summary
-                self.summary_ += [process_timeframe(match, frames=self.frames,
-                                                    matchid=matchid,
-                                                    creep_score=self.creep_score,
-                                                    porportion=self.porportion)]
-                # Per frame summary
-                for frame in self.frames:
-                    frame_dic = process_timeframe(match, frames=[frame],
-                                                  matchid=matchid,
-                                                  creep_score=self.creep_score,
-                                                  porportion=self.porportion)
-                    frame_dic['frame'] = frame
-                    self.per_frame_summary_ += [frame_dic]
+            self._consume(timelines, executor)
         # String, a file
         elif type(timelines) == str:
             # Detect the file type
             filetype = timelines.split(".")[-1]
-            # JSON, a list of `MatchTimelineDto`s
-            if filetype == "json":
-                # Compute summary_ and per_frame_summary_
-                # Load the timelines from source
-                with open(self.timelines) as f:
-                    if verbose:
-                        print(f"Loading file {self.timelines}." +
-                              "It might take >5 min if file is large.")
-                    matches = json.load(f)
-                    if verbose:
-                        print(f"There is in total {len(matches)} " +
-                              "matches successfully loaded.")
-                # Unpack file into dictionaries
+            if filetype == "gz":
+                filetype = timelines.split(".")[-2]
+            # JSON, a list of `MatchTimelineDto`s or one per line
+            if filetype in ("json", "jsonl"):
+                # Compute summary_ and per_frame_summary_ while
+                # streaming the timelines from source
+                if verbose:
+                    print(f"Loading and unpacking file {self.timelines}.")
+                # Worker processes decode the matches themselves, and
+                # cached matches are not decoded at all. Only the frames
+                # of interest are kept from the decoded matches.
+                raw = n_jobs != 1 or executor is not None or \
+                      self.cache is not None
+                self._consume(iter_timelines(
+                    self.timelines, raw=raw, 
+                    frames=None if events else self.frames), executor)
                 if verbose:
-                    print(f"Unpacking matches into dictionaries.")
-                for match in matches:
-                    matchid = match['metadata']['matchId']
-                    # Per match summary
-                    self.summary_ += [process_timeframe(match, frames=self.frames,
-                                                        matchid=matchid,
-                                                        creep_score=self.creep_score,
-                                                        porportion=self.porportion)]
-                    # Per frame summary
-                    for frame in self.frames:
-                        frame_dic = process_timeframe(match, frames=[frame],
-                                                      matchid=matchid,
-                                                      creep_score=self.creep_score,
-                                                      porportion=self.porportion)
-                        frame_dic['frame'] = frame
-                        self.per_frame_summary_ += [frame_dic]
-                del matches
+                    print(f"There is in total {len(self.data_)} " +
+                          "matches successfully loaded.")
+            # Parquet or npy, a previously saved summary using to_disk()
+            elif filetype == "parquet" or os.path.isdir(timelines):
+                # The per frame summary is derived from the per match one
+                per_match_file = timelines.replace("frame", "match")
+                per_match = read_summary(per_match_file)
+                self.frames = per_match["meta"]["frames"]
+                self.creep_score = per_match["meta"]["creep_score"]
+                self.porportion = per_match["meta"]["porportion"]
+                self.events = per_match["meta"].get("events", False)
+                self._set_table(per_match)
             # CSV, a previously saved summary using to_disk()
             elif filetype == "csv":
                 per_match_file = timelines.replace("frame", "match")
-                per_frame_file = timelines.replace("match", "frame")
-                self.summary_ = pd.read_csv(per_match_file, index_col=[0])\
-                    .to_dict("records")
-                self.per_frame_summary_ = pd.read_csv(per_frame_file, index_col=[0])\
-                    .to_dict("records")
+                self._set_table(_dataframe_table(
+                    pd.read_csv(per_match_file, index_col=[0])))
+                self.frames = self.schema_.frames
+        # Any other iterable of `MatchTimelineDto`s
+        elif hasattr(timelines, "__iter__"):
+            self._consume(timelines, executor)
         # None of above
         else:
             raise ValueError("Input is neither a valid file name (csv of json), " +
                              "nor is a valid MatchTimelineDto")
 
-        # Construct feature info
-        for key in self.summary_[0].keys():
-            # Split the feature name where there is a "_"
-            feature_info = key.split("_")
-            if len(feature_info) == 3:
-                self.feature_info_.append({
-                    "name" : key, 
-                    "feature" : feature_info[0], 
-                    "lane" : int(feature_info[1]), 
-                    "frame" : int(feature_info[2].split('e')[1])
-                })
-            elif len(feature_info) == 2 and len(self.frames) == 1:
-                self.feature_info_.append({
-                    "name": key, 
-                    "feature": feature_info[0],
-                    "lane": int(feature_info[1]),
-                    "frame": self.frames[0]
-                })
-            else:
-                self.feature_info_.append({
-                    "name": key, 
-                    "feature": None,
-                    "lane": None,
-                    "frame": None
-                })
-                
-            
+    def _set_table(self, table:dict, schema:FeatureSchema=None) -> None:
+        """Use a columnar table (see ``read_summary``) as storage. The
+        schema is worked out from the names of the columns if not
+        provided."""
+        self._data = table["values"]
+        # Columns of `_data` used by this SnapShots, None for all
+        self._index = None
+        match_ids = np.asarray(table["matchId"])
+        self.match_ids_ = match_ids if match_ids.dtype.kind == 'U' \
+                          else match_ids.astype(str)
+        self.wins_ = np.asarray(table["win"], dtype=bool)
+        # Spare rows for `extend`, and the set of stored matchIds, both
+        # created when matches are first added
+        self._capacity = (len(self._data), (self._data, self.match_ids_, 
+                                            self.wins_))
+        self._match_set = None
+        if schema is None:
+            schema = FeatureSchema.from_names(table["columns"], 
+                                              table["integer"], self.frames)
+        self._set_schema(schema)
+
+
+    def _set_schema(self, schema:FeatureSchema) -> None:
+        """Use ``schema`` to describe the columns. The feature info and
+        column index are shared with the schema."""
+        self.schema_ = schema
+        self.integer_ = schema.integer_
+        self.columns_ = schema.index_
+        self.feature_info_ = schema.feature_info_
+
+
+    def _process(self, timelines, executor=None) -> tuple:
+        """Validate and process ``MatchTimelineDto`` s from an iterable,
+        ``chunk_size`` matches at a time. Each match is only processed
+        once, for all frames of interest. Returns the summary statistics
+        as a columnar table, and their schema."""
+        values, match_ids, wins = [], [], []
+        schema = FeatureSchema.get(self.frames, [])
+        for processed in process_timeframes_chunks(
+                timelines, frames=self.frames, creep_score=self.creep_score,
+                porportion=self.porportion, chunk_size=self.chunk_size,
+                n_jobs=self.n_jobs, executor=executor, cache=self.cache,
+                events=self.events):
+            n_matches = len(processed["matchId"])
+            if not n_matches:
+                continue
+            chunk_schema = FeatureSchema.get(self.frames, 
+                                             processed["features"],
+                                             processed["integer"])
+            if values and chunk_schema is not schema:
+                raise ValueError("The matches do not have the same " +
+                                 "player features.")
+            schema = chunk_schema
+            values.append(processed["values"].reshape(n_matches, -1))
+            match_ids += processed["matchId"]
+            wins.append(processed["win"])
+        table = {
+            "values": np.concatenate(values) if values else np.empty((0, 0)),
+            "matchId": np.array(match_ids, dtype=str),
+            "win": np.concatenate(wins) if wins else np.empty(0, dtype=bool),
+        }
+        return table, schema
+
+
+    def _consume(self, timelines, executor=None) -> None:
+        """Process ``MatchTimelineDto`` s from an iterable and store the
+        summary statistics."""
+        self._set_table(*self._process(timelines, executor))
+
+
+    def _append(self, table:dict, schema:FeatureSchema) -> int:
+        """Append the rows of a columnar table whose matchId are not
+        already in this SnapShots, and return how many were appended.
+
+        Rows are written to preallocated storage that grows
+        geometrically, so appending is amortized O(new rows). Earlier
+        summaries and subsets keep their own (unchanged) rows.
+        """
+        if self._index is not None:
+            raise ValueError("Cannot add matches to a subset of a SnapShots.")
+        if len(self._data) == 0 and not self.schema_.names_:
+            self._set_schema(schema)
+        elif schema is not self.schema_ and len(table["matchId"]):
+            raise ValueError("The matches do not have the same frames " +
+                             "and features as the SnapShots.")
+        
+        # Drop matches already stored, and duplicates among the new ones
+        if self._match_set is None:
+            self._match_set = set(self.match_ids_.tolist())
+        keep = []
+        for i, match_id in enumerate(np.asarray(table["matchId"]).tolist()):
+            if match_id not in self._match_set:
+                self._match_set.add(match_id)
+                keep.append(i)
+        if not keep:
+            return 0
+        values = np.asarray(table["values"])[keep]
+        match_ids = np.asarray(table["matchId"]).astype(str)[keep]
+        wins = np.asarray(table["win"], dtype=bool)[keep]
+
+        n_matches, n_new = len(self._data), len(keep)
+        capacity, buffers = self._capacity
+        width = max(self.match_ids_.dtype.itemsize, match_ids.dtype.itemsize)
+        if (capacity < n_matches + n_new or 
+                buffers[1].dtype.itemsize < width):
+            capacity = max(n_matches + n_new, 2 * capacity, 16)
+            buffers = (np.empty((capacity, values.shape[1])),
+                       np.empty(capacity, dtype=np.dtype(('U', width // 4))),
+                       np.empty(capacity, dtype=bool))
+            # An empty SnapShots has no columns yet
+            for buffer, stored in zip(buffers, [self._data, self.match_ids_,
+                                                self.wins_]):
+                if n_matches:
+                    buffer[:n_matches] = stored
+            self._capacity = (capacity, buffers)
+        for buffer, new in zip(buffers, [values, match_ids, wins]):
+            buffer[n_matches:n_matches + n_new] = new
+        self._data = buffers[0][:n_matches + n_new]
+        self.match_ids_ = buffers[1][:n_matches + n_new]
+        self.wins_ = buffers[2][:n_matches + n_new]
+        return n_new
+
+
+    def extend(self, timelines, executor=None) -> int:
+        """Add new matches to the SnapShots. Only matches whose matchId 
+        is not already in the SnapShots are processed and added, with
+        the same frames and options.
+
+        Parameters
+        ----------
+        timelines : str | list | dict | iterable
+            The new ``MatchTimelineDto`` s: a JSON or jsonl file, a
+            list, a single ``MatchTimelineDto`` or any other iterable.
+        executor : :obj:`concurrent.futures.Executor`, optional
+            An executor to process the matches with, see ``SnapShots``.
+            Defaults to None.
+
+        Returns
+        -------
+        int
+            The number of matches added.
+        """
+        if self._index is not None:
+            raise ValueError("Cannot add matches to a subset of a SnapShots.")
+        if type(timelines) == dict:
+            timelines = [timelines]
+        elif type(timelines) == str:
+            timelines = iter_timelines(timelines, raw=True)
+        elif not hasattr(timelines, "__iter__"):
+            raise ValueError("Input is neither a valid file name (json), " +
+                             "nor is a valid MatchTimelineDto")
+        if self._match_set is None:
+            self._match_set = set(self.match_ids_.tolist())
+        # Skip the matches already stored before processing them
+        new_timelines = (timeline for timeline in timelines
+                         if timeline_match_id(timeline) not in self._match_set)
+        return self._append(*self._process(new_timelines, executor))
+
+
+    def merge(self, other) -> int:
+        """Add the matches of another SnapShots which are not already in
+        this SnapShots. Both must have the same frames and features.
+
+        Parameters
+        ----------
+        other : :class:`zilean.SnapShots`
+            The SnapShots to merge into this one. It is not modified.
+
+        Returns
+        -------
+        int
+            The number of matches added.
+        """
+        if other.frames != self.frames:
+            raise ValueError("Cannot merge SnapShots with different frames.")
+        return self._append({"values": other.data_, 
+                             "matchId": other.match_ids_,
+                             "win": other.wins_}, other.schema_)
+
+
+    @property
+    def data_(self) -> np.ndarray:
+        """The per match summary statistics, one row per match and
+        one column per feature. For a subset, the selected columns 
+        are gathered from the shared storage when accessed."""
+        if self._index is None:
+            return self._data
+        return self._data[:, self._index]
+
+
+    def _table(self, per_frame=False) -> dict:
+        """Return the summary statistics as a columnar table, see 
+        ``read_summary``. The per frame table is a reshape of the per
+        match one."""
+        schema = self.schema_
+        if not per_frame:
+            return {"columns": schema.names_, "integer": schema.integer_, 
+                    "values": self.data_, "matchId": self.match_ids_,
+                    "win": self.wins_}
+        frames = schema.frames
+        n_matches = len(self._data)
+        return {
+            "columns": schema.frame_names_,
+            "integer": schema.frame_integer_,
+            "values": np.asarray(self.data_).reshape(
+                n_matches * len(frames), len(schema.frame_names_)),
+            "matchId": np.repeat(self.match_ids_, len(frames)),
+            "win": np.repeat(self.wins_, len(frames)),
+            "frame": np.tile(np.asarray(frames, dtype=np.int64), n_matches),
+        }
+
+
+    @property
+    def summary_(self) -> list:
+        """The per match summary, as a list of dictionaries. It is
+        built from ``data_`` every time it is accessed."""
+        return _table_records(self._table(per_frame=False))
+
+
+    @property
+    def per_frame_summary_(self) -> list:
+        """The per frame summary, as a list of dictionaries. It is
+        built from ``data_`` every time it is accessed."""
+        return _table_records(self._table(per_frame=True))
+
 
     def summary(self, per_frame=False) -> list:
         """Return the summary for all the matches (``MatchTimelineDto``).
@@ -179,18 +539,16 @@ class SnapShots:
         list
             A list of dictionaries, ready for further data analysis. 
             Each dictionary is either a match or a frame 
-            (see `per_frame`). 
+            (see `per_frame`). The dictionaries are built from 
+            ``data_`` on every call.
         """
-        # Return the summary based on `per_frame`
-        if per_frame:
-            return self.per_frame_summary_
-        else:
-            return self.summary_
+        return _table_records(self._table(per_frame=per_frame))
 
 
-    def to_disk(self, path="data/", verbose=True) -> None:
-        """Save the summaries to disk as csv files using 
-        pandas.DataFrame.to_csv()
+    def to_disk(self, path="data/", verbose=True, format="csv") -> None:
+        """Save the summaries to disk, either as csv files using 
+        pandas.DataFrame.to_csv(), or in a binary columnar format
+        that loads much faster.
 
         Parameters
         ----------
@@ -200,26 +558,54 @@ class SnapShots:
         verbose : bool 
             Print the directory where of the saved file. Defaults to
             True
+        format : str
+            One of:
+            - "csv" (default): ``match_FRAMES.csv`` and 
+              ``frame_FRAMES.csv`` files.
+            - "parquet": ``match_FRAMES.parquet`` and 
+              ``frame_FRAMES.parquet`` files. Requires pyarrow.
+            - "npy": ``match_FRAMES`` and ``frame_FRAMES`` directories
+              of numpy ``.npy`` files with a ``schema.json`` sidecar.
+              Requires numpy only.
+            - "binary": "parquet" if pyarrow is installed, "npy" 
+              otherwise.
+            Binary formats can be read back with ``read_summary``, or
+            by passing the saved path to SnapShots.
         """
+        if format == "binary":
+            format = "parquet" if pyarrow is not None else "npy"
+        if format not in ("csv", "parquet", "npy"):
+            raise ValueError('Argument `format` can only be "csv", "parquet", ' +
+                             '"npy" or "binary".')
         file_name = '_'.join(str(e) for e in self.frames)
-        per_match_path = os.path.join(path, "match_"+file_name+".csv")
-        per_frame_path = os.path.join(path, "frame_"+file_name+".csv")
-        pd.DataFrame(self.summary_).to_csv(per_match_path)
-        pd.DataFrame(self.per_frame_summary_).to_csv(per_frame_path)
+        extension = "" if format == "npy" else "."+format
+        per_match_path = os.path.join(path, "match_"+file_name+extension)
+        per_frame_path = os.path.join(path, "frame_"+file_name+extension)
+        if format == "csv":
+            _table_dataframe(self._table()).to_csv(per_match_path)
+            _table_dataframe(self._table(per_frame=True)).to_csv(per_frame_path)
+        else:
+            write = _write_npy if format == "npy" else _write_parquet
+            meta = {"frames": self.frames, "creep_score": self.creep_score,
+                    "porportion": self.porportion, "events": self.events}
+            write(per_match_path, self._table(), meta)
+            write(per_frame_path, self._table(per_frame=True), meta)
         if verbose:
             print(f"Saved files to direcotry {os.path.join(os.getcwd(), path)}.")
 
 
     def subset(self, features=[], lanes=[], frames=[]):
         """Return a new SnapShots with only a subset of the 
-        original summary statistics. Features
+        original summary statistics. The new SnapShots is a view
+        that shares the storage of the original one, so subsetting
+        does not copy any data. Features
         of the original summary statistics contain information that
         is seperated by underscores. The generic format of a
         feature is "FEATURE_LANE_frame#". For example, 
         ``totalGold_0_frame8`` is the total gold difference 
         between the TOP players at 8 minutes mark. This 
-        method will return a copy of the original SnapShots
-        instance if no argument were provided.
+        method will return a view of the whole original 
+        SnapShots instance if no argument were provided.
 
         Parameters
         ----------
@@ -242,54 +628,27 @@ class SnapShots:
         
         Notes
         -----
-            This method is not compatible does not support
-            subsetting the per frame summary. Only the
-            per match summary will be subsetted. Support
-            of per frame summary will be developed in future
-            versions.
+            The per frame summary of the new SnapShots only
+            has the selected features and lanes, for the
+            selected frames.
         """
-        duplicate = deepcopy(self)
         lane_str_convert = {"TOP": 0, "JUG": 1,
                             "MID": 2, "BOT": 3, "SUP": 4}
-        keys_to_extract = []
 
         # Convert `lanes` to all integers
-        for i, lane in enumerate(lanes):
-            if lane in lane_str_convert.keys():
-                lanes[i] = lane_str_convert[lane]
-
-        # Add key matching the criteria to `keys_to_extract`
-        keys_to_extract += []
-        # Construct a new feature_info_
-        new_feature_info = []
-        for col in self.feature_info_:
-            if ((not lanes or col["lane"] in lanes) and 
-                (not features or col["feature"] in features) and
-                (not frames or col["frame"] in frames)):
-                keys_to_extract += [col["name"]]
-                new_feature_info += [col]
-
-        new_feature_info += self.feature_info_[-2:]
-        duplicate.feature_info_ = new_feature_info
-
-        # Construct the new summary_ using keys_to_extract
-        keys_to_extract += ["matchId", "win"]
-        new_summary_ = []
-        for row in self.summary_:
-            new_summary_ += [{key: row[key] for key in keys_to_extract}]
-        duplicate.summary_ = new_summary_
-
-        # # Construct the new per_frame_summary_ using keys_to_extract
-        # keys_to_extract += ["frame"]
-        # new_per_frame_summary_ = []
-        # for row in self.per_frame_summary_:
-        #     new_per_frame_summary_ += [{key: row[key] for key in keys_to_extract}]
-        # duplicate.per_frame_summary_ = new_per_frame_summary_
-        
-        return duplicate
+        lanes = [lane_str_convert.get(lane, lane) for lane in lanes]
+
+        # The view shares the storage of this SnapShots and only
+        # records which of its columns are selected
+        schema, index = self.schema_.subset(features, lanes, frames)
+        view = _copy.copy(self)
+        view._index = index if self._index is None else self._index[index]
+        view._set_schema(schema)
+        return view
 
 
-    def agg(self, type, func:Callable[..., float]=sum) -> list:
+    def agg(self, type, func:Callable[..., float]=sum, per_frame=False,
+            as_table=False):
         """Aggregate summary statistics either by
         team or by frame. If by team, the statistics
         across all five lanes are aggregated. If by
@@ -317,42 +676,92 @@ class SnapShots:
 
         func : function
             A function to perform the aggregation. Defaults
-            to sum (the summation function).
+            to sum (the summation function). The built-in
+            ``sum``, ``max`` and ``min``, the numpy functions
+            ``sum``, ``mean``, ``max``, ``min`` and ``std``,
+            and their names as strings are computed over the
+            whole summary at once. Any other function is 
+            called with the list of values of each aggregated
+            feature of each row.
+        per_frame : bool
+            Aggregate the per frame summary instead of the per
+            match summary. Only ``type="team"`` is available,
+            ``totalGold_0`` , ..., ``totalGold_4`` are 
+            aggregated into ``totalGold`` . Defaults to False.
+        as_table : bool
+            If True, return a dictionary with the names of the
+            aggregated features (``"columns"``), whether they
+            hold integers (``"integer"``) and a 2-D array of the
+            aggregated statistics (``"values"``), instead of a 
+            list of dictionaries. Defaults to False.
         
         Returns
         -------
-        list
-            Summary statistics after aggregation.
-
-        Notes
-        -----
-            This method is not compatible with per frame
-            summary. This feature will be developed in 
-            future versions.
+        list | dict
+            Summary statistics after aggregation, one dictionary
+            per row of ``summary(per_frame)`` .
         """
-        # Mapping for which features should be joined into agg feature
         if type not in ("team", "frame"):
             raise ValueError('Argument `type` can only be "team" or "frame".')
+        if type == "frame" and per_frame:
+            raise ValueError('The per frame summary can only be aggregated ' +
+                             'by "team".')
+
+        names, index = self.schema_.groups(type, per_frame)
+        group_integer = self.integer_[index[:, 0]] if len(index) \
+                        else np.empty(0, dtype=bool)
+
+        reduction = _reduction(func)
+        if reduction is not None:
+            # Reduce the (matches, frames, lanes, features) array along
+            # the lanes or frames axis, over the whole summary at once
+            frames = self.schema_.frames
+            data = np.asarray(self.data_).reshape(len(self._data), 
+                                                  *self.schema_.shape)
+            aggregated = getattr(np, reduction)(data, axis=2 if type == "team" 
+                                                else 1)
+            aggregated = aggregated.reshape(len(aggregated) * len(frames) 
+                                            if per_frame else len(aggregated),
+                                            len(names))
+            integer = group_integer & (reduction in ("sum", "max", "min"))
+            if as_table:
+                return {"columns": names, "integer": integer, 
+                        "values": aggregated}
+            return array_records(aggregated, names, integer)
 
-        mapping = defaultdict(list)
-
-        for col in self.feature_info_:
-            # None value means its a special feature
-            if not col["feature"]:
-                continue
-            if type == "team":
-                new_feature_name = col["feature"] + "_frame" + str(col["frame"])
-            elif type == "frame":
-                new_feature_name = col["feature"] + "_" + str(col["lane"])
-            mapping[new_feature_name].append(col["name"])
-
-        # New summary list
-        agg_summary = []
-
-        for match in self.summary_:
-            row = {}
-            for k, v in mapping.items():
-                row[k] = func([match[vv] for vv in v])
-            agg_summary.append(row)
-
-        return agg_summary
\ No newline at end of file
+        if per_frame:
+            values = self._table(per_frame=True)["values"][:, index]
+        else:
+            columns = index if self._index is None else self._index[index]
+            values = self._data[:, columns]
+        # Arbitrary function, called for every aggregated feature
+        cells = values.astype(object)
+        cells[:, group_integer] = values[:, group_integer].astype(np.int64)\
+                                    .astype(object)
+        agg_summary = [{name: func(cell) for name, cell in zip(names, row)}
+                       for row in cells.tolist()]
+        if as_table:
+            table = _dataframe_table(pd.DataFrame(agg_summary, columns=names))
+            return {key: table[key] for key in ("columns", "integer", "values")}
+        return agg_summary
+
+
+# Functions computed by `SnapShots.agg` as numpy reductions
+_REDUCTIONS = [(sum, "sum"), (max, "max"), (min, "min"), 
+               (np.sum, "sum"), (np.mean, "mean"), (np.max, "max"), 
+               (np.min, "min"), (np.std, "std"), (np.amax, "max"),
+               (np.amin, "min")]
+
+
+def _reduction(func) -> str:
+    """Return the name of the numpy reduction equivalent to ``func``,
+    or None if there is none."""
+    if isinstance(func, str):
+        if func not in ("sum", "mean", "max", "min", "std"):
+            raise ValueError('Aggregation function names can only be "sum", ' +
+                             '"mean", "max", "min" or "std".')
+        return func
+    for known, name in _REDUCTIONS:
+        if func is known:
+            return name
+    return None
@@ -1,7 +1,21 @@
+import queue
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
 from tqdm import tqdm
 from riotwatcher import LolWatcher
 
 from .core import *
+from .TimelineIndex import TimelineIndex
+from .MatchIdStore import MatchIdStore
+from .SnapShots import SnapShots
+from .TimelineWriter import TimelineWriter
+from .CachedWatcher import CachedWatcher
+from .CrawlTelemetry import CrawlTelemetry
+from .RequestScheduler import RequestScheduler, _ScheduledWatcher
+from .CrawlCoordinator import CrawlCoordinator
 
 class TimelineCrawler:
     """An automatic crawler for Riot ``MatchTimelineDto`` s. The Riot
@@ -21,6 +35,32 @@ class TimelineCrawler:
         The queue type of the matches, defaults to None.
     dummy_watcher : :class:`DummyWatcher`
         For testing purpose only, defaults to None.
+    rate_limits : list
+        Pairs of (number of requests, seconds) that crawls never 
+        exceed, unless a ``scheduler`` is given. Defaults to the
+        limits of a development API key, ``[(20, 1), (100, 120)]``.
+    dedupe_store : :class:`zilean.MatchIdStore` | str, optional
+        A persistent set of matchIds (or the file name of one). 
+        Matches in the set are never downloaded, and crawled matches 
+        are added to it, so that crawls sharing the set never download
+        the same match twice. Defaults to None.
+    cache : str, optional
+        File name of a persistent cache of the league and summoner
+        lookups (see :class:`zilean.CachedWatcher`), so that repeated
+        crawls of a tier spend their rate limits on new timelines. Its
+        hit and miss counts are in ``watcher.stats()``. Defaults to
+        None.
+    telemetry : :class:`zilean.CrawlTelemetry`, optional
+        Records the calls of the crawls (latencies, bytes, errors), the
+        time waiting on rate limits, the duplicates skipped and the
+        matches kept, see :class:`zilean.CrawlTelemetry`. Defaults to
+        a new one.
+    scheduler : :class:`zilean.RequestScheduler`, optional
+        Sends the requests of the crawls within the application and
+        method rate limits, retrying rejected requests after their
+        ``Retry-After``, and sending timelines ahead of the lookups
+        in asynchronous crawls. Defaults to None (a scheduler with
+        ``rate_limits``).
     
     Notes
     -----
@@ -66,7 +106,11 @@ class TimelineCrawler:
 
 
     def __init__(self, api_key:str=None, region:str=None, tier:str=None, 
-                 queue:str=None, dummy_watcher=None) -> None:
+                 queue:str=None, dummy_watcher=None, 
+                 rate_limits:list=[(20, 1), (100, 120)],
+                 dedupe_store=None, cache:str=None,
+                 telemetry:CrawlTelemetry=None, 
+                 scheduler:RequestScheduler=None) -> None:
         # Error checking
         # api_key
         if type(api_key) != str:
@@ -102,12 +146,30 @@ class TimelineCrawler:
         self.watcher = LolWatcher(api_key=self.api_key)
         if dummy_watcher:
             self.watcher = dummy_watcher
+        # Calls are recorded and scheduled below the cache, so that
+        # only actual requests count and spend the rate limits
+        self.telemetry = CrawlTelemetry() if telemetry is None else telemetry
+        self.watcher = self.telemetry.wrap(self.watcher)
+        self._scheduled = _ScheduledWatcher(self.watcher, self._scheduler)
+        self.watcher = self._scheduled
+        if cache is not None:
+            self.watcher = CachedWatcher(self.watcher, cache)
+        self.rate_limits = rate_limits
+        self.scheduler = scheduler
+        self._default_scheduler = None
+        self.dedupe_store = MatchIdStore(dedupe_store) \
+                            if type(dedupe_store) == str else dedupe_store
         
 
     def crawl(self, n:int, match_per_id:int=15, file:str=None, 
-              cutoff:int=16) -> list:
+              cutoff:int=16, concurrency:int=1, resume:bool=False, 
+              callback=None) -> list:
         """Crawl ``MatchTimelineDto`` s and save results to disk as a
-        json file. Also, return a list of unique ``MatchTimelineDto`` s.
+        JSONL file (one match per line), with an index sidecar (see
+        :class:`zilean.TimelineIndex`), or as a gzip compressed JSONL
+        file if ``file`` ends with ".gz" (see 
+        :class:`zilean.TimelineWriter`). Also, return a list of unique
+        ``MatchTimelineDto`` s.
         Each ``MatchTimelineDto`` is a dictionary that contains game
         statistics at each minute mark. To perform analysis, feed the
         returned list to a :class:`zilean.SnapShots` object. 
@@ -127,93 +189,667 @@ class TimelineCrawler:
             to None.
         cutoff : int
             The mininum number of minutes required for a match to 
-            be counted toward the final list. Defaults to 16.
+            be counted toward the final list. Shorter matches are 
+            dropped as soon as they are downloaded. Defaults to 16.
+        concurrency : int
+            The number of requests in flight at once. If more than 1,
+            the crawl runs asynchronously, see ``crawl_async``.
+            Defaults to 1.
+        resume : bool
+            Continue an interrupted crawl writing to ``file``. The
+            position of the crawl is checkpointed next to the file 
+            after each account, and matches already in the file are
+            not fetched again. Defaults to False.
+        callback : callable, optional
+            Called with each ``MatchTimelineDto`` meeting the cutoff as
+            soon as it is crawled, for example to process it while the
+            next ones are crawled (see ``crawl_snapshots``). If 
+            ``file`` is None, the matches are then neither saved nor 
+            returned. Defaults to None.
+
+        Returns
+        -------
+        list
+            A list of ``MatchTimelineDto`` s. 
+        """
+        if concurrency > 1:
+            return asyncio.run(self.crawl_async(n, match_per_id, file, 
+                                                cutoff, concurrency, resume,
+                                                callback))
+        file_path, to_disk = self._check_crawl(n, match_per_id, file, cutoff)
+        # Record matches that are already visited
+        visited_matchIds, cursor = self._start(file_path, to_disk, resume)
+        leagueIds, first_entry = self._resume_from(self._league_ids(
+            self._request(*self._league_request())), cursor)
+        # Only the matches lasting `cutoff` minutes are written, and 
+        # count toward `n`
+        n_kept = len(visited_matchIds)
+        downloaded = []
+        writer = self._writer(file_path, to_disk, callback)
+
+        # Start crawling                                 
+        # Set tqdm progress bar
+        pbar = tqdm(total=n, initial=min(n, n_kept))
+        pbar.set_description("Crawling matches")
+        try:
+            # Iterate over the leagueIds to fetch leagueEntries
+            for leagueId in leagueIds:
+                if n_kept >= n: break
+                entries = self._request("league.by_id", self.region, 
+                                        leagueId)['entries']
+                # Then fetch summonerIds for each LeagueEntry
+                for j, entry in enumerate(entries):
+                    if j < first_entry: continue
+                    summonerId = entry['summonerId']
+                    # Then fetch puuid for that summonerIds
+                    puuid = self._request("summoner.by_id", self.region, 
+                                          summonerId)["puuid"]
+                    #Then fetch a list of matchIds for that puuid
+                    match_list = self._request("match.matchlist_by_puuid",
+                                               self.region, puuid)
+                    # Lastly fetch MatchTimelines for each matchId
+                    for i in range(min(match_per_id, len(match_list))):
+                        matchId = match_list[i]
+                        # Crawled by this crawl or another one
+                        if self._skip(matchId, visited_matchIds): continue
+                        timeline = self._request("match.timeline_by_match",
+                                                 self.region, matchId)
+                        visited_matchIds.add(matchId)
+                        downloaded.append(matchId)
+                        if not self._meets_cutoff(timeline, cutoff): continue
+                        # Save to disk
+                        self._keep(timeline, writer, callback)
+                        n_kept += 1
+                        pbar.update(1)
+                        if n_kept == n: break
+                    self._checkpoint(file_path, writer, downloaded, leagueId,
+                                     j + 1, n_kept)
+                    if n_kept == n: break
+                first_entry = 0
+                if n_kept == n: break
+        finally:
+            self._flush(writer, downloaded)
+            if writer is not None:
+                writer.close()
+            pbar.close()
+            self.telemetry.dump()
+        return self._finish(n, n_kept, match_per_id, file_path, to_disk,
+                            cutoff)
+
+
+    async def crawl_async(self, n:int, match_per_id:int=15, file:str=None,
+                          cutoff:int=16, concurrency:int=10, 
+                          resume:bool=False, callback=None) -> list:
+        """Asynchronous version of ``crawl``, keeping up to 
+        ``concurrency`` requests in flight while staying within
+        ``rate_limits``. The crawled matches are the same, and saved
+        in the same order, as with ``crawl``.
+
+        Methods of the watcher may be coroutines (for example with
+        :class:`zilean.AsyncDummyWatcher`). Otherwise, they are run in
+        ``concurrency`` threads, sharing a pool of HTTP connections.
+        Use ``crawl(concurrency=...)`` outside of an event loop.
+
+        Parameters
+        ----------
+        n : int
+            The number of unique matches to be crawled. 
+        march_per_id : int
+            The number of matches to be crawled for each unique 
+            account. Defaults to 15.
+        file : str
+            The name of the file to write the crawled result. 
+            If None, then result will not be saved to disk. Defaults
+            to None.
+        cutoff : int
+            The mininum number of minutes required for a match to 
+            be counted toward the final list, see ``crawl``. Defaults
+            to 16.
+        concurrency : int
+            The maximum number of requests in flight. Defaults to 10.
+        resume : bool
+            Continue an interrupted crawl writing to ``file``, see
+            ``crawl``. Defaults to False.
+        callback : callable, optional
+            Called with each ``MatchTimelineDto`` meeting the cutoff as
+            soon as it is crawled, see ``crawl``. Defaults to None.
 
         Returns
         -------
         list
             A list of ``MatchTimelineDto`` s. 
         """
+        file_path, to_disk = self._check_crawl(n, match_per_id, file, cutoff)
+        if concurrency <= 0:
+            raise ValueError("Invalid concurrency.")
+        visited_matchIds, cursor = self._start(file_path, to_disk, resume)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._pool_connections(concurrency)
+        self._scheduler().max_in_flight = concurrency
+
+        async def call(endpoint, *args):
+            # Requests are scheduled by the watcher, see `_scheduled`
+            return await self._method(endpoint)(*args)
+
+        async def entries(leagueIds, first_entry):
+            for leagueId in leagueIds:
+                league = await call("league.by_id", self.region, leagueId)
+                for j, entry in enumerate(league['entries']):
+                    if j >= first_entry:
+                        yield leagueId, j, entry
+                first_entry = 0
+
+        async def entry_matches(entry):
+            summoner = await call("summoner.by_id", self.region,
+                                  entry['summonerId'])
+            match_list = await call("match.matchlist_by_puuid",
+                                    self.region, summoner["puuid"])
+            return match_list[:match_per_id]
+
+        n_kept = len(visited_matchIds)
+        downloaded = []
+        writer = self._writer(file_path, to_disk, callback)
+        pbar = tqdm(total=n, initial=min(n, n_kept))
+        pbar.set_description("Crawling matches")
+        # Requests are started ahead, but their results are used in 
+        # the same order as `crawl`. The matchIds of each account are
+        # followed by a None marker, to checkpoint once all of its
+        # matches are written. Only as many timelines as the matches
+        # still needed are in flight, since a match may be too short.
+        pending_entries, candidates, pending_timelines = deque(), deque(), \
+                                                         deque()
+        more_entries, in_flight = True, 0
+
+        async def next_entry():
+            nonlocal more_entries
+            while more_entries and len(pending_entries) < concurrency:
+                try:
+                    leagueId, j, entry = await entry_iter.__anext__()
+                except StopAsyncIteration:
+                    more_entries = False
+                    break
+                pending_entries.append((asyncio.ensure_future(
+                    entry_matches(entry)), leagueId, j))
+            if not pending_entries:
+                return False
+            task, leagueId, j = pending_entries.popleft()
+            candidates.extend((matchId, leagueId, j) for matchId in await task)
+            candidates.append((None, leagueId, j))
+            return True
+
+        self._scheduled.executor = executor
+        try:
+            entry_iter = entries(*self._resume_from(
+                self._league_ids(await call(*self._league_request())), 
+                cursor))
+            while n_kept < n:
+                max_in_flight = min(2 * concurrency, n - n_kept)
+                while candidates and in_flight < max_in_flight:
+                    matchId, leagueId, j = candidates.popleft()
+                    if matchId is None:
+                        pending_timelines.append((None, leagueId, j))
+                        continue
+                    if self._skip(matchId, visited_matchIds): continue
+                    visited_matchIds.add(matchId)
+                    pending_timelines.append((asyncio.ensure_future(
+                        call("match.timeline_by_match", self.region, 
+                             matchId)), leagueId, j))
+                    in_flight += 1
+                if not candidates and in_flight < max_in_flight and \
+                   await next_entry():
+                    continue
+                if not pending_timelines:
+                    break
+                task, leagueId, j = pending_timelines.popleft()
+                # All the matches of the account are written
+                if task is None:
+                    self._checkpoint(file_path, writer, downloaded, 
+                                     leagueId, j + 1, n_kept)
+                    continue
+                timeline = await task
+                in_flight -= 1
+                downloaded.append(timeline_match_id(timeline))
+                if self._meets_cutoff(timeline, cutoff):
+                    self._keep(timeline, writer, callback)
+                    n_kept += 1
+                    pbar.update(1)
+        finally:
+            for task, _, _ in list(pending_entries) + list(pending_timelines):
+                if task is not None:
+                    task.cancel()
+            self._scheduled.executor = None
+            executor.shutdown(wait=False)
+            self._flush(writer, downloaded)
+            if writer is not None:
+                writer.close()
+            pbar.close()
+            self.telemetry.dump()
+        return self._finish(n, n_kept, match_per_id, file_path, to_disk, 
+                            cutoff)
+
+
+    def crawl_snapshots(self, n:int, match_per_id:int=15, file:str=None,
+                        cutoff:int=16, concurrency:int=1, 
+                        resume:bool=False, queue_size:int=256, 
+                        **kwargs) -> SnapShots:
+        """Crawl ``MatchTimelineDto`` s and process them into a
+        :class:`zilean.SnapShots` at the same time. Each crawled match
+        goes through a bounded queue to a thread which adds it to the
+        SnapShots while the crawler waits on the next requests, so the
+        SnapShots is ready soon after the crawl ends, and raw matches
+        are not kept in memory.
+
+        Parameters
+        ----------
+        n : int
+            The number of unique matches to be crawled, see ``crawl``.
+        march_per_id : int
+            The number of matches to be crawled for each unique 
+            account. Defaults to 15.
+        file : str
+            The name of the file to also write the crawled matches to.
+            If None, the raw matches are not saved. Defaults to None.
+        cutoff : int
+            The mininum number of minutes required for a match to 
+            be counted toward the final list. Defaults to 16.
+        concurrency : int
+            The number of requests in flight at once, see ``crawl``. 
+            Defaults to 1.
+        resume : bool
+            Continue an interrupted crawl writing to ``file``, see
+            ``crawl``. Only the matches crawled after resuming are in
+            the SnapShots. Defaults to False.
+        queue_size : int
+            Maximum number of crawled matches waiting to be processed.
+            The crawl waits for the SnapShots when the queue is full.
+            Defaults to 256.
+        **kwargs
+            Options of the :class:`zilean.SnapShots` (``frames``, 
+            ``creep_score``, ``cache``, ...).
+
+        Returns
+        -------
+        zilean.SnapShots
+            The summaries of the crawled matches.
+        """
+        if queue_size <= 0:
+            raise ValueError("Invalid queue size.")
+        snapshots = SnapShots([], **kwargs)
+        timelines = queue.Queue(maxsize=queue_size)
+        errors = []
+
+        def process():
+            while True:
+                batch = [timelines.get()]
+                # Process whatever is waiting at once
+                while batch[-1] is not None and len(batch) < queue_size:
+                    try:
+                        batch.append(timelines.get_nowait())
+                    except queue.Empty:
+                        break
+                done = batch[-1] is None
+                batch = [timeline for timeline in batch if timeline is not None]
+                # After an error, keep emptying the queue until the end
+                if batch and not errors:
+                    try:
+                        snapshots.extend(batch)
+                    except Exception as error:
+                        errors.append(error)
+                if done:
+                    return
+
+        def put(timeline):
+            # Stop crawling if the matches cannot be processed
+            if errors:
+                raise errors[0]
+            timelines.put(timeline)
+
+        worker = threading.Thread(target=process, daemon=True)
+        worker.start()
+        try:
+            self.crawl(n, match_per_id, file, cutoff, concurrency, resume,
+                       callback=put)
+        finally:
+            timelines.put(None)
+            worker.join()
+        if errors:
+            raise errors[0]
+        return snapshots
+
+
+    def crawl_worker(self, coordinator, worker:str, file:str, n:int, 
+                     match_per_id:int=15, cutoff:int=16, 
+                     poll:float=1.0) -> int:
+        """Crawl as one of the workers of a :class:`zilean.CrawlCoordinator`
+        sharing the crawl of the region, tier and queue of the crawler.
+        Work items are leased from the coordinator until ``n`` matches
+        are written by all the workers together, or until no item is 
+        left. Matches claimed by another worker are skipped.
+
+        Parameters
+        ----------
+        coordinator : :class:`zilean.CrawlCoordinator` | str
+            The coordinator (or the file name of its database).
+        worker : str
+            Name of the worker, unique among the workers.
+        file : str
+            The shard of the worker, a JSONL file (or gzip compressed
+            JSONL file, see ``crawl``) to which matches are appended.
+        n : int
+            The number of unique matches to be crawled by all the 
+            workers.
+        match_per_id : int
+            The number of matches to be crawled for each account. 
+            Defaults to 15.
+        cutoff : int
+            The mininum number of minutes required for a match to be 
+            kept. Defaults to 16.
+        poll : float
+            Seconds to wait for other workers to add items, when none
+            is pending. Defaults to 1.
+
+        Returns
+        -------
+        int
+            The number of matches written by this worker.
+        """
+        self._check_crawl(n, match_per_id, file, cutoff)
+        if type(coordinator) == str:
+            coordinator = CrawlCoordinator(coordinator)
+        crawl = (self.region, self.tier, self.queue)
+        coordinator.add("tier", *crawl)
+        n_kept = 0
+        writer = TimelineWriter(file)
+        try:
+            while coordinator.kept() < n:
+                item = coordinator.lease(worker, *crawl)
+                if item is None:
+                    if coordinator.finished(*crawl):
+                        break
+                    # Other workers may still discover items
+                    sleep(poll)
+                    continue
+                children, unused = [], []
+                if item["kind"] == "tier":
+                    children = [("league",) + crawl + (self._league_ids(
+                        self._request(*self._league_request())),)]
+                elif item["kind"] == "league":
+                    entries = self._request("league.by_id", self.region,
+                                            item["key"])['entries']
+                    children = [("entry",) + crawl + ([
+                        entry['summonerId'] for entry in entries],)]
+                else:
+                    puuid = self._request("summoner.by_id", self.region, 
+                                          item["key"])["puuid"]
+                    match_list = self._request("match.matchlist_by_puuid",
+                                               self.region, puuid)
+                    # Matches claimed by another item are skipped
+                    match_list = match_list[:match_per_id]
+                    claimed = coordinator.claim(item["id"], match_list)
+                    for _ in range(len(set(match_list)) - len(claimed)):
+                        self.telemetry.duplicate("coordinator")
+                    lost, position = False, 0
+                    for matchId in claimed:
+                        if coordinator.kept() >= n: break
+                        position += 1
+                        # Crawled by another crawl
+                        if self._skip(matchId, ()): continue
+                        timeline = self._request("match.timeline_by_match",
+                                                 self.region, matchId)
+                        # The claim of a lost item may be taken by another
+                        # worker, which writes the match instead
+                        if not coordinator.renew(item["id"], worker):
+                            lost = True
+                            break
+                        kept = self._meets_cutoff(timeline, cutoff)
+                        if kept:
+                            writer.write(timeline)
+                            n_kept += 1
+                        # Recorded once on disk, so that neither the
+                        # match nor the counts are lost with the lease
+                        self._flush(writer, [matchId])
+                        if not coordinator.record(item["id"], worker,
+                                                  matchId, kept):
+                            lost = True
+                            break
+                    if lost:
+                        # The item was given to another worker meanwhile
+                        continue
+                    unused = claimed[position:]
+                coordinator.complete(item["id"], worker, children, unused)
+        finally:
+            writer.close()
+            self.telemetry.dump()
+        return n_kept
+
+
+    def _check_crawl(self, n:int, match_per_id:int, file:str, 
+                     cutoff:int) -> tuple:
+        """Check the arguments of a crawl, and return the file to 
+        write to and whether to keep it."""
         # Define variables
         to_disk = True if file else False
         file_path = file if to_disk else ".temp.json"
 
         # Error checking
-        if os.path.exists(file_path) and to_disk:
-            raise ValueError(f"File {file_path} already exist.")
         if n <= 0:
             raise ValueError("Invalid number of matched to be crawled.")
         if match_per_id <= 0:
             raise ValueError("Invalid number of match per account.")
         if cutoff < 0:
             raise ValueError("Invalid cutoff.")
+        return file_path, to_disk
+
+
+    def _start(self, file_path:str, to_disk:bool, resume:bool) -> tuple:
+        """Prepare the file of a crawl. Return the matchIds already 
+        crawled, and the checkpointed position of the crawl (None to
+        start from the beginning)."""
+        checkpoint = file_path + ".ckpt"
+        if not resume:
+            if os.path.exists(file_path) and to_disk:
+                raise ValueError(f"File {file_path} already exist.")
+            # Leftovers of an interrupted crawl without file
+            for leftover in [file_path, index_path(file_path), checkpoint]:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            return set(), None
+        cursor = None
+        if os.path.exists(checkpoint):
+            with open(checkpoint, 'r') as f:
+                cursor = json.load(f)
+            crawl = [self.region, self.tier, self.queue]
+            if [cursor["region"], cursor["tier"], cursor["queue"]] != crawl:
+                raise ValueError(f"File {file_path} was crawled with " +
+                                 "another region, tier or queue.")
+        if not os.path.exists(file_path):
+            return set(), cursor
+        if file_path.endswith(".gz"):
+            visited = set(timeline_match_id(timeline) for timeline in
+                          iter_timelines(file_path, raw=True))
+            visited.discard(None)
+            return visited, cursor
+        # Drop a match that was only partially written
+        with open(file_path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                f.seek(max(0, end - (1 << 16)))
+                chunk = f.read(end - max(0, end - (1 << 16)))
+                if b'\n' in chunk:
+                    end = end - len(chunk) + chunk.rindex(b'\n') + 1
+                    break
+                end -= len(chunk)
+            if end < size:
+                f.truncate(end)
+        with TimelineIndex(file_path) as index:
+            visited = set(index.match_ids_)
+        visited.discard('')
+        return visited, cursor
+
+
+    def _seen(self, matchId:str) -> bool:
+        """Whether the match was crawled by another crawl sharing the
+        ``dedupe_store``."""
+        return self.dedupe_store is not None and matchId in self.dedupe_store
+
+
+    def _skip(self, matchId:str, visited_matchIds:set) -> bool:
+        """Whether the match was already crawled, by this crawl or by
+        another one (see ``_seen``)."""
+        if matchId in visited_matchIds:
+            self.telemetry.duplicate("visited")
+        elif self._seen(matchId):
+            self.telemetry.duplicate("store")
+        else:
+            return False
+        return True
+
+
+    @staticmethod
+    def _writer(file_path:str, to_disk:bool, callback):
+        """Open the file of a crawl, unless the crawled matches are 
+        only passed to ``callback``."""
+        if callback is not None and not to_disk:
+            return None
+        return TimelineWriter(file_path)
+
+
+    @staticmethod
+    def _keep(timeline:dict, writer, callback) -> None:
+        """Save a timeline meeting the cutoff, and pass it on."""
+        if writer is not None:
+            writer.write(timeline)
+        if callback is not None:
+            callback(timeline)
 
-        # Fetch a set of leagueIds
+
+    def _meets_cutoff(self, timeline:dict, cutoff:int) -> bool:
+        """Whether a crawled timeline is kept, invalid ones are not."""
+        try:
+            kept = meets_cutoff(timeline, cutoff)
+        except (KeyError, TypeError, ZeroDivisionError):
+            kept = False
+        self.telemetry.match(kept)
+        return kept
+
+
+    def _flush(self, writer, downloaded:list) -> None:
+        """Write the buffered matches to disk, and record the matchIds
+        downloaded since the last flush (kept or not) in the 
+        ``dedupe_store``."""
+        if writer is not None:
+            writer.flush()
+        if self.dedupe_store is not None:
+            self.dedupe_store.update(match_id for match_id in downloaded
+                                     if match_id)
+        downloaded.clear()
+
+
+    def _checkpoint(self, file_path:str, writer, downloaded:list, 
+                    leagueId:str, entry:int, crawled:int) -> None:
+        """Save the position of a crawl: the next account to crawl is
+        the ``entry`` th of league ``leagueId``. The crawled matchIds
+        are those of the file, which is flushed first."""
+        self._flush(writer, downloaded)
+        with atomic_write(file_path + ".ckpt") as f:
+            json.dump({"region": self.region, "tier": self.tier,
+                       "queue": self.queue, "leagueId": leagueId,
+                       "entry": entry, "crawled": crawled}, f)
+
+
+    @staticmethod
+    def _resume_from(leagueIds:list, cursor:dict) -> tuple:
+        """Return the leagueIds left to crawl, and the first account
+        to crawl in the first of them."""
+        if cursor is None or cursor["leagueId"] not in leagueIds:
+            return leagueIds, 0
+        return leagueIds[leagueIds.index(cursor["leagueId"]):], \
+               cursor["entry"]
+
+
+    def _league_request(self) -> tuple:
+        """Return the endpoint, and its arguments, listing the leagues
+        of the tier."""
         # For highest tiers - LeagueLists
-        if self.tier in ["CHALLENGER", "GRANDMASTER", "MASTER"]: 
-            # For challengers
-            if self.tier == "CHALLENGER":
-                league_list = self.watcher.league\
-                              .challenger_by_queue(self.region,
-                                                   self.queue)               
-            # For grandmasters
-            elif self.tier == "GRANDMASTER":
-                league_list = self.watcher.league\
-                              .grandmaster_by_queue(self.region,
-                                                    self.queue)
-            # For masters
-            elif self.tier == "MASTER":
-                league_list = self.watcher.league\
-                              .masters_by_queue(self.region,
-                                                self.queue)
-            leagueIds = set([league_list["leagueId"]])
+        if self.tier == "CHALLENGER":
+            return "league.challenger_by_queue", self.region, self.queue
+        elif self.tier == "GRANDMASTER":
+            return "league.grandmaster_by_queue", self.region, self.queue
+        elif self.tier == "MASTER":
+            return "league.masters_by_queue", self.region, self.queue
         # For all others - LeagueEntries
+        return "league.entries", self.region, self.queue, self.tier, "I"
+
+
+    def _method(self, endpoint:str):
+        """Return the watcher method of an endpoint, like 
+        ``"summoner.by_id"``."""
+        api, method = endpoint.split(".")
+        return getattr(getattr(self.watcher, api), method)
+
+
+    def _scheduler(self) -> RequestScheduler:
+        """Return the ``scheduler``, or one with ``rate_limits``."""
+        if self.scheduler is not None:
+            return self.scheduler
+        if self._default_scheduler is None or \
+           self._default_scheduler.app_limits != list(self.rate_limits):
+            self._default_scheduler = RequestScheduler(
+                self.rate_limits, telemetry=self.telemetry)
+        return self._default_scheduler
+
+
+    def _request(self, endpoint:str, *args):
+        """Send a request within the rate limits, unless it is cached.
+        The first argument is the routing value."""
+        return self._method(endpoint)(*args)
+
+
+    @staticmethod
+    def _league_ids(response) -> list:
+        """Return the sorted leagueIds of a LeagueList or of a list of
+        LeagueEntries."""
+        if isinstance(response, dict):
+            leagueIds = set([response["leagueId"]])
         else:
-            league_entries_set = self.watcher.league\
-                                 .entries(self.region, self.queue,
-                                          self.tier, "I")
-            leagueIds = set([entry["leagueId"] for entry in league_entries_set])
+            leagueIds = set([entry["leagueId"] for entry in response])
         leagueIds = list(leagueIds)
         leagueIds.sort() # For testing purposes
+        return leagueIds
 
-        # Start crawling                                 
-        # Record matches that are already visited
-        visited_matchIds = set()
-        # Set tqdm progress bar
-        pbar = tqdm(total=n)
-        pbar.set_description("Crawling matches")
-        # Iterate over the leagueIds to fetch leagueEntries
-        for leagueId in leagueIds:
-            entries = self.watcher.league.by_id(self.region, leagueId)['entries']
-            # Then fetch summonerIds for each LeagueEntry
-            for entry in entries:
-                summonerId = entry['summonerId']
-                # Then fetch puuid for that summonerIds
-                puuid = self.watcher.summoner.by_id(self.region, summonerId)["puuid"]
-                #Then fetch a list of matchIds for that puuid
-                match_list = self.watcher.match.matchlist_by_puuid(self.region, puuid)
-                # Lastly fetch MatchTimelines for each matchId
-                for i in range(min(match_per_id, len(match_list))):
-                    matchId = match_list[i]
-                    if matchId in visited_matchIds: continue
-                    timeline = self.watcher.match.timeline_by_match(self.region,
-                                                                    matchId)
-                    # Save to disk
-                    write_messy_json(timeline, file_path)
-                    visited_matchIds.add(matchId)
-                    pbar.update(1)
-                    if len(visited_matchIds) == n: break
-                if len(visited_matchIds) == n: break
-            if len(visited_matchIds) == n: break
-        if len(visited_matchIds) < n:
+
+    def _pool_connections(self, size:int) -> None:
+        """Let the HTTP session of a ``LolWatcher`` keep ``size``
+        connections open, so that concurrent requests reuse them."""
+        session = getattr(getattr(self.watcher, "_base_api", None), 
+                          "_session", None)
+        if session is None:
+            return
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        session.mount("https://", adapter)
+
+
+    def _finish(self, n:int, n_crawled:int, match_per_id:int, 
+                file_path:str, to_disk:bool, cutoff:int) -> list:
+        """Return the crawled matches."""
+        if n_crawled < n:
             print(f"{n} unique matches cannot be met with match_per_id "+
-                  f"= {match_per_id} (currently {len(visited_matchIds)} matches).")
-        pbar.close()
-        # Clean matches with specified cutoff
-        result = clean_json(file_path, cutoff)
+                  f"= {match_per_id} (currently {n_crawled} matches).")
+        if os.path.exists(file_path + ".ckpt"):
+            os.remove(file_path + ".ckpt")
+        if not os.path.exists(file_path):
+            return []
+        # The file only holds matches meeting the cutoff
+        result = list(iter_timelines(file_path))
+        print(f"There are in total {len(result)} crawled matches " +
+              f"longer than {cutoff} minutes.")
         
         # Clean temporary files if to_dick is False
         if not to_disk:
-            os.remove(file_path)
+            for temp in [file_path, index_path(file_path)]:
+                if os.path.exists(temp):
+                    os.remove(temp)
 
-        return result
\ No newline at end of file
+        return result
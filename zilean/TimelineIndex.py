@@ -0,0 +1,313 @@
+import mmap
+import numpy as np
+
+from .core import *
+
+
+class TimelineIndex:
+    """TimelineIndex gives random access to the ``MatchTimelineDto`` s
+    of a JSONL file (one match per line, like the output of
+    ``TimelineCrawler.crawl`` or ``write_messy_json``), without
+    scanning nor decoding the whole file.
+
+    The index is stored in a sidecar file next to the JSONL file (see
+    ``zilean.index_path``), with one tab separated line per match: its
+    matchId, byte offset and length in the file, number of frames and
+    frame interval. Matches appended to the file after the sidecar was
+    written are indexed when the TimelineIndex is created, and the
+    sidecar is built again if the file was rewritten since. The file
+    is memory mapped, so reading a match is a slice of the map. Use
+    the index as a context manager, or ``close`` it.
+
+    A TimelineIndex is an iterable of ``MatchTimelineDto`` s, it can
+    be fed to a :class:`zilean.SnapShots` directly. Subsets of the
+    matches (see ``shard`` and ``filter``) share the same map.
+
+    Attributes
+    ----------
+    file : str
+        Name of the JSONL file.
+    match_ids_ : list
+        The matchId of each indexed match, in file order.
+    offsets_ : numpy.ndarray
+        Byte offset of each match in the file.
+    lengths_ : numpy.ndarray
+        Byte length of each match in the file.
+    frames_ : numpy.ndarray
+        Number of frames of each match.
+    frame_intervals_ : numpy.ndarray
+        Frame interval (in milliseconds) of each match.
+    """
+
+    def __init__(self, file:str) -> None:
+        self.file = file
+        self._map = self._open(file)
+        self._owns_map = True
+        entries = []
+        stale = False
+        if os.path.exists(index_path(file)):
+            with open(index_path(file), 'r') as f:
+                entries = [self._parse(line) for line in f 
+                           if line.count('\t') == 4]
+            # Index the whole file again if it was rewritten since
+            stale = self._stale(file, entries)
+            if stale:
+                entries = []
+        end = entries[-1][1] + entries[-1][2] if entries else 0
+        # Index the matches written after the sidecar
+        if len(self._map) > end or stale:
+            new_entries = self._scan(file, end, len(self._map))
+            if stale:
+                with atomic_write(index_path(file)) as f:
+                    f.writelines(new_entries)
+            else:
+                with open(index_path(file), 'a') as f:
+                    f.writelines(new_entries)
+            entries += [self._parse(line) for line in new_entries]
+        elif entries and self._newer(file, index_path(file)):
+            # The sidecar was checked, no need to check it again
+            os.utime(index_path(file))
+        self._set_entries(entries)
+
+
+    @staticmethod
+    def _newer(file:str, other:str) -> bool:
+        """Whether ``file`` was modified after ``other``."""
+        return os.stat(file).st_mtime_ns > os.stat(other).st_mtime_ns
+
+
+    def _stale(self, file:str, entries:list) -> bool:
+        """Whether the sidecar ``entries`` no longer describe the
+        mapped file. The entries are only checked against the matches
+        when the file was modified after its sidecar."""
+        size = len(self._map)
+        if entries and entries[-1][1] + entries[-1][2] > size:
+            return True
+        if not self._newer(file, index_path(file)):
+            return False
+        for match_id, offset, length, _, _ in entries:
+            line = self._map[offset:offset + length]
+            if offset > 0 and self._map[offset - 1:offset] != b'\n':
+                return True
+            if not line.endswith(b'\n') and offset + length < size:
+                return True
+            if match_id.encode() not in line:
+                return True
+        return False
+
+
+    @staticmethod
+    def _scan(file:str, start:int, end:int) -> list:
+        """Index the lines of ``file`` from byte ``start`` to byte
+        ``end``, and return the lines of the sidecar."""
+        entries = []
+        with open(file, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if offset >= end:
+                    break
+                if line.strip():
+                    try:
+                        timeline = json_loads(line)
+                    except ValueError:
+                        timeline = None
+                    entries.append(index_entry(timeline, offset, len(line)))
+                offset += len(line)
+        return entries
+
+
+    @staticmethod
+    def _parse(line:str) -> tuple:
+        """Parse a line of the sidecar, see ``zilean.index_entry``."""
+        fields = line.rstrip('\n').split('\t')
+        return (fields[0],) + tuple(int(x) for x in fields[1:])
+
+
+    @staticmethod
+    def _open(file:str):
+        """Memory map ``file`` for reading."""
+        with open(file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+    def _set_entries(self, entries:list) -> None:
+        """Store the parsed lines of the sidecar as arrays."""
+        columns = np.array([entry[1:] for entry in entries],
+                           dtype=np.int64).reshape(-1, 4)
+        self._set_columns([entry[0] for entry in entries], *columns.T)
+
+
+    def _set_columns(self, match_ids:list, offsets:np.ndarray, 
+                     lengths:np.ndarray, frames:np.ndarray,
+                     frame_intervals:np.ndarray) -> None:
+        self.match_ids_ = match_ids
+        self.offsets_ = offsets
+        self.lengths_ = lengths
+        self.frames_ = frames
+        self.frame_intervals_ = frame_intervals
+        # Later duplicates of a matchId are only reachable by position
+        self._positions = {}
+        for i, match_id in enumerate(self.match_ids_):
+            self._positions.setdefault(match_id, i)
+
+
+    def _select(self, rows:np.ndarray):
+        """Return a TimelineIndex of some of the matches, sharing the
+        same map."""
+        subset = TimelineIndex.__new__(TimelineIndex)
+        subset.file = self.file
+        subset._map = self._map
+        subset._owns_map = False
+        subset._set_columns([self.match_ids_[i] for i in rows],
+                            *(column[rows] for column in 
+                              (self.offsets_, self.lengths_, self.frames_,
+                               self.frame_intervals_)))
+        return subset
+
+
+    def close(self) -> None:
+        """Unmap the file. Subsets (see ``shard`` and ``filter``) share
+        the map of the index they come from, and only that index
+        unmaps it."""
+        if self._owns_map and isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def __len__(self) -> int:
+        return len(self.match_ids_)
+
+
+    def __contains__(self, match_id:str) -> bool:
+        return match_id in self._positions
+
+
+    def raw(self, i:int) -> bytes:
+        """Return the JSON text of the ``i`` th match.
+
+        Parameters
+        ----------
+        i : int
+            Position of the match in the index.
+
+        Returns
+        -------
+        bytes
+            The JSON text.
+        """
+        offset = int(self.offsets_[i])
+        return self._map[offset:offset + int(self.lengths_[i])]
+
+
+    def __getitem__(self, match_id:str) -> dict:
+        """Decode the match with the given matchId."""
+        return json_loads(self.raw(self._positions[match_id]))
+
+
+    def iter(self, raw:bool=False, frames:list=None):
+        """Iterate over the matches, in file order.
+
+        Parameters
+        ----------
+        raw : bool
+            If True, yield the JSON text of each match instead of the
+            decoded dictionary. Defaults to False.
+        frames : :obj:`list`, optional
+            If provided, only keep what is needed to process these
+            frames of each match, see ``load_timeline``. Defaults to
+            None.
+
+        Yields
+        ------
+        dict | bytes
+            A ``MatchTimelineDto``, or its JSON text if ``raw``.
+        """
+        for i in range(len(self)):
+            yield self.raw(i) if raw else load_timeline(self.raw(i), frames)
+
+
+    def __iter__(self):
+        return self.iter()
+
+
+    def shard(self, worker:int, n_workers:int):
+        """Split the file into ``n_workers`` byte ranges of even size,
+        and return the matches starting in the ``worker`` th range.
+        Each match belongs to exactly one shard.
+
+        Parameters
+        ----------
+        worker : int
+            The shard, from 0 to ``n_workers - 1``.
+        n_workers : int
+            The number of shards.
+
+        Returns
+        -------
+        zilean.TimelineIndex
+            The matches of the shard.
+        """
+        if not 0 <= worker < n_workers:
+            raise ValueError("Invalid shard.")
+        size = len(self._map)
+        start = size * worker // n_workers
+        end = size * (worker + 1) // n_workers
+        return self._select(np.flatnonzero((self.offsets_ >= start) &
+                                           (self.offsets_ < end)))
+
+
+    def filter(self, cutoff:int=16):
+        """Return the matches lasting at least ``cutoff`` minutes (see
+        ``zilean.meets_cutoff``), using the index only. Invalid matches
+        are dropped.
+
+        Parameters
+        ----------
+        cutoff : int
+            Minimum minutes the matches must have. Defaults to 16.
+
+        Returns
+        -------
+        zilean.TimelineIndex
+            The matches lasting long enough.
+        """
+        valid = self.frame_intervals_ > 0
+        needed = np.zeros(len(self), dtype=np.int64)
+        needed[valid] = (cutoff * 60000 / self.frame_intervals_[valid])\
+                        .astype(np.int64)
+        return self._select(np.flatnonzero(valid & (self.frames_ >= needed)))
+
+
+    def write(self, output:str) -> None:
+        """Write the matches to a new JSONL file, with its sidecar. 
+        Matches are copied as is, without decoding them.
+
+        Parameters
+        ----------
+        output : str
+            Name of the JSONL file. It may be the indexed file itself,
+            which is then replaced.
+        """
+        entries, offset = [], 0
+        with atomic_write(output, 'wb') as out:
+            for i in range(len(self)):
+                line = self.raw(i)
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                out.write(line)
+                entries.append(f"{self.match_ids_[i]}\t{offset}\t" +
+                               f"{len(line)}\t{self.frames_[i]}\t" +
+                               f"{self.frame_intervals_[i]}\n")
+                offset += len(line)
+        with atomic_write(index_path(output)) as f:
+            f.writelines(entries)
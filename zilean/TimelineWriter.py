@@ -0,0 +1,87 @@
+import gzip
+
+from .core import *
+
+
+class TimelineWriter:
+    """TimelineWriter appends ``MatchTimelineDto`` s to a JSONL file
+    (one match per line) through a single buffered file handle, with
+    the index sidecar of the file (see :class:`zilean.TimelineIndex`).
+    Files ending with ".gz" are gzip compressed instead, and have no
+    sidecar since compressed matches cannot be read at an offset.
+
+    Entries of the sidecar are held until the file is flushed and
+    synced to disk, and only then written, so that the sidecar never
+    describes matches which are not in the file. Use the writer as a
+    context manager, or ``close`` it.
+
+    Attributes
+    ----------
+    file : str
+        Name of the file. Matches are appended if it exists.
+    buffer_size : int
+        Size (in bytes) of the write buffer, defaults to 1M.
+    compressed : bool
+        Whether the file is gzip compressed.
+    count : int
+        Number of matches written by this writer.
+    """
+
+    def __init__(self, file:str, buffer_size:int=1<<20) -> None:
+        self.file = file
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.compressed = file.endswith(".gz")
+        if self.compressed:
+            self._file = gzip.open(file, 'ab')
+            self._index = None
+        else:
+            self._file = open(file, 'ab', buffering=buffer_size)
+            self._offset = self._file.seek(0, os.SEEK_END)
+            self._index = open(index_path(file), 'a', buffering=buffer_size)
+            self._entries = []
+
+
+    def write(self, timeline:dict) -> None:
+        """Append a ``MatchTimelineDto``.
+
+        Parameters
+        ----------
+        timeline : dict
+            A Riot ``MatchTimelineDto``.
+        """
+        line = (json.dumps(timeline) + '\n').encode()
+        self._file.write(line)
+        if self._index is not None:
+            self._entries.append(index_entry(timeline, self._offset,
+                                             len(line)))
+            self._offset += len(line)
+        self.count += 1
+
+
+    def flush(self) -> None:
+        """Write the buffered matches to disk, then their entries to
+        the sidecar."""
+        self._file.flush()
+        if self._index is not None:
+            if self._entries:
+                os.fsync(self._file.fileno())
+                self._index.write("".join(self._entries))
+                self._entries.clear()
+            self._index.flush()
+
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        self.flush()
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
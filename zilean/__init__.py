@@ -1,7 +1,18 @@
 __version__ = "0.0.2"
 
 from .core import *
+from .FeatureSchema import *
+from .MatchCache import *
 from .SnapShots import *
+from .TimelineIndex import *
+from .MatchIdStore import *
+from .TimelineWriter import *
+from .CachedWatcher import *
+from .CrawlTelemetry import *
+from .RequestScheduler import *
+from .CrawlCoordinator import *
 from .TimelineCrawler import *
 from .DummyWatcher import *
+from .AsyncDummyWatcher import *
+from .RateLimitedDummyWatcher import *
 from .dummy_api import *
\ No newline at end of file
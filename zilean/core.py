@@ -1,7 +1,27 @@
 import os
+import re
+import gzip
 import json
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from time import time
+from operator import itemgetter
 from tqdm import tqdm
+import numpy as np
+
+from .FeatureSchema import FeatureSchema
+
+# Faster JSON parsers, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
 
 # =================
 # == Basic Utils == 
@@ -37,7 +57,7 @@ def read_api_key(api_key:str=None) -> str:
     else:
         return api_key
 
-def write_messy_json(dic:dict, file:str) -> None:
+def write_messy_json(dic:dict, file:str, index:bool=False) -> None:
     """Append a dictionary to a file. The file are organized
     line-by-line (each dict is a line).
 
@@ -47,10 +67,102 @@ def write_messy_json(dic:dict, file:str) -> None:
         Any dictionary.
     file : str
         Name of file to append.
+    index : bool
+        Also append the position of the line to the index sidecar of
+        ``file`` (see :class:`zilean.TimelineIndex`). Defaults to 
+        False.
+    """
+    line = (json.dumps(dic) + '\n').encode()
+    with open(file, 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(line)
+    if index:
+        with open(index_path(file), 'a') as f:
+            f.write(index_entry(dic, offset, len(line)))
+
+
+def index_path(file:str) -> str:
+    """Return the name of the index sidecar of a JSONL file, see
+    :class:`zilean.TimelineIndex`."""
+    return file + ".idx"
+
+
+def index_entry(timeline:dict, offset:int, length:int) -> str:
+    """Return the line of an index sidecar describing a match: its
+    matchId, byte offset and length in the JSONL file, number of frames
+    and frame interval, separated by tabs. Invalid matches have an 
+    empty matchId, no frames and a frame interval of 0.
+
+    Parameters
+    ----------
+    timeline : dict
+        A Riot ``MatchTimelineDto``.
+    offset : int
+        Position (in bytes) of the match in the file.
+    length : int
+        Length (in bytes) of the line of the match, newline included.
+
+    Returns
+    -------
+    str
+        The line, ending with a newline.
+    """
+    try:
+        match_id = str(timeline['metadata']['matchId'])
+    except (KeyError, TypeError):
+        match_id = ''
+    try:
+        frames = len(timeline['info']['frames'])
+        frame_interval = int(timeline['info']['frameInterval'])
+    except (KeyError, TypeError, ValueError):
+        frames, frame_interval = 0, 0
+    return f"{match_id}\t{offset}\t{length}\t{frames}\t{frame_interval}\n"
+
+
+def meets_cutoff(timeline:dict, cutoff:int=16) -> bool:
+    """Check if a ``MatchTimelineDto`` lasts at least ``cutoff`` minutes.
+
+    Parameters
+    ----------
+    timeline : dict
+        A Riot ``MatchTimelineDto``.
+    cutoff : int
+        Minimum minutes the match must have. Defaults to 16.
+
+    Returns
+    -------
+    bool
+        Whether the match is long enough.
     """
-    with open(file, 'a') as f:
-        json.dump(dic, f)
-        f.write('\n')
+    frame_interval = timeline['info']['frameInterval']
+    total_frame_num = len(timeline['info']['frames'])
+    return total_frame_num >= int(cutoff*60000/frame_interval)
+
+
+@contextmanager
+def atomic_write(file:str, mode:str='w'):
+    """Open a temporary file next to ``file`` for writing, and move it
+    onto ``file`` only once writing succeeded. A crash while writing
+    never leaves a truncated ``file`` behind.
+
+    Parameters
+    ----------
+    file : str
+        Name of the file to write.
+    mode : str
+        Mode to open the temporary file with, defaults to "w".
+    """
+    directory = os.path.dirname(os.path.abspath(file))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".zilean-",
+                                     suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(temp_path, file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 
 def clean_json(file:str, cutoff:int=16) -> list:
@@ -68,26 +180,296 @@ def clean_json(file:str, cutoff:int=16) -> list:
     -------
     dict
         The cleaned JSON content as a dictionary.
+
+    Notes
+    -----
+        All the matches are held in memory. For large files, use
+        ``filter_json`` which streams the matches instead.
     """
     with open(file, 'r') as f:
         matches = []
         for i, line in enumerate(tqdm(f)):
-            match = json.loads(line)
-            frame_interval = match['info']['frameInterval']
-            total_frame_num = len(match['info']['frames'])
-            if total_frame_num < int(cutoff*60000/frame_interval):
+            match = json_loads(line)
+            if not meets_cutoff(match, cutoff):
                 continue;
             matches += [match]
     print(f"There are in total {len(matches)} crawled matches " +
           f"longer than {cutoff} minutes.")
-    with open(file, 'w') as f:  
+    with atomic_write(file) as f:  
         json.dump(matches, f)
     return matches
 
+
+def filter_json(file:str, output:str=None, cutoff:int=16, 
+                lines:bool=False) -> int:
+    """Streaming version of ``clean_json``. Read a messy JSON file
+    that store ``MatchTimelineDto`` s line by line, and write the
+    matches that last longer than a specific cutoff straight to the
+    output. Only a single match is held in memory at a time.
+
+    Parameters
+    ----------
+    file : str
+        Messy file produced by write_messy_json(dic, file).
+    output : :obj:`str`, optional
+        Name of the file to write the cleaned matches to. If None,
+        ``file`` is replaced. Defaults to None.
+    cutoff : int
+        Minimum minutes the matches must have. Defaults to 16.
+    lines : bool
+        If True, write one match per line (same format as ``file``).
+        If False (default), write a JSON list of matches, like 
+        ``clean_json``.
+
+    Returns
+    -------
+    int
+        The number of matches written.
+    """
+    output = output if output else file
+    count = 0
+    with open(file, 'r') as f, atomic_write(output) as out:
+        if not lines:
+            out.write('[')
+        for line in tqdm(f):
+            if not line.strip():
+                continue
+            match = json_loads(line)
+            if not meets_cutoff(match, cutoff):
+                continue
+            # The line is written as is, no need to serialize again
+            if lines:
+                out.write(line.rstrip('\n') + '\n')
+            else:
+                out.write((', ' if count else '') + line.strip())
+            count += 1
+        if not lines:
+            out.write(']')
+    print(f"There are in total {count} crawled matches " +
+          f"longer than {cutoff} minutes.")
+    return count
+
+def iter_timelines(file:str, chunk_size:int=1<<20, raw:bool=False,
+                   frames:list=None):
+    """Iterate over the ``MatchTimelineDto`` s stored in a file, one 
+    match at a time. The file can either be a JSON list of matches
+    (like the output of ``clean_json``), or have one match per line
+    (like the output of ``write_messy_json``). Files ending with ".gz"
+    are gzip compressed (see ``TimelineWriter``). The file is never
+    loaded as a whole.
+
+    Parameters
+    ----------
+    file : str
+        Name of the file.
+    chunk_size : int
+        Number of characters read from the file at once, defaults
+        to 1M.
+    raw : bool
+        If True, yield the JSON text of each match instead of the
+        decoded dictionary, for example to decode it in another 
+        process. Defaults to False.
+    frames : :obj:`list`, optional
+        If provided, only keep what is needed to process these frames
+        of each match, see ``load_timeline``. Defaults to None (the 
+        whole matches).
+
+    Yields
+    ------
+    dict | str
+        A ``MatchTimelineDto``, or its JSON text if ``raw``.
+    """
+    decoder = json.JSONDecoder()
+    opener = gzip.open if file.endswith(".gz") else open
+    with opener(file, 'rt') as f:
+        buffer = f.read(chunk_size).lstrip()
+        # One match per line
+        if not buffer.startswith('['):
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield line if raw else load_timeline(line, frames)
+            return
+        # A JSON list, decode one element at a time
+        buffer, pos = buffer[1:], 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                start = pos
+                match, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element is incomplete, read more. Grow geometrically
+                # so that large elements are not decoded too many times
+                more = f.read(max(chunk_size, len(buffer) - pos))
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            if raw:
+                yield buffer[start:pos]
+            else:
+                yield match if frames is None else \
+                      project_timeline(match, frames)
+
+# ===================
+# == JSON Decoding == 
+# ===================
+
+# Available JSON backends, the first installed one is used by default
+JSON_BACKENDS = [name for name, module in [("orjson", orjson), 
+                                           ("simdjson", simdjson)] 
+                 if module is not None] + ["json"]
+_json_backend = JSON_BACKENDS[0]
+_simdjson_parser = None
+
+
+def set_json_backend(backend:str) -> None:
+    """Choose the parser used to decode ``MatchTimelineDto`` s. By 
+    default, the fastest installed parser is used.
+
+    Parameters
+    ----------
+    backend : str
+        One of "orjson", "simdjson" (if installed) or "json" (the
+        standard library).
+    """
+    global _json_backend
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"JSON backend {backend} is not available, " +
+                         f"choose one of {JSON_BACKENDS}.")
+    _json_backend = backend
+
+
+def json_loads(text):
+    """Decode JSON text with the chosen backend, see 
+    ``set_json_backend``.
+
+    Parameters
+    ----------
+    text : str | bytes
+        JSON text.
+
+    Returns
+    -------
+    Any
+        The decoded object.
+    """
+    if _json_backend == "orjson":
+        return orjson.loads(text)
+    if _json_backend == "simdjson":
+        return simdjson.loads(text)
+    return json.loads(text)
+
+
+def project_timeline(timeline, frames:list) -> dict:
+    """Keep only the parts of a Riot ``MatchTimelineDto`` read by 
+    ``process_timeframes``: the matchId, the frame interval, the 
+    ``participantFrames`` of the first frame and of ``frames``, and 
+    the last event of the last frame. Other frames are left empty, so
+    that frames keep their position.
+
+    Parameters
+    ----------
+    timeline : dict | simdjson.Object
+        A Riot ``MatchTimelineDto``, either decoded or lazily parsed
+        by simdjson. Only the projected parts are materialized.
+    frames : list
+        Integers representing the frames of interest.
+
+    Returns
+    -------
+    dict
+        The projected ``MatchTimelineDto``. Keys missing from 
+        ``timeline`` are also missing from the projection, so that it
+        is validated the same way.
+    """
+    def get(container, key):
+        try:
+            return container[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def materialize(value):
+        # simdjson containers are only materialized here
+        return value.as_dict() if hasattr(value, "as_dict") else value
+
+    projected = {}
+    match_id = get(get(timeline, "metadata"), "matchId")
+    if match_id is not None:
+        projected["metadata"] = {"matchId": match_id}
+    info = get(timeline, "info")
+    if info is None:
+        return projected
+    projected["info"] = {}
+    if get(info, "frameInterval") is not None:
+        projected["info"]["frameInterval"] = info["frameInterval"]
+    all_frames = get(info, "frames")
+    if all_frames is None:
+        return projected
+    kept = [{} for _ in range(len(all_frames))]
+    for frame in {0, *frames}:
+        participants = get(get(all_frames, frame), "participantFrames")
+        if 0 <= frame < len(kept) and participants is not None:
+            kept[frame]["participantFrames"] = materialize(participants)
+    events = get(get(all_frames, -1), "events")
+    if events is not None:
+        kept[-1]["events"] = [materialize(events[-1])] if len(events) else []
+    projected["info"]["frames"] = kept
+    return projected
+
+
+def load_timeline(text, frames:list=None) -> dict:
+    """Decode a Riot ``MatchTimelineDto`` with the chosen JSON backend
+    (see ``set_json_backend``), optionally only keeping what is needed
+    to process ``frames`` (see ``project_timeline``). With simdjson,
+    the other parts are never materialized.
+
+    Parameters
+    ----------
+    text : str | bytes
+        JSON text of a ``MatchTimelineDto``.
+    frames : :obj:`list`, optional
+        Integers representing the frames of interest. Defaults to None,
+        in which case the whole ``MatchTimelineDto`` is decoded.
+
+    Returns
+    -------
+    dict
+        The decoded ``MatchTimelineDto``.
+    """
+    global _simdjson_parser
+    if frames is None:
+        return json_loads(text)
+    if _json_backend == "simdjson":
+        if _simdjson_parser is None:
+            _simdjson_parser = simdjson.Parser()
+        if isinstance(text, str):
+            text = text.encode()
+        document = _simdjson_parser.parse(text)
+        if not isinstance(document, simdjson.Object):
+            return document
+        return project_timeline(document, frames)
+    timeline = json_loads(text)
+    if not isinstance(timeline, dict):
+        return timeline
+    return project_timeline(timeline, frames)
+
+
 # =====================
 # == Data Processing == 
 # =====================
 
+# Player features that are never kept by `clean_timeframe`
+DROPPED_FEATURES = ['currentGold', 'goldPerSecond', 'participantId', 
+                    'magicDamageDone', 'magicDamageDoneToChampions', 
+                    'magicDamageTaken', 'physicalDamageDone', 
+                    'physicalDamageDoneToChampions', 'physicalDamageTaken',
+                    'trueDamageDone', 'trueDamageDoneToChampions', 
+                    'trueDamageTaken']
+
 def json_data_mask(dic:dict) -> list:
     """Construct a list of keys that have dictionary as their
     corresponding value pair. The list acts as a mask for further
@@ -110,7 +492,8 @@ def json_data_mask(dic:dict) -> list:
     return keys_to_remove
 
 
-def clean_timeframe(timeline:dict, frames:list=[8]) -> dict:
+def clean_timeframe(timeline:dict, frames:list=[8], 
+                    inplace:bool=True) -> dict:
     """Clean unwanted features of a specific frame from a 
     Riot ``MatchTimelineDto`` and fetch player data. 
 
@@ -121,6 +504,12 @@ def clean_timeframe(timeline:dict, frames:list=[8]) -> dict:
         (https://developer.riotgames.com/apis#match-v5/GET_getTimeline)
     frames : list
         Integers representing the frames of interest, defaults to [8]. 
+    inplace : bool
+        If True (default), the participant frames of ``timeline`` are
+        cleaned in place and returned. If False, ``timeline`` is left
+        untouched and new player dictionaries are returned, so the
+        same ``timeline`` can be cleaned any number of times without
+        copying it first.
     
     Returns
     -------
@@ -139,19 +528,26 @@ def clean_timeframe(timeline:dict, frames:list=[8]) -> dict:
     for frame in frames:
         players_mega_dict[str(frame)] = list(timeline['info']['frames'][frame]
                                              ['participantFrames'].values())
-    keys_to_remove = json_data_mask(players_mega_dict[str(frames[0])][0])
-    keys_to_remove += ['currentGold', 'goldPerSecond', 'participantId', 
-                       'magicDamageDone', 'magicDamageDoneToChampions', 
-                       'magicDamageTaken', 'physicalDamageDone', 
-                       'physicalDamageDoneToChampions', 'physicalDamageTaken',
-                       'trueDamageDone', 'trueDamageDoneToChampions', 
-                       'trueDamageTaken']
+    schema = participant_schema(players_mega_dict[str(frames[0])][0])
+    if not inplace:
+        getter, fields = schema["getter"], schema["fields"]
+        # Field names in the order the getter returns them
+        ordered = [None] * len(fields)
+        for field, position in zip(fields, schema["order"]):
+            ordered[position] = field
+        for frame, player_list in players_mega_dict.items():
+            cleaned = [dict(zip(ordered, getter(player))) 
+                       for player in player_list]
+            if ordered != fields:
+                cleaned = [{k: player[k] for k in fields} for player in cleaned]
+            players_mega_dict[frame] = cleaned
+        return players_mega_dict
     for frame, player_list in players_mega_dict.items():
         for player in player_list:
             if 'damageStats' in player.keys():
                 damage_stat = player['damageStats']
                 player.update(damage_stat)
-            for key in keys_to_remove:
+            for key in schema["removed"]:
                 if key in player.keys():
                     player.pop(key)
     return players_mega_dict
@@ -244,8 +640,426 @@ def add_proportion(timeframes:dict) -> dict:
     return timeframes
 
 
+def timeframe_fields(participant_frame:dict) -> list:
+    """Construct the ordered list of player features that
+    ``clean_timeframe`` keeps for a participant frame, without
+    modifying the participant frame.
+
+    Parameters
+    ----------
+    participant_frame : dict
+        A single player of the ``participantFrames`` of a Riot
+        ``MatchTimelineDto`` frame.
+
+    Returns
+    -------
+    list
+        Names of the features kept, in the same order as the keys
+        of a player cleaned by ``clean_timeframe``.
+    """
+    keys_to_remove = json_data_mask(participant_frame) + DROPPED_FEATURES
+    # `dict.update` keeps the position of existing keys and appends
+    # the new ones, so the damage stats come last
+    keys = list(participant_frame.keys())
+    keys += [key for key in participant_frame.get('damageStats', {}).keys()
+             if key not in participant_frame]
+    return [key for key in keys if key not in keys_to_remove]
+
+
+def _field_getter(participant_frame:dict, fields:list) -> tuple:
+    """Return a function that fetches ``fields`` of a participant
+    frame as a tuple, looking into ``damageStats`` when needed, and
+    the position of each field in that tuple."""
+    damage_stats = participant_frame.get('damageStats', {})
+    top_fields = [k for k in fields if k not in damage_stats]
+    damage_fields = [k for k in fields if k in damage_stats]
+    order = [(top_fields + damage_fields).index(k) for k in fields]
+    getters = []
+    for keys in (top_fields, damage_fields):
+        if len(keys) == 0:
+            getters.append(lambda d: ())
+        elif len(keys) == 1:
+            getters.append(lambda d, k=keys[0]: (d[k],))
+        else:
+            getters.append(itemgetter(*keys))
+    top_getter, damage_getter = getters
+    if damage_fields:
+        def getter(player):
+            return top_getter(player) + damage_getter(player['damageStats'])
+        return getter, order
+    return top_getter, order
+
+
+# Cache of participant schemas, keyed by the keys of a participant
+# frame and of its `damageStats`
+_participant_schemas = {}
+
+
+def participant_schema(participant_frame:dict) -> dict:
+    """Work out how to extract the features of participant frames
+    shaped like ``participant_frame``. The schema is computed once
+    for every distinct set of keys and then reused, so matches do not
+    need to be scanned for keys one by one.
+
+    Parameters
+    ----------
+    participant_frame : dict
+        A single player of the ``participantFrames`` of a Riot
+        ``MatchTimelineDto`` frame.
+
+    Returns
+    -------
+    dict
+        A dictionary with keys:
+
+        - ``"fields"``: features kept, see ``timeframe_fields``.
+        - ``"integer"``: whether each feature holds integer values.
+        - ``"removed"``: keys dropped by ``clean_timeframe``.
+        - ``"getter"``: function returning the features of a
+          participant frame as a tuple, ordered by ``"order"``.
+        - ``"order"``: position of each feature in that tuple.
+    """
+    damage_stats = participant_frame.get('damageStats', {})
+    key = (tuple(participant_frame), tuple(damage_stats))
+    if key not in _participant_schemas:
+        fields = timeframe_fields(participant_frame)
+        getter, order = _field_getter(participant_frame, fields)
+        _participant_schemas[key] = {
+            "fields": fields,
+            "integer": [type(damage_stats[k] if k in damage_stats 
+                             else participant_frame[k]) is int 
+                        for k in fields],
+            "removed": [k for k in key[0] + key[1] if k not in fields],
+            "getter": getter,
+            "order": order,
+        }
+    return _participant_schemas[key]
+
+
+# Features counted from the events of a timeline, see `index_events`.
+# Objectives are counted for the team taking them, and given to all of
+# its players, so that their lane difference is the team difference.
+EVENT_FEATURES = ['kills', 'deaths', 'assists', 'wardsPlaced', 'wardsKilled',
+                  'itemsPurchased', 'towersDestroyed', 'platesDestroyed',
+                  'dragons', 'heralds', 'barons']
+
+_monster_features = {'DRAGON': 'dragons', 'RIFTHERALD': 'heralds',
+                     'BARON_NASHOR': 'barons'}
+
+
+def index_events(timeline:dict) -> np.ndarray:
+    """Walk the events of a Riot ``MatchTimelineDto`` once, and count
+    them for each player up to every frame. The counts at any frame
+    are then a lookup in the returned array.
+
+    Kills, deaths, assists, placed and killed wards and purchased items
+    are counted for the player involved. Destroyed towers and turret
+    plates, dragons, heralds and barons are counted for the team taking
+    them, and the count is given to each of its players.
+
+    Parameters
+    ----------
+    timeline : dict
+        A Riot ``MatchTimelineDto``. More info at 
+        (https://developer.riotgames.com/apis#match-v5/GET_getTimeline)
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape ``(frames, players, EVENT_FEATURES)``, holding
+        the number of events up to (and including) each frame. Players
+        are ordered as in ``participantFrames``.
+    """
+    frames = timeline['info']['frames']
+    players = {int(key): i for i, key in 
+               enumerate(frames[0]['participantFrames'])}
+    feature = {name: i for i, name in enumerate(EVENT_FEATURES)}
+    counts = np.zeros((len(frames), len(players) + 2, len(EVENT_FEATURES)))
+    # Blue and red team objectives, given to the players at the end
+    blue, red = len(players), len(players) + 1
+    for i, frame in enumerate(frames):
+        count = counts[i]
+        for event in frame['events']:
+            kind = event['type']
+            if kind == 'CHAMPION_KILL':
+                if event.get('killerId') in players:
+                    count[players[event['killerId']], 0] += 1
+                if event.get('victimId') in players:
+                    count[players[event['victimId']], 1] += 1
+                for assist in event.get('assistingParticipantIds', []):
+                    if assist in players:
+                        count[players[assist], 2] += 1
+            elif kind == 'WARD_PLACED':
+                if event.get('creatorId') in players:
+                    count[players[event['creatorId']], 3] += 1
+            elif kind == 'WARD_KILL':
+                if event.get('killerId') in players:
+                    count[players[event['killerId']], 4] += 1
+            elif kind == 'ITEM_PURCHASED':
+                if event.get('participantId') in players:
+                    count[players[event['participantId']], 5] += 1
+            elif kind == 'BUILDING_KILL':
+                # `teamId` is the team losing the building
+                if event.get('buildingType') == 'TOWER_BUILDING':
+                    count[red if event.get('teamId') == 100 else blue, 6] += 1
+            elif kind == 'TURRET_PLATE_DESTROYED':
+                count[red if event.get('teamId') == 100 else blue, 7] += 1
+            elif kind == 'ELITE_MONSTER_KILL':
+                if event.get('monsterType') in _monster_features:
+                    team = blue if event.get('killerTeamId') == 100 else red
+                    count[team, feature[_monster_features[
+                        event['monsterType']]]] += 1
+    counts = np.cumsum(counts, axis=0)
+    objectives = slice(feature['towersDestroyed'], None)
+    half = len(players) // 2
+    counts[:, :half, objectives] = counts[:, blue, None, objectives]
+    counts[:, half:-2, objectives] = counts[:, red, None, objectives]
+    return counts[:, :-2]
+
+
+def stack_timeframes(timelines:list, frames:list=[8], 
+                     fields:list=None) -> np.ndarray:
+    """Stack the player data of specific frames of many Riot
+    ``MatchTimelineDto`` s into a single dense array.
+
+    Parameters
+    ----------
+    timelines : list
+        A list of Riot ``MatchTimelineDto`` s. More info at 
+        (https://developer.riotgames.com/apis#match-v5/GET_getTimeline)
+    frames : list
+        Integers representing the frames of interest, defaults to [8].
+    fields : :obj:`list`, optional
+        Player features to extract. If None, the features are
+        constructed from the first player of the first match using
+        ``timeframe_fields``. Defaults to None.
+
+    Returns
+    -------
+    numpy.ndarray
+        Float array of shape ``(matches, frames, players, fields)``.
+        Players are ordered as in ``participantFrames``, the first
+        five are the blue team and the last five the red team.
+    """
+    if len(timelines) == 0:
+        return np.empty((0, len(frames), 10, len(fields or [])))
+    first = next(iter(timelines[0]['info']['frames'][frames[0]]
+                      ['participantFrames'].values()))
+    schema = participant_schema(first)
+    if fields is None or list(fields) == schema["fields"]:
+        fields = schema["fields"]
+        getter, order = schema["getter"], schema["order"]
+    else:
+        getter, order = _field_getter(first, fields)
+    rows = [getter(player)
+            for timeline in timelines
+            for frame in frames
+            for player in timeline['info']['frames'][frame]
+                                  ['participantFrames'].values()]
+    stacked = np.array(rows, dtype=np.float64)\
+                .reshape(len(timelines), len(frames), 10, len(fields))
+    if order != list(range(len(fields))):
+        stacked = stacked[..., order]
+    return stacked
+
+
+def process_timeframes(timelines:list, frames:list=[8], creep_score:bool=True,
+                       porportion:bool=True, events:bool=False) -> dict:
+    """Batch version of ``process_timeframe``. Clean and process
+    specific frames of many Riot ``MatchTimelineDto`` s at once,
+    with creep score, porportions and lane differences computed
+    as whole-array operations.
+
+    Parameters
+    ----------
+    timelines : list
+        A list of Riot ``MatchTimelineDto`` s. More info at 
+        (https://developer.riotgames.com/apis#match-v5/GET_getTimeline)
+    frames : list 
+        Integers representing the frames of interest, defaults to [8].
+    creep_score : bool
+        Whether to compute the creep_score, defaults to True.
+    porportion : bool
+        Whether to add ``goldPorportion`` and ``xpPorportion`` as 
+        features to the players, default to True.
+    events : bool
+        Whether to add the counts of ``EVENT_FEATURES`` (see 
+        ``index_events``) as features to the players, defaults to
+        False.
+
+    Returns
+    -------
+    dict
+        A dictionary with keys:
+
+        - ``"features"``: list of feature names, in the order
+          ``process_timeframe`` would produce them.
+        - ``"integer"``: boolean array, whether each feature holds
+          integer values.
+        - ``"matchId"``: list of matchIds of the timelines.
+        - ``"win"``: boolean array, whether the blue team won.
+        - ``"values"``: float array of shape
+          ``(matches, frames, lanes, features)`` holding the blue
+          minus red difference of every feature.
+
+    Notes
+    -----
+        The function does not handle cases where element of ``frames``
+        is larger than the total number of frames of the ``timeline``.
+        Porportions of a team with zero total gold or xp (for example
+        at frame 0) are ``nan``.
+    """
+    timelines = list(timelines)
+    if len(timelines) > 0:
+        schema = participant_schema(next(iter(
+            timelines[0]['info']['frames'][frames[0]]['participantFrames']
+            .values())))
+        fields, integer = schema["fields"], list(schema["integer"])
+    else:
+        fields, integer = [], []
+    stacked = stack_timeframes(timelines, frames, fields)
+    features = list(fields)
+
+    if creep_score:
+        has_jungle = 'jungleMinionsKilled' in features
+        has_minion = 'minionsKilled' in features
+        if has_jungle and has_minion:
+            jungle = features.index('jungleMinionsKilled')
+            minion = features.index('minionsKilled')
+            creep = stacked[..., jungle] + stacked[..., minion]
+            keep = [i for i in range(len(features)) if i not in (jungle, minion)]
+            stacked = np.concatenate([stacked[..., keep], creep[..., None]], 
+                                     axis=-1)
+            integer = [integer[i] for i in keep] + [integer[jungle] and 
+                                                    integer[minion]]
+            features = [features[i] for i in keep] + ['creepScore']
+        elif (has_jungle or has_minion or 
+              ('creepScore' not in features and len(timelines) > 0)):
+            raise ValueError("Missing information to construct creep score for a player.")
+
+    if porportion and len(timelines) > 0:
+        if 'totalGold' not in features or 'xp' not in features:
+            raise ValueError("Missing crucial information to construct " +
+                             "proportion stats for a player.")
+        both = stacked[..., [features.index('totalGold'), features.index('xp')]]
+        # Team totals, blue team first
+        teams = both.reshape(*both.shape[:2], 2, 5, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (teams / teams.sum(axis=3, keepdims=True)).reshape(both.shape)
+        stacked = np.concatenate([stacked, ratio], axis=-1)
+        integer += [False, False]
+        features += ['goldPorportion', 'xpPorportion']
+
+    if events and len(timelines) > 0:
+        counts = np.stack([index_events(timeline)[frames] 
+                           for timeline in timelines])
+        stacked = np.concatenate([stacked, counts], axis=-1)
+        integer += [True] * len(EVENT_FEATURES)
+        features += EVENT_FEATURES
+
+    return {
+        "features": features,
+        "integer": np.array(integer, dtype=bool),
+        "matchId": [timeline.get('metadata', {}).get('matchId', 'UNKNOWN')
+                    for timeline in timelines],
+        "win": np.array([timeline['info']['frames'][-1]['events'][-1]
+                         ['winningTeam'] == 100 for timeline in timelines],
+                        dtype=bool),
+        "values": stacked[:, :, :5] - stacked[:, :, 5:],
+    }
+
+
+def feature_names(features:list, frames:list=[8]) -> list:
+    """Construct the column names of a processed summary, in the
+    order of the ``(frames, lanes, features)`` axes of
+    ``process_timeframes``. Names follow the format "FEATURE_LANE"
+    for a single frame and "FEATURE_LANE_frame#" otherwise.
+
+    Parameters
+    ----------
+    features : list
+        Feature names, for example from ``process_timeframes``.
+    frames : list
+        Integers representing the frames of interest, defaults to [8].
+
+    Returns
+    -------
+    list
+        The column names, see :class:`zilean.FeatureSchema`.
+    """
+    return list(FeatureSchema.get(frames, features).names_)
+
+
+def array_records(rows:np.ndarray, names:list, integer:list) -> list:
+    """Unpack a 2-D array into one dictionary per row.
+
+    Parameters
+    ----------
+    rows : numpy.ndarray
+        A 2-D array, one column per name.
+    names : list
+        Names of the columns.
+    integer : list
+        Booleans, whether each column holds integer values. Integer 
+        columns are given back as python integers, others as floats.
+
+    Returns
+    -------
+    list
+        A list of dictionaries.
+    """
+    integer = np.asarray(integer, dtype=bool)
+    cells = np.asarray(rows).astype(object)
+    cells[:, integer] = np.asarray(rows)[:, integer].astype(np.int64)\
+                          .astype(object)
+    return [dict(zip(names, row)) for row in cells.tolist()]
+
+
+def processed_records(processed:dict, frames:list=[8], 
+                      per_frame:bool=False) -> list:
+    """Unpack the output of ``process_timeframes`` into one dictionary
+    per match, or one dictionary per frame of a match.
+
+    Parameters
+    ----------
+    processed : dict
+        Output of ``process_timeframes``.
+    frames : list
+        The frames ``processed`` was computed with, defaults to [8].
+    per_frame : bool
+        If False (default), each match is one dictionary with the
+        features of all ``frames``. If True, each frame of a match is
+        one dictionary, with an extra ``frame`` key.
+
+    Returns
+    -------
+    list
+        A list of dictionaries, identical to the ones produced by
+        ``process_timeframe``.
+    """
+    values = processed["values"]
+    n_matches = values.shape[0]
+    schema = FeatureSchema.get(frames, processed["features"], 
+                               processed["integer"])
+    if per_frame:
+        names, integer = schema.frame_names_, schema.frame_integer_
+    else:
+        names, integer = schema.names_, schema.integer_
+    rows = values.reshape(-1, len(names))
+
+    records = array_records(rows, names, integer)
+    for i, record in enumerate(records):
+        match = i // len(frames) if per_frame else i
+        record['matchId'] = processed["matchId"][match]
+        record['win'] = bool(processed["win"][match])
+        if per_frame:
+            record['frame'] = frames[i % len(frames)]
+    return records
+
+
 def process_timeframe(timeline:dict, frames:list=[8], matchid:str=None, 
-                      creep_score:bool=True, porportion:bool=True) -> dict:
+                      creep_score:bool=True, porportion:bool=True,
+                      events:bool=False) -> dict:
     """Return a single dictionary with cleaned and processed data for
     specific frames of a Riot ``MatchTimelineDto``.
 
@@ -264,6 +1078,9 @@ def process_timeframe(timeline:dict, frames:list=[8], matchid:str=None,
     porportion : bool
         Whether to add ``goldPorportion`` and ``xpPorportion`` as 
         features to the players, default to True.
+    events : bool
+        Whether to add event counts as features to the players, see
+        ``index_events``. Defaults to False.
     
     Returns
     -------
@@ -275,31 +1092,203 @@ def process_timeframe(timeline:dict, frames:list=[8], matchid:str=None,
     -----
         The function does not handle cases where element of ``frames``
         is larger than the total number of frames of the ``timeline``.
+        To process many timelines, ``process_timeframes`` is much faster.
     """
-    win = timeline['info']['frames'][-1]['events'][-1]['winningTeam'] == 100
-    cleaned = clean_timeframe(timeline, frames)
-    if creep_score:
-        cleaned = add_creep_score(cleaned)
-    if porportion:
-        cleaned = add_proportion(cleaned)
-    final_dict = {}
-    if len(frames) == 1:
-        frame = frames[0]
-        for i in range(5):
-            for key in list(cleaned[str(frame)][0].keys()):
-                key_name = key+'_'+str(i)
-                final_dict[key_name] = (cleaned[str(frame)][i][key] 
-                                        - cleaned[str(frame)][i+5][key])
-    else:
-        for frame in frames:
-            for i in range(5):
-                for key in list(cleaned[str(frame)][0].keys()):
-                    key_name = key+'_'+str(i)+'_frame'+str(frame)
-                    final_dict[key_name] = (cleaned[str(frame)][i][key]
-                                            - cleaned[str(frame)][i+5][key])
-    final_dict['matchId'] = matchid if matchid else 'UNKNOWN'
-    final_dict['win'] = bool(win)
-    return final_dict
+    processed = process_timeframes([timeline], frames, creep_score=creep_score,
+                                   porportion=porportion, events=events)
+    processed["matchId"] = [matchid if matchid else 'UNKNOWN']
+    return processed_records(processed, frames)[0]
+
+
+def _process_chunk(chunk:list, frames:list, creep_score:bool, 
+                   porportion:bool, events:bool=False) -> dict:
+    """Decode, validate and process a chunk of ``MatchTimelineDto`` s.
+    Runs in worker processes, so only the processed arrays are sent
+    back. Without events, only the frames of interest are decoded."""
+    projection = None if events else frames
+    chunk = [load_timeline(match, projection) 
+             if isinstance(match, (str, bytes)) else match
+             for match in chunk]
+    for match in chunk:
+        validate_timeline(match)
+    return process_timeframes(chunk, frames, creep_score=creep_score,
+                              porportion=porportion, events=events)
+
+
+# The "matchId" key of a `MatchTimelineDto` is in its metadata, other
+# keys of the same name (like in a nested object) need a decode
+_match_id_pattern = re.compile(r'"matchId"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def timeline_match_id(timeline) -> str:
+    """Return the matchId of a Riot ``MatchTimelineDto`` without
+    validating it, or None if it has no matchId. JSON text (see
+    ``iter_timelines(raw=True)``) is searched rather than decoded,
+    unless it has more than one "matchId" key.
+
+    Parameters
+    ----------
+    timeline : dict | str | bytes
+        A ``MatchTimelineDto``, either as a dictionary or as JSON text.
+
+    Returns
+    -------
+    str
+        The matchId.
+    """
+    if isinstance(timeline, (str, bytes)):
+        text = timeline if isinstance(timeline, str) else timeline.decode()
+        matches = _match_id_pattern.findall(text)
+        if len(matches) <= 1:
+            return json.loads(matches[0]) if matches else None
+        try:
+            timeline = json_loads(text)
+        except ValueError:
+            return None
+    try:
+        return timeline["metadata"]["matchId"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _merge_cached(chunk:list, match_ids:list, found:dict, features:dict,
+                  processed:dict) -> dict:
+    """Combine the matches of a chunk found in a ``MatchCache`` (with
+    their ``features``) with the processed ones, in the order of the
+    chunk. Returns None if the cached and processed matches have
+    different player features."""
+    if processed is not None and features["features"] != \
+            list(processed["features"]):
+        return None
+    head = next(iter(found.values()))["values"]
+    values = np.empty((len(chunk),) + head.shape)
+    win = np.empty(len(chunk), dtype=bool)
+    ids, n_processed = [], 0
+    for i, match_id in enumerate(match_ids):
+        if match_id in found:
+            values[i] = found[match_id]["values"]
+            win[i] = found[match_id]["win"]
+            ids.append(match_id)
+        else:
+            values[i] = processed["values"][n_processed]
+            win[i] = processed["win"][n_processed]
+            ids.append(processed["matchId"][n_processed])
+            n_processed += 1
+    return {"features": list(features["features"]),
+            "integer": np.asarray(features["integer"], dtype=bool),
+            "matchId": ids, "win": win, "values": values}
+
+
+def process_timeframes_chunks(timelines, frames:list=[8], creep_score:bool=True,
+                              porportion:bool=True, chunk_size:int=1000,
+                              n_jobs:int=1, executor=None, cache=None,
+                              events:bool=False):
+    """Process many Riot ``MatchTimelineDto`` s with 
+    ``process_timeframes``, ``chunk_size`` matches at a time, 
+    optionally across several worker processes. Chunks are yielded in
+    the same order as ``timelines``, whatever the number of workers.
+
+    Parameters
+    ----------
+    timelines : iterable
+        Riot ``MatchTimelineDto`` s, either as dictionaries or as
+        JSON text (see ``iter_timelines(raw=True)``). JSON text is
+        decoded in the worker processes.
+    frames : list 
+        Integers representing the frames of interest, defaults to [8].
+    creep_score : bool
+        Whether to compute the creep_score, defaults to True.
+    porportion : bool
+        Whether to add ``goldPorportion`` and ``xpPorportion`` as 
+        features to the players, default to True.
+    chunk_size : int
+        Number of matches sent to a worker at once, defaults to 1000.
+    n_jobs : int
+        Number of worker processes. 1 (default) processes everything 
+        in the current process, -1 uses all CPUs. Ignored if
+        ``executor`` is provided.
+    executor : :obj:`concurrent.futures.Executor`, optional
+        An executor to submit the chunks to. It is not shut down 
+        afterwards. Defaults to None.
+    cache : :obj:`zilean.MatchCache`, optional
+        Matches found in the cache are not processed (nor decoded, nor
+        validated) again, and processed matches are added to it.
+        Defaults to None.
+    events : bool
+        Whether to add event counts as features to the players, see
+        ``index_events``. Defaults to False.
+
+    Yields
+    ------
+    dict
+        Output of ``process_timeframes`` for each chunk.
+    """
+    def chunks():
+        chunk = []
+        for match in timelines:
+            chunk.append(match)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    args = (frames, creep_score, porportion, events)
+    if cache is not None:
+        config = cache.config(*args)
+
+    def submit(chunk, submit):
+        # Look up the cache first and only process the other matches
+        if cache is None:
+            return chunk, None, None, submit(_process_chunk, chunk, *args)
+        match_ids = [timeline_match_id(match) for match in chunk]
+        found = cache.get(config, [i for i in match_ids if i is not None])
+        missing = [match for match, match_id in zip(chunk, match_ids)
+                   if match_id not in found]
+        result = submit(_process_chunk, missing, *args) if missing else None
+        return chunk, match_ids, found, result
+
+    def result(item):
+        chunk, match_ids, found, processed = item
+        if processed is not None and hasattr(processed, "result"):
+            processed = processed.result()
+        if cache is None:
+            return processed
+        if processed is not None:
+            cache.put(config, processed)
+        if not found:
+            return processed
+        merged = _merge_cached(chunk, match_ids, found, 
+                               cache.features(config), processed)
+        # Matches with other player features than the cached ones
+        return merged if merged is not None else _process_chunk(chunk, *args)
+
+    if executor is None and n_jobs == 1:
+        for chunk in chunks():
+            yield result(submit(chunk, lambda f, *a: f(*a)))
+        return
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count() if n_jobs == -1 else n_jobs)
+    # Keep a bounded number of chunks in flight, so that only a few
+    # chunks of raw matches are held in memory at a time
+    max_pending = 2 * getattr(executor, "_max_workers", os.cpu_count() or 1)
+    pending = deque()
+    try:
+        for chunk in chunks():
+            pending.append(submit(chunk, executor.submit))
+            if len(pending) >= max_pending:
+                yield result(pending.popleft())
+        while pending:
+            yield result(pending.popleft())
+    finally:
+        for item in pending:
+            if item[3] is not None:
+                item[3].cancel()
+        if own_executor:
+            executor.shutdown()
 
 
 def validate_timeline(timeline:dict) -> str: